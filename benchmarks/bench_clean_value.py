@@ -0,0 +1,70 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sw_t
+
+TOKENS = ['N/A', 'nia', 'NaN', 'none', '', '-', 'null', 'M', 'K', 'B', '%', ',', '.', ' ', ':', '+', '-', 'e', 'x', 'Visits']
+
+def random_value(rng):
+    kind = rng.random()
+    if kind < 0.05:
+        return None
+    if kind < 0.08:
+        return float('nan')
+    if kind < 0.12:
+        return rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.uniform(-1000, 1000)])
+    if kind < 0.2:
+        return f'{rng.randint(0, 99):02d}:{rng.randint(0, 59):02d}' + (f':{rng.randint(0, 59):02d}' if rng.random() < 0.7 else '')
+    if kind < 0.6:
+        number = rng.choice([f'{rng.randint(0, 10 ** 9):,}', f'{rng.uniform(0, 1000):.{rng.randint(0, 3)}f}', str(rng.randint(-999, 999))])
+        return rng.choice(['', ' ', '+', '-']) + number + rng.choice(['', '', 'M', 'K', 'B', '%', ' %', 'M%']) + rng.choice(['', ' '])
+    return ''.join((rng.choice(TOKENS + list('0123456789')) for _ in range(rng.randint(0, 8))))
+
+def same(expected, actual):
+    if isinstance(expected, float) and math.isnan(expected):
+        return isinstance(actual, float) and math.isnan(actual)
+    return expected == actual
+
+def check_equivalence(samples, seed):
+    # Property check: clean_numeric_column must agree with clean_value cell by cell on random
+    # inputs drawn from the suffix/duration/separator grammar plus arbitrary token soup.
+    rng = random.Random(seed)
+    for trial in range(samples):
+        values = [random_value(rng) for _ in range(rng.randint(1, 12))]
+        series = pd.Series(values, dtype=object)
+        expected = [sw_t.clean_value(v) for v in values]
+        actual = sw_t.clean_numeric_column(series).tolist()
+        for value, e, a in zip(values, expected, actual):
+            if not same(e, a):
+                raise AssertionError(f'trial {trial}: clean_value({value!r}) = {e!r}, clean_numeric_column gave {a!r}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Equivalence check and speed of clean_numeric_column vs clean_value.')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    check_equivalence(args.samples, args.seed)
+    print(f'equivalence: {args.samples} random columns OK')
+    rng = np.random.default_rng(args.seed)
+    values = rng.choice(['1,234', '5.6M', '12.5%', '00:03:21', 'N/A', '7K', '0.4', '-'], size=args.rows)
+    df = pd.DataFrame({f'c{i}': values for i in range(4)}, dtype=object)
+    start = time.perf_counter()
+    df.map(sw_t.clean_value)
+    cell_time = time.perf_counter() - start
+    start = time.perf_counter()
+    df.apply(sw_t.clean_numeric_column)
+    column_time = time.perf_counter() - start
+    print(f'{args.rows} x 4 cells')
+    print(f'map(clean_value)             : {cell_time:8.3f} s')
+    print(f'apply(clean_numeric_column)  : {column_time:8.3f} s  ({cell_time / column_time:.1f}x)')
+if __name__ == '__main__':
+    main()
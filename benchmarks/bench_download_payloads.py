@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import jobs
+import output_formats
+
+def trends_result(rows):
+    # What run_trends_job returns for a merged Web + Youtube timeline and small geomaps
+    rng = np.random.default_rng(0)
+    file_date = datetime.date(2024, 1, 31)
+    timeline = pd.DataFrame({'Week': pd.date_range('2004-01-04', periods=rows, freq='min').strftime('%Y-%m-%d %H:%M'), 'dialog': rng.integers(0, 100, rows), 'mobitel': rng.integers(0, 100, rows), 'hutch': np.where(rng.random(rows) < 0.1, '<1', rng.integers(0, 100, rows).astype(str)), 'Platform': np.where(np.arange(rows) < rows // 2, 'Web', 'Youtube'), 'Date': file_date})
+    geo = lambda breakdown: pd.DataFrame({breakdown: [f'{breakdown} {i}' for i in range(25)], 'dialog': rng.integers(0, 100, 25), 'Breakdown': breakdown, 'Platform': 'Web', 'Date': file_date})
+    return {'processed_data': {'timeline': timeline, 'region': geo('Region'), 'city': geo('City')}, 'messages': [], 'file_date': file_date, 'date_suffix': file_date.strftime('%Y%m%d'), 'payloads': {}}
+
+def finished_job(result):
+    runner = jobs.get_job_runner()
+    job_id = runner.submit('google_trends', 'Processing all data', lambda job: result)
+    while runner.get(job_id).active:
+        time.sleep(0.01)
+    return job_id
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return (value, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Google Trends page rerun latency with lazy, memoized download payloads vs encoding every artifact on every rerun.')
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows in the merged timeline')
+    parser.add_argument('--reruns', type=int, default=5)
+    parser.add_argument('--format', default='CSV', choices=list(output_formats.OUTPUT_FORMATS))
+    args = parser.parse_args()
+    result = trends_result(args.rows)
+    frames = result['processed_data']
+    print(f"merged timeline: {len(frames['timeline'])} rows; download format {args.format}")
+    # Before: every rerun re-encoded all three downloads before drawing the buttons
+    _, eager = timed(lambda: [output_formats.encode_frame(df, args.format) for df in frames.values()])
+    print(f'eager encoding per rerun (previous behaviour): {eager:.2f}s')
+    at = AppTest.from_string(f"import sys; sys.path.insert(0, {ROOT!r}); import gt_t; gt_t.app()", default_timeout=600)
+    at.session_state['gt_job'] = finished_job(result)
+    at.session_state['gt_output_format'] = args.format
+    _, first = timed(at.run)
+    assert not at.exception, [e.value for e in at.exception]
+    assert len(at.get('download_button')) == 3, 'expected the three download buttons'
+    rerun_times = [timed(at.run)[1] for _ in range(args.reruns)]
+    print(f'page run with lazy payloads: first {first:.3f}s, reruns median {np.median(rerun_times):.3f}s (max {max(rerun_times):.3f}s)')
+    assert not result['payloads'], 'reruns must not encode any payload'
+    payload = output_formats.lazy_payload(result['payloads'], ('timeline', args.format), lambda: output_formats.encode_frame(frames['timeline'], args.format))
+    content, first_click = timed(payload)
+    again, second_click = timed(payload)
+    assert again is content
+    print(f'timeline download: first click encodes in {first_click:.2f}s ({len(content) / 1024 / 1024:.1f} MB), later clicks {second_click * 1000:.3f}ms')
+if __name__ == '__main__':
+    main()
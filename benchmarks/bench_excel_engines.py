@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fpk_t
+from bench_fpk_read import build_workbook, best_of
+
+def csv_outputs(results):
+    return {r['file_path']: r['file_content'] for r in results if r['status'] == 'success'}
+
+def main():
+    parser = argparse.ArgumentParser(description='process_excel_file_safe wall time per Excel reader engine, across workbook sizes and sheet counts.')
+    parser.add_argument('--engines', default='openpyxl,calamine')
+    parser.add_argument('--rows', default='100,1000,5000', help='Comma-separated data rows per sheet')
+    parser.add_argument('--sheets', default='5,20,40', help='Comma-separated sheet counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    engines = args.engines.split(',')
+    if 'calamine' in engines and fpk_t.resolve_excel_engine('auto') != 'calamine':
+        print('python-calamine is not installed; skipping calamine')
+        engines.remove('calamine')
+    date = datetime(2024, 1, 31)
+    print(f"{'sheets':>6} {'rows':>6} {'MB':>6} " + ' '.join((f'{e:>10}' for e in engines)) + '   speedup')
+    with tempfile.TemporaryDirectory() as tmp:
+        for sheets in [int(s) for s in args.sheets.split(',')]:
+            for rows in [int(r) for r in args.rows.split(',')]:
+                path = build_workbook(os.path.join(tmp, f'{sheets}x{rows}.xlsx'), sheets, rows)
+                reference = csv_outputs(fpk_t.process_excel_file_safe(path, date, 'openpyxl'))
+                timings = []
+                for engine in engines:
+                    # The fast engines must produce byte-identical CSVs, otherwise the timing is meaningless
+                    assert csv_outputs(fpk_t.process_excel_file_safe(path, date, engine)) == reference, f'{engine} output differs on {sheets}x{rows}'
+                    timings.append(best_of(lambda: fpk_t.process_excel_file_safe(path, date, engine), args.repeat))
+                size = os.path.getsize(path) / 1024 / 1024
+                print(f'{sheets:>6} {rows:>6} {size:>6.1f} ' + ' '.join((f'{t:>9.3f}s' for t in timings)) + f'   {timings[0] / min(timings):.1f}x')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fpk_t
+
+NETWORKS = ['Facebook', 'Instagram', 'Twitter', 'LinkedIn', 'YouTube', 'TikTok', 'Pinterest', 'Threads']
+SHEET_TYPES = ['Posts', 'Fans', 'Engagement', 'Reach', 'Videos']
+
+def build_workbook(path, sheet_count=40, rows=200, cols=12):
+    wb = Workbook(write_only=True)
+    for i in range(sheet_count):
+        ws = wb.create_sheet(f'{SHEET_TYPES[i // len(NETWORKS) % len(SHEET_TYPES)]} - {NETWORKS[i % len(NETWORKS)]} {i}')
+        ws.append(['Report'])
+        ws.append(['Generated', datetime.now().strftime('%Y-%m-%d')])
+        ws.append([])
+        ws.append([])
+        ws.append([None] + [f'Metric {c}' for c in range(cols)])
+        for r in range(rows):
+            ws.append([None] + [r * c for c in range(cols)])
+    wb.save(path)
+    return path
+
+def read_per_sheet(path):
+    # Behaviour before the single-open path: one full workbook parse per sheet
+    with pd.ExcelFile(path) as excel_file:
+        sheet_names = excel_file.sheet_names
+    return [pd.read_excel(path, sheet_name=name, header=None) for name in sheet_names]
+
+def read_single_open(path):
+    with pd.ExcelFile(path) as excel_file:
+        return [excel_file.parse(sheet_name=name, header=None) for name in excel_file.sheet_names]
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-workbook wall time: per-sheet read_excel vs single-open parsing.')
+    parser.add_argument('--sheets', type=int, default=40)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = build_workbook(os.path.join(tmp, 'synthetic.xlsx'), args.sheets, args.rows)
+        per_sheet = best_of(lambda: read_per_sheet(path), args.repeat)
+        single_open = best_of(lambda: read_single_open(path), args.repeat)
+        pipeline = best_of(lambda: fpk_t.process_excel_file_safe(path, datetime(2024, 1, 31)), args.repeat)
+    print(f'workbook: {args.sheets} sheets x {args.rows} rows')
+    print(f'read, one read_excel per sheet : {per_sheet:8.3f} s')
+    print(f'read, single open              : {single_open:8.3f} s  ({per_sheet / single_open:.1f}x)')
+    print(f'process_excel_file_safe        : {pipeline:8.3f} s')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import tracemalloc
+import multiprocessing
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fpk_t
+from bench_fpk_read import NETWORKS
+
+POST_TYPES = ['Photo', 'Video', 'Link', 'Status', 'Reel']
+
+def build_post_workbook(path, sheet_count, rows):
+    # Post-level exports: unique text, low-cardinality text, counts, rates with gaps, timestamps
+    wb = Workbook(write_only=True)
+    start = datetime(2024, 1, 1)
+    for i in range(sheet_count):
+        ws = wb.create_sheet(f'Posts - {NETWORKS[i % len(NETWORKS)]} {i}')
+        ws.append(['Post level export'])
+        ws.append([])
+        ws.append([])
+        ws.append([])
+        ws.append([None, 'Message', 'Post type', 'Published', 'Likes', 'Comments', 'Engagement rate', 'Profile'])
+        for r in range(rows):
+            ws.append([None, f'Post {i}-{r} text body', POST_TYPES[r % len(POST_TYPES)], start + timedelta(minutes=37 * r), r * 3, r % 17, (r % 97) / 97 + 0.001 if r % 11 else None, f'Brand {i % 3}'])
+    # A sheet whose "Likes" column holds text stays untyped without demoting Likes for other sheets
+    ws = wb.create_sheet('Posts - Threads odd')
+    ws.append(['Post level export'])
+    ws.append([])
+    ws.append([])
+    ws.append([])
+    ws.append([None, 'Message', 'Post type', 'Published', 'Likes', 'Comments', 'Engagement rate', 'Profile'])
+    for r in range(20):
+        ws.append([None, f'odd {r}', 'Photo', start, 'hidden' if r % 2 else r, r, 0.5, 'Brand 0'])
+    wb.save(path)
+    return path
+
+def run(path, date, use_registry):
+    fpk_t.USE_SCHEMA_REGISTRY = use_registry
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = fpk_t.process_excel_file_safe(path, date, 'openpyxl')
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    merged = next((r for r in results if r.get('merged_count')))
+    df = merged['dataframe']
+    start = time.perf_counter()
+    df.to_csv(index=False, date_format=fpk_t.CSV_DATE_FORMAT)
+    csv_time = time.perf_counter() - start
+    return {'outputs': {r['file_path']: r['file_content'] for r in results if r['status'] == 'success'}, 'bytes_per_row': df.memory_usage(deep=True).sum() / len(df), 'rows': len(df), 'peak': peak / 1024 / 1024, 'elapsed': elapsed, 'csv_time': csv_time, 'dtypes': df.dtypes}
+
+def save_kinds(client_name, schema_key):
+    fpk_t.save_schema_kinds(client_name, {schema_key: {'Likes': 'integer'}})
+
+def check_concurrent_saves(workers=8):
+    # Every worker's kinds survive workers saving the registry at the same time
+    processes = [multiprocessing.Process(target=save_kinds, args=(f'client {i % 2}', f'Type {i}')) for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    registry = fpk_t.load_schema_registry()
+    for i in range(workers):
+        assert registry[f'client {i % 2}'][f'Type {i}'] == {'Likes': 'integer'}, f'Type {i} lost'
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per row and CSV serialization time with and without the FPK schema registry.')
+    parser.add_argument('--sheets', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+    date = datetime(2024, 1, 31)
+    with tempfile.TemporaryDirectory() as tmp:
+        fpk_t.SCHEMA_REGISTRY_PATH = os.path.join(tmp, 'schema_registry.json')
+        path = build_post_workbook(os.path.join(tmp, 'posts.xlsx'), args.sheets, args.rows)
+        before = run(path, date, False)
+        cold = run(path, date, True)
+        fpk_t._schema_registry = None
+        warm = run(path, date, True)
+        registered = fpk_t.load_schema_registry()['']['Posts']
+        assert registered['Likes'] == 'integer', registered
+        check_concurrent_saves()
+    assert cold['outputs'] == before['outputs'] and warm['outputs'] == before['outputs'], 'typed columns changed the CSV output'
+    print(f"merged Posts frame: {before['rows']} rows; CSV output identical with and without the registry")
+    print('registry: the odd sheet left Likes registered as integer; concurrent saves kept every kind')
+    print(f"{'':<18} {'bytes/row':>10} {'to_csv':>8} {'workbook':>9} {'peak MB':>8}")
+    for label, run_result in [('object columns', before), ('registry (cold)', cold), ('registry (warm)', warm)]:
+        print(f"{label:<18} {run_result['bytes_per_row']:>10.0f} {run_result['csv_time']:>7.3f}s {run_result['elapsed']:>8.2f}s {run_result['peak']:>8.1f}")
+    print('typed columns:', ', '.join((f'{name}={dtype}' for name, dtype in warm['dtypes'].items())))
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gt_t
+
+class NullJob:
+
+    def update(self, progress, text):
+        pass
+
+def trends_export(first, rows, rng):
+    # A raw Google Trends export: "Category" preamble, blank line, header, then data
+    df = pd.DataFrame({first: [f'{first} {i}' for i in range(rows)], 'dialog: (Sri Lanka)': rng.integers(0, 100, rows), 'mobitel: (Sri Lanka)': np.where(rng.random(rows) < 0.1, '<1', rng.integers(0, 100, rows).astype(str))})
+    return b'Category: All categories\n\n' + df.to_csv(index=False).encode('utf-8')
+
+def build_batch(periods, timeline_rows, geo_rows):
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    end = datetime.date(2024, 1, 7)
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for p in range(periods):
+            day = (end + datetime.timedelta(weeks=p)).strftime('%Y-%m-%d')
+            for platform in ('web', 'youtube'):
+                zipf.writestr(f'{day}/{platform}/multiTimeline.csv', trends_export('Week', timeline_rows, rng))
+                zipf.writestr(f'{day}/{platform}/geoMap_region.csv', trends_export('Region', geo_rows, rng))
+                zipf.writestr(f'{day}/{platform}/geoMap_city.csv', trends_export('City', geo_rows, rng))
+    return buffer.getvalue()
+
+def run_per_period(archive, default_date):
+    # The previous workflow: one six-file run per period, pandas' default CSV parser, frames concatenated afterwards
+    periods = {}
+    for name, data in gt_t.iter_trends_exports(archive):
+        output_name, breakdown_type, platform_name, file_date = gt_t.classify_trends_export(name, data)
+        periods.setdefault(file_date, []).append((name, data, output_name, breakdown_type, platform_name))
+    frames = {'timeline': [], 'region': [], 'city': []}
+    for file_date, files in sorted(periods.items()):
+        for name, data, output_name, breakdown_type, platform_name in sorted(files, key=lambda f: (f[4] != 'Web', f[0])):
+            df = pd.read_csv(io.BytesIO(data), skiprows=2)
+            if breakdown_type is None:
+                df.columns = [col.replace(': (Sri Lanka)', '') for col in df.columns]
+            else:
+                df.columns = [col.split(':')[0] for col in df.columns]
+                df['Breakdown'] = breakdown_type
+            df['Platform'] = platform_name
+            df['Date'] = file_date
+            frames[output_name].append(df)
+    return {name: pd.concat(dfs, ignore_index=True) for name, dfs in frames.items()}
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return (result, min(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description='Google Trends backfill: per-period runs with the default CSV parser vs one parallel batch run.')
+    parser.add_argument('--periods', type=int, default=52, help='Weekly periods in the batch (6 exports each)')
+    parser.add_argument('--timeline-rows', type=int, default=5000)
+    parser.add_argument('--geo-rows', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=gt_t.BATCH_MAX_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    archive = build_batch(args.periods, args.timeline_rows, args.geo_rows)
+    default_date = datetime.date(2024, 1, 1)
+    print(f'{args.periods * 6} exports, {len(archive) / 1024 / 1024:.1f} MB zipped; {args.workers} worker(s) on {os.cpu_count()} CPU(s)')
+    expected, serial_time = best_of(lambda: run_per_period(archive, default_date), args.repeat)
+    result, batch_time = best_of(lambda: gt_t.run_trends_batch_job(NullJob(), archive, default_date, args.workers), args.repeat)
+    assert not result['messages'], result['messages']
+    for name, df in expected.items():
+        pd.testing.assert_frame_equal(result['processed_data'][name], df, check_dtype=False)
+    print(f'per-period runs (previous): {serial_time:.2f}s')
+    print(f"batch run: {batch_time:.2f}s ({serial_time / batch_time:.2f}x), date suffix {result['date_suffix']}")
+if __name__ == '__main__':
+    main()
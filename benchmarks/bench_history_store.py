@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import history_store
+
+NETWORKS = ['Facebook', 'Instagram', 'TikTok']
+
+def period_frame(rng, period, rows, metrics):
+    # One FPK "Posts" output for a period: Date and Network first, as process_workbook_sheets writes them
+    network = np.repeat(NETWORKS, rows // len(NETWORKS) + 1)[:rows]
+    df = pd.DataFrame({'Date': period.strftime('%Y-%m-%d'), 'Network': network, 'Post': [f'post {i}' for i in range(rows)]})
+    for m in range(metrics):
+        df[f'Metric {m}'] = rng.integers(0, 10000, rows)
+    return df
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return (result, float(np.median(timings)))
+
+def read_exports(export_dir, client, start, end):
+    # The previous workflow: re-read every throwaway CSV export in the range and merge them
+    frames = []
+    for name in sorted(os.listdir(os.path.join(export_dir, client))):
+        if start <= name[:10] <= end:
+            frames.append(pd.read_csv(os.path.join(export_dir, client, name)))
+    return pd.concat(frames, ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='History store ingest, re-ingest and filtered read latency over several years of weekly FPK outputs, vs re-reading CSV exports.')
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=300, help='Rows per client and week')
+    parser.add_argument('--metrics', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    periods = pd.date_range('2020-01-05', periods=args.years * 52, freq='W')
+    clients = [f'client_{c}' for c in range(args.clients)]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'history.sqlite')
+        export_dir = os.path.join(tmp, 'exports')
+        start = time.perf_counter()
+        for client in clients:
+            os.makedirs(os.path.join(export_dir, client))
+            for period in periods:
+                df = period_frame(rng, period, args.rows, args.metrics)
+                df.to_csv(os.path.join(export_dir, client, f"{period.strftime('%Y-%m-%d')}.csv"), index=False)
+                history_store.ingest_frame('fpk', 'Posts', df, client, period, 'Network', path=db_path)
+        total_rows = len(periods) * len(clients) * args.rows
+        print(f'{total_rows} rows: {args.years} years x 52 weeks x {args.clients} clients x {args.rows} rows; built in {time.perf_counter() - start:.1f}s, {os.path.getsize(db_path) / 1024 / 1024:.0f} MB')
+        # Re-ingesting a week replaces it instead of adding duplicates
+        df = period_frame(rng, periods[-1], args.rows, args.metrics)
+        _, reingest = timed(lambda: history_store.ingest_frame('fpk', 'Posts', df, clients[0], periods[-1], 'Network', path=db_path), args.repeat)
+        assert len(history_store.read_history('fpk', 'Posts', clients[0], periods[-1], periods[-1], path=db_path)) == args.rows
+        print(f're-ingest one week ({args.rows} rows): {reingest * 1000:.1f}ms')
+        # Two workbooks of the same week are kept side by side; re-ingesting one replaces only its own rows
+        for origin in ['first.xlsx', 'second.xlsx', 'second.xlsx']:
+            history_store.ingest_frame('fpk', 'Posts', df, 'two_workbooks', periods[-1], 'Network', path=db_path, origin=origin)
+        assert len(history_store.read_history('fpk', 'Posts', 'two_workbooks', path=db_path)) == 2 * args.rows
+        last = periods[-1]
+        queries = [('one client, last quarter', clients[0], last - datetime.timedelta(days=91), last, None), ('one client, last year', clients[0], last - datetime.timedelta(days=365), last, None), ('one client, all history', clients[0], None, None, None), ('one client, year, one network', clients[0], last - datetime.timedelta(days=365), last, ['Instagram']), ('all clients, last month', None, last - datetime.timedelta(days=30), last, None)]
+        print(f"{'query':<32} {'rows':>8} {'store':>10} {'CSV exports':>12}")
+        for label, client, first, end, networks in queries:
+            result, store_time = timed(lambda: history_store.read_history('fpk', 'Posts', client, first, end, networks, path=db_path), args.repeat)
+            csv_time = ''
+            if client is not None and networks is None:
+                range_start = first.strftime('%Y-%m-%d') if first is not None else ''
+                range_end = end.strftime('%Y-%m-%d') if end is not None else '9999'
+                expected, elapsed = timed(lambda: read_exports(export_dir, client, range_start, range_end), max(1, args.repeat // 2))
+                assert len(expected) == len(result), (label, len(expected), len(result))
+                csv_time = f'{elapsed * 1000:.0f}ms'
+            print(f'{label:<32} {len(result):>8} {store_time * 1000:>8.0f}ms {csv_time:>12}')
+if __name__ == '__main__':
+    main()
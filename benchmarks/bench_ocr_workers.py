@@ -0,0 +1,77 @@
+import os
+import io
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ocr_worker
+
+def synthetic_screenshot(lines=12):
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (640, 40 + lines * 32), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(lines):
+        draw.text((20, 20 + i * 32), f'site{i}.lk', fill='black')
+        draw.text((480, 20 + i * 32), f'{(i * 7.3) % 100:.2f}%', fill='black')
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def run_sessions(addresses, authkey, image_bytes, sessions, requests_per_session):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def session():
+        client = ocr_worker.OcrClient(addresses, authkey)
+        for _ in range(requests_per_session):
+            start = time.perf_counter()
+            try:
+                client.readtext(image_bytes, mag_ratio=1.5)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start, sorted(latencies), errors)
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test: concurrent simulated sessions against N warm OCR workers.')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts to compare')
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=5, help='Requests per session')
+    parser.add_argument('--port', type=int, default=6110)
+    parser.add_argument('--image', help='Screenshot to send instead of a synthetic one')
+    args = parser.parse_args()
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = synthetic_screenshot()
+    authkey = os.urandom(32)
+    for count in [int(c) for c in args.workers.split(',')]:
+        processes = ocr_worker.start_workers(ocr_worker.DEFAULT_HOST, args.port, count, ['en'], authkey)
+        addresses = [(ocr_worker.DEFAULT_HOST, args.port + i) for i in range(count)]
+        try:
+            ocr_worker.wait_until_ready(addresses, authkey)
+            elapsed, latencies, errors = run_sessions(addresses, authkey, image_bytes, args.sessions, args.requests)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+        done = len(latencies)
+        p50 = latencies[done // 2] if done else float('nan')
+        p95 = latencies[min(done - 1, int(done * 0.95))] if done else float('nan')
+        print(f'{count} worker(s): {done / elapsed:6.2f} req/s, p50 {p50:.2f}s, p95 {p95:.2f}s, {len(errors)} errors')
+        args.port += count
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import time
+import tempfile
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fpk_t
+import output_formats
+from bench_fpk_read import build_workbook
+
+def fpk_output(tmp, sheets, rows):
+    # The largest output with its DataFrame and declared column kinds
+    path = build_workbook(os.path.join(tmp, 'formats.xlsx'), sheets, rows)
+    results = fpk_t.process_excel_file_safe(path, datetime(2024, 1, 31), 'openpyxl')
+    result = max((r for r in results if r['status'] == 'success'), key=lambda r: len(r['file_content']))
+    return (result['dataframe'], result['file_content'], result['column_kinds'])
+
+def gt_timeline_frame(rows):
+    rng = np.random.default_rng(0)
+    weeks = pd.date_range('2004-01-04', periods=rows, freq='D').strftime('%Y-%m-%d')
+    df = pd.DataFrame({'Week': weeks, 'dialog': rng.integers(0, 100, rows), 'mobitel': rng.integers(0, 100, rows), 'hutch': np.where(rng.random(rows) < 0.1, '<1', rng.integers(0, 100, rows).astype(str)), 'Platform': rng.choice(['Web', 'Youtube'], rows), 'Date': '2024-01-31'})
+    return df
+
+def read_back(content, output_format):
+    if output_format == 'CSV':
+        return pd.read_csv(io.BytesIO(content))
+    if output_format == 'Parquet':
+        return pd.read_parquet(io.BytesIO(content))
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.BufferReader(content)).read_all().to_pandas()
+
+def frame_schema(content, output_format):
+    import pyarrow as pa
+    if output_format == 'Parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(io.BytesIO(content))
+    return pa.ipc.open_file(pa.BufferReader(content)).schema
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return (result, min(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description='Size and write/read time of each output format for FPK and Google Trends outputs.')
+    parser.add_argument('--fpk-sheets', type=int, default=20)
+    parser.add_argument('--fpk-rows', type=int, default=5000)
+    parser.add_argument('--gt-rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        fpk_t.FPK_CACHE_DIR = tmp
+        fpk_t.SCHEMA_REGISTRY_PATH = os.path.join(tmp, 'schema_registry.json')
+        timeline = gt_timeline_frame(args.gt_rows)
+        datasets = [('FPK merged sheet type',) + fpk_output(tmp, args.fpk_sheets, args.fpk_rows), ('GT timeline', timeline, timeline.to_csv(index=False).encode('utf-8'), None)]
+    for name, df, csv_content, column_kinds in datasets:
+        print(f'{name}: {len(df)} rows x {len(df.columns)} columns')
+        print(f"  {'format':<10} {'MB':>8} {'ratio':>6} {'write':>8} {'spooled':>8} {'read':>8}  schema")
+        for output_format in output_formats.available_output_formats():
+            # write = encoding the DataFrame; spooled = converting the same output's CSV with the
+            # declared kinds, as for streamed and cached outputs (zero for CSV itself)
+            content, write_time = best_of(lambda: output_formats.encode_frame(df, output_format, column_kinds), args.repeat)
+            converted, spooled_time = best_of(lambda: output_formats.encode_csv(csv_content, output_format, column_kinds), args.repeat)
+            frame, read_time = best_of(lambda: read_back(content, output_format), args.repeat)
+            assert frame.shape == df.shape, f'{output_format} round trip changed the shape'
+            if output_format == 'CSV':
+                schema = ''
+            else:
+                schema = ', '.join((str(t) for t in frame_schema(content, output_format).types))
+                if column_kinds is not None:
+                        assert schema == ', '.join((str(t) for t in frame_schema(converted, output_format).types)), f'{output_format} from the CSV is typed differently'
+            print(f'  {output_format:<10} {len(content) / 1024 / 1024:>8.2f} {len(csv_content) / len(content):>5.1f}x {write_time:>7.3f}s {spooled_time:>7.3f}s {read_time:>7.3f}s  {schema}')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import subprocess
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['torch', 'cv2', 'easyocr']
+
+def import_profile(module_name):
+    code = f"import sys, {module_name}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module_name} failed:\n{proc.stderr[-2000:]}')
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            # Nested imports are indented two spaces per level after the leading separator space
+            timings.append((int(cumulative_us), name[1:].rstrip()))
+    # The top-level entry for the requested module carries the cumulative time of everything it pulled in
+    total = next((us for us, name in timings if name == module_name), 0)
+    top_level = sorted(((us, name) for us, name in timings if not name.startswith(' ')), reverse=True)
+    loaded_heavy = [m for m in proc.stdout.strip().split(',') if m]
+    return total, top_level, loaded_heavy
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time breakdown per tool module (python -X importtime).')
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+    failures = []
+    for module_name in ['fpk_t', 'gt_t', 'sw_t']:
+        total, top_level, loaded_heavy = import_profile(module_name)
+        print(f'{module_name}: {total / 1e6:.2f} s cumulative, heavy modules loaded: {loaded_heavy or "none"}')
+        for us, name in top_level[:args.top]:
+            print(f'    {us / 1e6:8.3f} s  {name}')
+        if module_name in ('fpk_t', 'gt_t') and 'torch' in loaded_heavy:
+            failures.append(module_name)
+    if failures:
+        print(f"FAIL: torch loaded by {', '.join(failures)}")
+        sys.exit(1)
+    print('OK: FPK and GT pages render without loading torch')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sw_t
+
+ROW_HEIGHT = 32
+
+def channel_table(index, rows):
+    return [(f'site{(index * 7 + r) % 40}.lk', f'{(index * 13 + r * 7.3) % 100:.2f}%') for r in range(rows)]
+
+def channel_image(index, rows):
+    import cv2
+    # The image's index sits in the top-left pixel so the stub reader knows which table it is reading
+    img = np.full((40 + rows * ROW_HEIGHT, 640, 3), 255, dtype=np.uint8)
+    for r in range(rows):
+        img[20 + r * ROW_HEIGHT:36 + r * ROW_HEIGHT, 20:200] = 0
+        img[20 + r * ROW_HEIGHT:36 + r * ROW_HEIGHT, 480:560] = 0
+    img[0, 0] = (index, 0, 0)
+    ok, png = cv2.imencode('.png', cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
+    return png.tobytes()
+
+class StubReader:
+    # easyocr.Reader's input contract without the models: detect() reformats its input unless
+    # reformat=False, and reformat_input only takes a single 2-D or 3-D image
+    lang_list = ['en']
+
+    def __init__(self, tables, latency=0.0):
+        self.tables = tables
+        self.latency = latency
+        self.calls = {'readtext': 0, 'detect': 0, 'recognize': 0}
+        self.batch = None
+
+    def boxes(self, index):
+        horizontal = []
+        for r in range(len(self.tables[index])):
+            y = 20 + r * ROW_HEIGHT
+            horizontal.extend([[20, 200, y, y + 16], [480, 560, y, y + 16]])
+        return horizontal
+
+    def read_boxes(self, index, horizontal_list):
+        texts = [text for row in self.tables[index] for text in row]
+        return [([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, 0.99) for (x0, x1, y0, y1), text in zip(horizontal_list, texts)]
+
+    def readtext(self, image, mag_ratio=1.0):
+        import cv2
+        self.calls['readtext'] += 1
+        time.sleep(self.latency)
+        img = cv2.cvtColor(cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        index = int(img[0, 0, 0])
+        return self.read_boxes(index, self.boxes(index))
+
+    def detect(self, img, mag_ratio=1.0, reformat=True):
+        self.calls['detect'] += 1
+        time.sleep(self.latency)
+        if reformat and img.ndim not in (2, 3):
+            raise UnboundLocalError("cannot access local variable 'img_cv_grey' where it is not associated with a value")
+        assert img.ndim == 4 and img.shape[-1] == 3 and img.dtype == np.uint8, img.shape
+        self.batch = img
+        return ([self.boxes(int(image[0, 0, 0])) for image in img], [[] for _ in img])
+
+    def recognize(self, img_cv_grey, horizontal_list=None, free_list=None, batch_size=1):
+        import cv2
+        position = self.calls['recognize']
+        self.calls['recognize'] += 1
+        time.sleep(self.latency)
+        # Same grey image readtext_batched would hand over, in the padded batch's pixel space
+        assert np.array_equal(img_cv_grey, cv2.cvtColor(self.batch[position], cv2.COLOR_RGB2GRAY)), 'grey image differs from the batch'
+        index = int(self.batch[position][0, 0, 0])
+        return self.read_boxes(index, horizontal_list)
+
+def main():
+    parser = argparse.ArgumentParser(description='Channel OCR: one readtext per image vs one batched detect, run against a stub reader with easyocr\'s input contract.')
+    parser.add_argument('--rows', default='6,12,9,15,4,10,8,12,5', help='Rows per channel image, comma-separated (one image per channel type)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the stub spends per reader call')
+    args = parser.parse_args()
+    rows = [int(r) for r in args.rows.split(',')][:len(sw_t.CHANNEL_TYPES)]
+    tables = [channel_table(i, r) for i, r in enumerate(rows)]
+    channel_images = {c_type: channel_image(i, r) for i, (c_type, r) in enumerate(zip(sw_t.CHANNEL_TYPES, rows))}
+    with tempfile.TemporaryDirectory() as tmp:
+        sw_t.OCR_CACHE_DIR = os.path.join(tmp, 'per_image')
+        reader = StubReader(tables, args.latency)
+        start = time.perf_counter()
+        expected = {c_type: sw_t.extract_channel(image_bytes, c_type, reader) for c_type, image_bytes in channel_images.items()}
+        per_image = time.perf_counter() - start
+        per_image_calls = dict(reader.calls)
+        sw_t.OCR_CACHE_DIR = os.path.join(tmp, 'batched')
+        reader = StubReader(tables, args.latency)
+        timings = {}
+        start = time.perf_counter()
+        frames, errors = sw_t.extract_channels_batched(channel_images, reader, timings=timings)
+        batched = time.perf_counter() - start
+    assert not errors, errors
+    for c_type, df in expected.items():
+        pd.testing.assert_frame_equal(frames[c_type], df)
+    merged = sw_t.merge_channel_frames(list(frames.values()))
+    assert len(merged.columns) == len(channel_images) + 1, merged.columns
+    print(f'{len(channel_images)} channel images, {sum(rows)} rows; stub latency {args.latency * 1000:.0f}ms per call')
+    print(f"per-image readtext: {per_image:.3f}s ({per_image_calls['readtext']} calls)")
+    print(f"batched: {batched:.3f}s ({reader.calls['detect']} detect + {reader.calls['recognize']} recognize calls); " + ', '.join((f'{stage} {seconds:.3f}s' for stage, seconds in timings.items())))
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sw_t
+
+def synthetic_boxes(lines, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    y = np.repeat(np.arange(lines) * 30.0, columns) + rng.uniform(-4, 4, lines * columns)
+    x = np.tile(np.arange(columns) * 120.0, lines) + rng.uniform(-10, 10, lines * columns)
+    text = [f'{i % 997}.{i % 7}%' for i in range(lines * columns)]
+    df = pd.DataFrame({'text': text, 'y': y, 'x': x})
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def group_rows_iterrows(df_text, y_tolerance=15):
+    # The per-extractor loop that group_text_rows replaced
+    df_text = df_text.sort_values(by='y', kind='mergesort')
+    rows = []
+    current_row = []
+    last_y = -1
+    for index, row in df_text.iterrows():
+        if last_y == -1 or abs(row['y'] - last_y) < y_tolerance:
+            current_row.append(row)
+            last_y = row['y']
+        else:
+            current_row.sort(key=lambda x: x['x'])
+            rows.append(current_row)
+            current_row = [row]
+            last_y = row['y']
+    if current_row:
+        current_row.sort(key=lambda x: x['x'])
+        rows.append(current_row)
+    return rows
+
+def nearest_headers_min(rows, headers):
+    return [[min(headers, key=lambda h: abs(h['x'] - item['x']))['text'] for item in row] for row in rows]
+
+def nearest_headers_argmin(rows, headers):
+    header_x = np.array([h['x'] for h in headers])
+    assigned = []
+    for row in rows:
+        item_x = np.array([item['x'] for item in row])
+        nearest = np.abs(item_x[:, None] - header_x[None, :]).argmin(axis=1)
+        assigned.append([headers[i]['text'] for i in nearest])
+    return assigned
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Line clustering: iterrows loop vs vectorized group_text_rows.')
+    parser.add_argument('--lines', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=8)
+    args = parser.parse_args()
+    df = synthetic_boxes(args.lines, args.columns)
+    legacy_rows, legacy_time = timed(group_rows_iterrows, df)
+    rows, vector_time = timed(sw_t.group_text_rows, df)
+    assert [[item['text'] for item in row] for row in legacy_rows] == [[item['text'] for item in row] for row in rows], 'row grouping differs'
+    headers = [{'text': f'H{c}', 'x': c * 120.0} for c in range(args.columns)]
+    legacy_assign, legacy_assign_time = timed(nearest_headers_min, rows, headers)
+    assign, vector_assign_time = timed(nearest_headers_argmin, rows, headers)
+    assert legacy_assign == assign, 'header assignment differs'
+    print(f'{len(df)} boxes in {len(rows)} lines')
+    print(f'grouping  iterrows : {legacy_time:8.4f} s')
+    print(f'grouping  numpy    : {vector_time:8.4f} s  ({legacy_time / vector_time:.1f}x)')
+    print(f'headers   min()    : {legacy_assign_time:8.4f} s')
+    print(f'headers   argmin   : {vector_assign_time:8.4f} s  ({legacy_assign_time / vector_assign_time:.1f}x)')
+if __name__ == '__main__':
+    main()
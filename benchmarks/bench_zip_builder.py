@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import tempfile
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fpk_t
+import zip_builder
+from bench_fpk_schema import build_post_workbook
+from bench_output_formats import gt_timeline_frame
+
+def client_members(tmp, dates, sheets, rows, gt_rows):
+    # A client ZIP as page_zip_processor builds it: one folder per sheet type, one CSV per dated workbook
+    path = build_post_workbook(os.path.join(tmp, 'posts.xlsx'), sheets, rows)
+    results = [r for r in fpk_t.process_excel_file_safe(path, datetime(2024, 1, 31), 'openpyxl') if r['status'] == 'success']
+    members = {}
+    for d in range(dates):
+        for result in results:
+            folder, name = result['folder_name'], os.path.splitext(os.path.basename(result['file_path']))[0]
+            members[f'{folder}/{name} {d:03d}.csv'] = result['file_content']
+    members['Google Trends/gt_timeline.csv'] = gt_timeline_frame(gt_rows).to_csv(index=False).encode('utf-8')
+    return members
+
+def build_serial(members):
+    # The previous create_client_zip: one ZipFile, default deflate level, one member at a time
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for name, content in members.items():
+            zipf.writestr(name, content)
+    return buffer.getvalue()
+
+def build_parallel(members, compression, workers):
+    buffer = io.BytesIO()
+    with zip_builder.ParallelZipWriter(buffer, compression, max_workers=workers) as zipf:
+        for name, content in members.items():
+            zipf.writestr(name, content)
+    return buffer.getvalue()
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return (result, min(timings))
+
+def check(archive, members):
+    with zipfile.ZipFile(io.BytesIO(archive)) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.namelist() == list(members), 'member order changed'
+        for name, content in members.items():
+            assert zipf.read(name) == content, f'{name} differs'
+
+def main():
+    parser = argparse.ArgumentParser(description='Client ZIP build time and size: serial zipfile vs the parallel builder per compression method.')
+    parser.add_argument('--dates', type=int, default=12, help='Dated workbooks per client ZIP')
+    parser.add_argument('--sheets', type=int, default=6)
+    parser.add_argument('--rows', type=int, default=4000)
+    parser.add_argument('--gt-rows', type=int, default=500000)
+    parser.add_argument('--workers', type=int, default=zip_builder.ZIP_WORKERS)
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        members = client_members(tmp, args.dates, args.sheets, args.rows, args.gt_rows)
+    total = sum((len(content) for content in members.values()))
+    print(f'{len(members)} members, {total / 1024 / 1024:.1f} MB uncompressed; {args.workers} worker(s) on {os.cpu_count()} CPU(s)')
+    serial, serial_time = best_of(lambda: build_serial(members), args.repeat)
+    check(serial, members)
+    print(f"{'builder':<28} {'MB':>8} {'ratio':>6} {'time':>8} {'vs serial':>10}")
+    print(f"{'serial zipfile (deflate 6)':<28} {len(serial) / 1024 / 1024:>8.2f} {total / len(serial):>5.1f}x {serial_time:>7.2f}s {1.0:>9.2f}x")
+    for compression in zip_builder.available_zip_compressions():
+        for workers in sorted({1, args.workers}):
+            archive, elapsed = best_of(lambda: build_parallel(members, compression, workers), args.repeat)
+            check(archive, members)
+            label = f'{compression}, {workers} thread(s)'
+            print(f'{label:<28} {len(archive) / 1024 / 1024:>8.2f} {total / len(archive):>5.1f}x {elapsed:>7.2f}s {serial_time / elapsed:>9.2f}x')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import calendar
+import datetime
+import traceback
+
+import jobs
+import fpk_t
+import gt_t
+import sw_t
+import zip_builder
+import output_formats
+
+# Headless runs of the three processors, e.g. from cron:
+#   python cli.py fpk exports.zip -o out --client Dialog_Axiata --workers 8 --report report.json
+#   python cli.py gt trends/ -o out --date 2024-01-31
+#   python cli.py sw screenshots.zip -o out --org MyCompany --brand MyBrand --date 2024-01-31
+EXIT_OK = 0
+EXIT_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+class ConsoleJob(jobs.Job):
+    # The job bodies the pages run in the background report here; progress goes to stderr so
+    # stdout stays free for the JSON report
+
+    def __init__(self, kind, label, quiet=False):
+        super().__init__(kind, label)
+        self.quiet = quiet
+        self.status = 'running'
+
+    def update(self, progress=None, message=None):
+        super().update(progress, message)
+        if message is not None and (not self.quiet):
+            print(f'[{self.progress * 100:5.1f}%] {message}', file=sys.stderr, flush=True)
+
+def read_source(path):
+    # ZIP bytes or a folder path, the two inputs the batch job bodies take
+    if os.path.isdir(path):
+        return path
+    with open(path, 'rb') as f:
+        return f.read()
+
+def iter_source_files(source, extensions):
+    if isinstance(source, bytes):
+        with zipfile.ZipFile(io.BytesIO(source)) as zipf:
+            for info in zipf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(extensions) and '__MACOSX' not in info.filename.split('/'):
+                    yield (info.filename, zipf.read(info))
+    else:
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(extensions):
+                    with open(os.path.join(root, name), 'rb') as f:
+                        yield (os.path.relpath(os.path.join(root, name), source), f.read())
+
+def write_output(output_dir, filename, content):
+    path = os.path.join(output_dir, filename)
+    with open(f'{path}.part', 'wb') as f:
+        f.write(content)
+    os.replace(f'{path}.part', path)
+    return path
+
+def message_errors(messages):
+    return [text for level, text in messages if level == 'error']
+
+def run_fpk(args, job):
+    source = read_source(args.input)
+    analysis = fpk_t.analyze_zip_archive(io.BytesIO(source)) if isinstance(source, bytes) else fpk_t.analyze_zip_structure(source)
+    if not analysis['excel_files']:
+        return {'errors': ["No Excel files found in dated folders (e.g. '2024-01-15')."], 'outputs': []}
+    zip_path = os.path.join(args.output, f'{args.client}_processed_files.zip')
+    try:
+        result = fpk_t.write_client_zip(job, f'{zip_path}.part', source if isinstance(source, bytes) else None, analysis['excel_files'], args.client, args.workers, not args.no_reuse, args.engine, args.format, args.timeout, args.max_rss_mb, args.compression, args.save_history)
+        os.replace(f'{zip_path}.part', zip_path)
+    except BaseException:
+        if os.path.exists(f'{zip_path}.part'):
+            os.remove(f'{zip_path}.part')
+        raise
+    files = [{key: r[key] for key in ('status', 'sheet_name', 'source_file', 'file_path', 'rows_processed', 'reason') if key in r} for r in result['results']]
+    errors = [f"{r.get('source_file', '')}: {r['sheet_name']}: {r['reason']}" for r in result['results'] if r['status'] == 'error']
+    counts = {status: sum((1 for r in result['results'] if r['status'] == status)) for status in ('success', 'merged', 'skipped', 'error')}
+    return {'errors': errors + [f'History store: {e}' for e in result['history_errors']], 'outputs': [zip_path], 'counts': counts, 'workbooks': result['total_files'], 'reused_workbooks': result['reused_files'], 'history_rows': result['history_rows'], 'files': files}
+
+def run_gt(args, job):
+    result = gt_t.run_trends_batch_job(job, read_source(args.input), args.date, args.workers)
+    outputs = [write_output(args.output, gt_t.trends_output_filename(name, result['date_suffix'], args.format), output_formats.encode_frame(df, args.format)) for name, df in result['processed_data'].items()]
+    errors = message_errors(result['messages'])
+    if not result['processed_data']:
+        errors.append('No Google Trends data was processed.')
+    report = {'errors': errors, 'outputs': outputs, 'rows': {name: len(df) for name, df in result['processed_data'].items()}, 'files': result['batch'], 'messages': [{'level': level, 'text': text} for level, text in result['messages']]}
+    if args.save_history:
+        report['history_rows'] = gt_t.save_trends_history(result['processed_data'], args.client)
+    return report
+
+def run_sw(args, job):
+    eng_bytes = soc_bytes = None
+    channel_images = {}
+    unmatched = []
+    for name, data in iter_source_files(read_source(args.input), IMAGE_EXTENSIONS):
+        kind = sw_t.classify_sw_image(name)
+        if kind == 'engagement':
+            eng_bytes = data
+        elif kind == 'social':
+            soc_bytes = data
+        elif kind is not None:
+            channel_images[kind] = data
+        else:
+            unmatched.append(name)
+    if not (eng_bytes or soc_bytes or channel_images):
+        return {'errors': ['No engagement, social network or channel images found.'], 'outputs': [], 'unmatched_images': unmatched}
+    job.update(0.0, 'Loading OCR reader...')
+    result = sw_t.run_extraction_job(job, sw_t.create_reader(), args.org, args.brand, args.date.strftime('%Y%m%d'), eng_bytes, soc_bytes, {c_type: channel_images[c_type] for c_type in sw_t.CHANNEL_TYPES if c_type in channel_images})
+    file_prefix = f"{args.org}_{args.brand}_{args.date.strftime('%Y-%m-%d')}"
+    outputs = [write_output(args.output, file_name, encode()) for _, _, file_name, encode in sw_t.sw_output_files(result, file_prefix)]
+    return {'errors': message_errors(result['messages']), 'outputs': outputs, 'images': {'engagement': eng_bytes is not None, 'social': soc_bytes is not None, 'channels': sorted(channel_images)}, 'unmatched_images': unmatched, 'timings': result['timings'], 'messages': [{'level': level, 'text': text} for level, text in result['messages']]}
+
+PROCESSORS = {'fpk': ('fpk_batch', 'FPK workbooks', run_fpk), 'gt': ('google_trends_batch', 'Google Trends exports', run_gt), 'sw': ('sw_extraction', 'SimilarWeb images', run_sw)}
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+def choice_label(choices):
+    # Case-insensitive choices, e.g. --format parquet for 'Parquet'
+    labels = {label.lower(): label for label in choices}
+
+    def parse(value):
+        return labels.get(value.lower(), value)
+    return parse
+
+def end_of_month():
+    today = datetime.date.today()
+    return today.replace(day=calendar.monthrange(today.year, today.month)[1])
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Run the FPK, Google Trends and SimilarWeb processors without the Streamlit UI.', epilog=f'Exit codes: {EXIT_OK} all inputs processed, {EXIT_ERRORS} finished with errors (see the report), {EXIT_USAGE} bad arguments or input, {EXIT_FAILED} the run crashed.')
+    subparsers = parser.add_subparsers(dest='processor', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('input', help='Folder or ZIP file to process')
+    common.add_argument('-o', '--output', required=True, help='Folder the outputs are written to')
+    common.add_argument('--report', default='-', help="Where the JSON report goes ('-' for stdout)")
+    common.add_argument('-q', '--quiet', action='store_true', help='No progress on stderr')
+    fpk = subparsers.add_parser('fpk', parents=[common], help='Dated folders of FPK Excel workbooks -> client ZIP')
+    fpk.add_argument('--client', required=True)
+    fpk.add_argument('--workers', type=int, default=fpk_t.DEFAULT_MAX_WORKERS, help='Worker processes for workbooks')
+    fpk.add_argument('--engine', default=fpk_t.DEFAULT_EXCEL_ENGINE, choices=fpk_t.EXCEL_ENGINES)
+    fpk.add_argument('--format', default=output_formats.DEFAULT_OUTPUT_FORMAT, type=choice_label(output_formats.available_output_formats()), choices=output_formats.available_output_formats())
+    fpk.add_argument('--compression', default=zip_builder.DEFAULT_ZIP_COMPRESSION, choices=zip_builder.available_zip_compressions())
+    fpk.add_argument('--timeout', type=float, default=fpk_t.WORKBOOK_TIMEOUT_SECONDS, help='Seconds per workbook, 0 for no limit')
+    fpk.add_argument('--max-rss-mb', type=int, default=fpk_t.WORKBOOK_MAX_RSS_MB, help='Memory per workbook, 0 for no limit')
+    fpk.add_argument('--no-reuse', action='store_true', help='Reprocess workbooks whose outputs are cached from earlier runs')
+    fpk.add_argument('--save-history', action='store_true', help='Also save the outputs to the history store')
+    gt = subparsers.add_parser('gt', parents=[common], help='Google Trends CSV exports -> merged timeline/region/city files')
+    gt.add_argument('--date', type=parse_date, default=end_of_month(), help='YYYY-MM-DD for exports with no date in their path (default: end of this month)')
+    gt.add_argument('--workers', type=int, default=gt_t.BATCH_MAX_WORKERS, help='Threads parsing exports')
+    gt.add_argument('--format', default=output_formats.DEFAULT_OUTPUT_FORMAT, type=choice_label(output_formats.available_output_formats()), choices=output_formats.available_output_formats())
+    gt.add_argument('--save-history', action='store_true', help='Also save the outputs to the history store (needs --client)')
+    gt.add_argument('--client', help='Client the outputs are saved under in the history store')
+    sw = subparsers.add_parser('sw', parents=[common], help="SimilarWeb screenshots -> CSVs; images are matched by name ('engagement', 'social', channel types)")
+    sw.add_argument('--org', required=True)
+    sw.add_argument('--brand', required=True)
+    sw.add_argument('--date', type=parse_date, default=end_of_month(), help='YYYY-MM-DD (default: end of this month)')
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (os.path.isdir(args.input) or zipfile.is_zipfile(args.input)):
+        parser.error(f'{args.input} is neither a folder nor a ZIP file')
+    if args.processor == 'gt' and args.save_history and (not args.client):
+        parser.error('--save-history needs --client')
+    args.output = os.path.abspath(args.output)
+    os.makedirs(args.output, exist_ok=True)
+    kind, label, run = PROCESSORS[args.processor]
+    job = ConsoleJob(kind, label, args.quiet)
+    started = time.time()
+    report = {'processor': args.processor, 'input': os.path.abspath(args.input), 'started': datetime.datetime.fromtimestamp(started).isoformat(timespec='seconds')}
+    try:
+        report.update(run(args, job))
+        report['status'] = 'errors' if report['errors'] else 'ok'
+        exit_code = EXIT_ERRORS if report['errors'] else EXIT_OK
+    except Exception as e:
+        traceback.print_exc()
+        report.update({'status': 'failed', 'errors': [f'{type(e).__name__}: {e}']})
+        exit_code = EXIT_FAILED
+    finally:
+        # Spooled files the job bodies hand back for cleanup
+        for path in job.cleanup_paths:
+            if os.path.exists(path):
+                os.remove(path)
+    report['elapsed_seconds'] = round(time.time() - started, 3)
+    report['exit_code'] = exit_code
+    text = json.dumps(report, indent=2, default=str)
+    if args.report == '-':
+        print(text)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return exit_code
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import shutil
+import secrets
+import tempfile
+import threading
+from urllib.parse import quote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+# Finished outputs (client ZIPs) are moved here and handed out by token until they expire
+FILE_STORE_DIR = os.environ.get('FILE_STORE_DIR', os.path.join(tempfile.gettempdir(), 'etl_downloads'))
+FILE_STORE_TTL_SECONDS = int(os.environ.get('FILE_STORE_TTL_SECONDS', 3600))
+# When set, files are streamed in chunks by a small HTTP endpoint on this port instead of going
+# through Streamlit, which holds a download's bytes in memory. DOWNLOAD_BASE_URL is the address
+# browsers use to reach it (e.g. behind a reverse proxy). It listens on loopback only unless
+# DOWNLOAD_SERVER_HOST names another interface; the token in the URL is a file's only protection.
+DOWNLOAD_SERVER_PORT = int(os.environ.get('DOWNLOAD_SERVER_PORT', 0))
+DOWNLOAD_SERVER_HOST = os.environ.get('DOWNLOAD_SERVER_HOST', '127.0.0.1')
+DOWNLOAD_BASE_URL = os.environ.get('DOWNLOAD_BASE_URL', f'http://localhost:{DOWNLOAD_SERVER_PORT}')
+CHUNK_BYTES = 1024 * 1024
+
+def entry_paths(token):
+    return (os.path.join(FILE_STORE_DIR, f'{token}.data'), os.path.join(FILE_STORE_DIR, f'{token}.json'))
+
+def store_file(path, filename, mime='application/octet-stream', ttl=FILE_STORE_TTL_SECONDS):
+    # Moves the file into the store; returns its token and the paths to remove when it's discarded
+    prune_store()
+    os.makedirs(FILE_STORE_DIR, exist_ok=True)
+    token = secrets.token_urlsafe(24)
+    data_path, meta_path = entry_paths(token)
+    shutil.move(path, data_path)
+    with open(f'{meta_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'filename': filename, 'mime': mime, 'size': os.path.getsize(data_path), 'expires': time.time() + ttl}, f)
+    os.replace(f'{meta_path}.tmp', meta_path)
+    return (token, [data_path, meta_path])
+
+def get_entry(token):
+    if not token or not token.replace('-', '').replace('_', '').isalnum():
+        return None
+    data_path, meta_path = entry_paths(token)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta['expires'] < time.time() or not os.path.exists(data_path):
+        return None
+    return (data_path, meta)
+
+def remove_entry(token):
+    for path in entry_paths(token):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def prune_store():
+    now = time.time()
+    for meta_path in [os.path.join(FILE_STORE_DIR, name) for name in os.listdir(FILE_STORE_DIR) if name.endswith('.json')] if os.path.isdir(FILE_STORE_DIR) else []:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                expired = json.load(f)['expires'] < now
+        except (OSError, ValueError, KeyError):
+            expired = True
+        if expired:
+            remove_entry(os.path.basename(meta_path)[:-len('.json')])
+
+class DownloadHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        entry = get_entry(self.path.strip('/').split('?')[0])
+        if entry is None:
+            self.send_error(404, 'Download not found or expired')
+            return
+        data_path, meta = entry
+        with open(data_path, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Type', meta['mime'])
+            self.send_header('Content-Length', str(os.path.getsize(data_path)))
+            self.send_header('Content-Disposition', f"attachment; filename*=utf-8''{quote(meta['filename'], safe='')}")
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, CHUNK_BYTES)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def ensure_download_server():
+    global _server
+    if not DOWNLOAD_SERVER_PORT:
+        return False
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((DOWNLOAD_SERVER_HOST, DOWNLOAD_SERVER_PORT), DownloadHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='etl-downloads', daemon=True).start()
+    return True
+
+def read_entry(token):
+    entry = get_entry(token)
+    if entry is None:
+        raise FileNotFoundError('This download has expired. Process the files again.')
+    with open(entry[0], 'rb') as f:
+        return f.read()
+
+def download_button(token, label, key=None):
+    entry = get_entry(token)
+    if entry is None:
+        st.warning('This download has expired. Process the files again.')
+        return
+    data_path, meta = entry
+    if ensure_download_server():
+        st.link_button(label, f"{DOWNLOAD_BASE_URL.rstrip('/')}/{token}")
+    else:
+        # Deferred: the file stays on disk until the button is clicked, then goes over HTTP, not the websocket
+        st.download_button(label, data=lambda: read_entry(token), file_name=meta['filename'], mime=meta['mime'], key=key, on_click='ignore')
+    st.caption(f"{meta['size'] / 1024 / 1024:.1f} MB, available until {time.strftime('%H:%M', time.localtime(meta['expires']))}")
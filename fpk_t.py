@@ -3,16 +3,28 @@ import sys
 import asyncio
 import streamlit as st
 import pandas as pd
+import numpy as np
 import re
 from datetime import datetime
 import time
-import base64
 import zipfile
 import tempfile
 import shutil
 import io
+import json
 import glob
+import contextlib
+import pickle
+import hashlib
+import importlib.util
 from pathlib import Path
+import output_formats
+import jobs
+import isolated_pool
+import zip_builder
+import file_store
+import result_store
+import history_store
 
 def hide_streamlit_ui():
     hide_menu_and_footer_css = '\n        <style>\n        #MainMenu {display: none;}\n        footer {display: none;}\n        [data-testid="stToolbar"] {display: none;}\n        </style>\n    '
@@ -26,6 +38,40 @@ logging.getLogger('streamlit').setLevel(logging.ERROR)
 
 # CSS moved to app() function
 
+DEFAULT_MAX_WORKERS = max(1, os.cpu_count() or 1)
+# Bump whenever a change to the sheet processing alters the outputs a workbook produces; cache and
+# checkpoint keys also include the reader versions (see processor_version)
+PROCESSOR_VERSION = '2'
+FPK_CACHE_DIR = os.environ.get('FPK_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fpk_cache'))
+# Size cap of the reuse cache; least recently used workbooks are evicted first. 0 disables the cap.
+FPK_CACHE_MAX_BYTES = int(os.environ.get('FPK_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+READER_PACKAGES = ['pandas', 'openpyxl', 'python-calamine', 'xlrd']
+# 'openpyxl' is pandas' default reader (it already opens workbooks read-only); 'calamine' needs
+# python-calamine and is much faster; 'auto' picks calamine when it is installed.
+# 'openpyxl-stream' iterates rows and writes CSVs to disk in chunks, for sheets too big for memory.
+STREAMING_ENGINE = 'openpyxl-stream'
+EXCEL_ENGINES = ['auto', 'openpyxl', 'calamine', STREAMING_ENGINE]
+DEFAULT_EXCEL_ENGINE = os.environ.get('FPK_EXCEL_ENGINE', 'auto')
+STREAM_CHUNK_ROWS = 5000
+# Cell texts pandas' parser reads as NaN by default
+STREAM_NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+# Column types per client and sheet type, inferred once and reused across workbooks and runs
+SCHEMA_REGISTRY_PATH = os.path.join(FPK_CACHE_DIR, 'schema_registry.json')
+USE_SCHEMA_REGISTRY = os.environ.get('FPK_SCHEMA_REGISTRY', '1') != '0'
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+TEXT_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else object
+# Matches str(datetime) for whole seconds, so typed datetime columns write the same CSV as object ones
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+ADDED_COLUMN_KINDS = {'Date': 'date', 'Network': 'string'}
+FPK_SPOOL_DIR = os.environ.get('FPK_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'fpk_spool'))
+PREVIEW_ROWS = 20
+# Per-archive progress of ZIP runs, so a restarted run resumes instead of starting over
+FPK_CHECKPOINT_DIR = os.environ.get('FPK_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'fpk_checkpoints'))
+CHECKPOINT_TTL_SECONDS = int(os.environ.get('FPK_CHECKPOINT_TTL_SECONDS', 7 * 24 * 3600))
+# Budget per workbook; a workbook over either limit has its worker killed and is reported as an error. 0 disables a limit.
+WORKBOOK_TIMEOUT_SECONDS = float(os.environ.get('FPK_WORKBOOK_TIMEOUT_SECONDS', 600))
+WORKBOOK_MAX_RSS_MB = int(os.environ.get('FPK_WORKBOOK_MAX_RSS_MB', 2048))
+
 
 def sanitize_sheet_name(sheet_name):
     sanitized = re.sub('[\\.…]', '_', sheet_name)
@@ -45,17 +91,6 @@ def parse_sheet_name_format(sheet_name):
         return (sheet_type, network_type)
     return (None, None)
 
-def get_zip_download_link(zip_path, filename, text):
-    try:
-        with open(zip_path, 'rb') as f:
-            zip_data = f.read()
-        b64 = base64.b64encode(zip_data).decode()
-        href = f'<a href="data:application/zip;base64,{b64}" download="{filename}">{text}</a>'
-        return href
-    except Exception as e:
-        st.error(f'Error creating download link: {str(e)}')
-        return ''
-
 def validate_date_folder_name(folder_name):
     date_patterns = ['^\\d{4}-\\d{2}-\\d{2}$', '^\\d{4}\\.\\d{2}\\.\\d{2}$', '^\\d{4}_\\d{2}_\\d{2}$', '^\\d{8}$']
     for pattern in date_patterns:
@@ -73,21 +108,6 @@ def validate_date_folder_name(folder_name):
                 continue
     return None
 
-def extract_zip_file(uploaded_zip_file):
-    try:
-        temp_dir = tempfile.mkdtemp()
-        zip_temp_path = os.path.join(temp_dir, 'uploaded.zip')
-        with open(zip_temp_path, 'wb') as f:
-            f.write(uploaded_zip_file.getvalue())
-        with zipfile.ZipFile(zip_temp_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-        os.remove(zip_temp_path)
-        return (temp_dir, None)
-    except Exception as e:
-        if 'temp_dir' in locals() and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        return (None, str(e))
-
 def safe_cleanup_temp_dir(temp_dir):
     if not temp_dir or not os.path.exists(temp_dir):
         return True
@@ -115,170 +135,1064 @@ def analyze_zip_structure(temp_dir):
                 excel_files.append({'path': file_path, 'date': Date, 'folder_name': folder_name})
     return {'date_folders': date_folders, 'excel_files': excel_files, 'total_files': total_files, 'total_date_folders': len(date_folders), 'temp_dir': temp_dir}
 
-def get_excel_sheet_names(file_path):
+def analyze_zip_archive(zip_source):
+    # Reads only the central directory; members stay compressed until a worker needs them
+    date_folders = {}
+    excel_files = []
+    total_files = 0
+    with zipfile.ZipFile(zip_source) as archive:
+        for member in archive.infolist():
+            parts = [p for p in member.filename.split('/') if p]
+            if not parts:
+                continue
+            folder_parts = parts if member.is_dir() else parts[:-1]
+            if not folder_parts:
+                continue
+            folder_name = folder_parts[-1]
+            Date = validate_date_folder_name(folder_name)
+            if not Date:
+                continue
+            folder_path = '/'.join(folder_parts)
+            if folder_path not in date_folders:
+                date_folders[folder_path] = {'name': folder_name, 'path': folder_path, 'date': Date, 'file_count': 0}
+            if member.is_dir() or not parts[-1].lower().endswith(('.xlsx', '.xls')):
+                continue
+            date_folders[folder_path]['file_count'] += 1
+            total_files += 1
+            excel_files.append({'path': member.filename, 'member': member.filename, 'date': Date, 'folder_name': folder_name})
+    return {'date_folders': list(date_folders.values()), 'excel_files': excel_files, 'total_files': total_files, 'total_date_folders': len(date_folders)}
+
+def read_zip_member(archive, member):
+    return io.BytesIO(archive.read(member))
+
+def get_excel_file_source(file_info, archive=None):
+    if 'member' in file_info:
+        return read_zip_member(archive, file_info['member'])
+    return file_info['path']
+
+def resolve_excel_engine(engine):
+    if engine == 'auto':
+        return 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+    return engine
+
+def rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+def open_excel_file(source, engine=DEFAULT_EXCEL_ENGINE):
+    engine = resolve_excel_engine(engine)
+    if engine not in ('openpyxl', STREAMING_ENGINE):
+        try:
+            return pd.ExcelFile(source, engine=engine)
+        except Exception:
+            rewind(source)
+    # engine=None lets pandas use openpyxl for .xlsx and xlrd for legacy .xls
+    return pd.ExcelFile(source)
+
+def get_excel_sheet_names(file_path, engine=DEFAULT_EXCEL_ENGINE):
     try:
-        with pd.ExcelFile(file_path) as excel_file:
+        with open_excel_file(file_path, engine) as excel_file:
             return excel_file.sheet_names
     except Exception as e:
         return [f'Error reading sheets: {str(e)}']
 
-def create_client_zip(client_name, source_dir, processed_files_results):
+def open_client_zip(target, compression=zip_builder.DEFAULT_ZIP_COMPRESSION):
+    return zip_builder.ParallelZipWriter(target, compression, spill_dir=FPK_SPOOL_DIR)
+
+def convert_spooled_output(path, output_format, column_kinds=None):
+    # Spooled CSVs are converted file to file so large streamed outputs never sit in memory
+    os.makedirs(FPK_SPOOL_DIR, exist_ok=True)
+    fd, converted_path = tempfile.mkstemp(suffix=output_formats.OUTPUT_FORMATS[output_format][0], dir=FPK_SPOOL_DIR)
+    os.close(fd)
     try:
+        output_formats.convert_csv(path, output_format, converted_path, column_kinds)
+    except BaseException:
+        os.remove(converted_path)
+        raise
+    return converted_path
+
+def add_result_to_zip(zipf, result, folder_structure, output_format=output_formats.DEFAULT_OUTPUT_FORMAT, release=False):
+    # Encoding and compression happen later on the writer's threads. With release=True the
+    # writer takes over the result's content and deletes a spooled CSV once it has been read.
+    folder_name = result.get('folder_name', 'Unnamed')
+    filename = output_formats.output_filename(os.path.basename(result['file_path']), output_format)
+    result['file_path'] = f'{folder_name}/{filename}'
+    files = folder_structure.setdefault(folder_name, [])
+    if filename in files:
+        # Entries can't be overwritten in a streamed ZIP, so keep both outputs side by side
+        stem, ext = os.path.splitext(filename)
+        n = 2
+        while f'{stem} ({n}){ext}' in files:
+            n += 1
+        filename = f'{stem} ({n}){ext}'
+        result['file_path'] = f'{folder_name}/{filename}'
+    path = result.get('file_content_path')
+    content = result.get('file_content')
+    df = result.get('dataframe')
+    kinds = result.get('column_kinds')
+    remove_source = False
+    if release:
+        remove_source = result.pop('spooled', False)
+        result.pop('file_content_path', None)
+        result.pop('file_content', None)
+        result.pop('dataframe', None)
+
+    def produce():
+        try:
+            if path is None:
+                if df is not None and output_format != output_formats.DEFAULT_OUTPUT_FORMAT:
+                    return (output_formats.encode_frame(df, output_format, kinds), False)
+                return (output_formats.encode_csv(content, output_format, kinds), False)
+            if output_format == output_formats.DEFAULT_OUTPUT_FORMAT:
+                return (path, remove_source)
+            converted_path = convert_spooled_output(path, output_format, kinds)
+        except BaseException:
+            if remove_source:
+                os.remove(path)
+            raise
+        if remove_source:
+            os.remove(path)
+        return (converted_path, True)
+    zipf.add(result['file_path'], produce)
+    files.append(filename)
+
+def has_result_content(result):
+    return 'file_content' in result or 'file_content_path' in result
+
+def result_content(result):
+    if 'file_content_path' in result:
+        with open(result['file_content_path'], 'rb') as f:
+            return f.read()
+    return result['file_content']
+
+def release_result_content(result):
+    result.pop('file_content', None)
+    result.pop('dataframe', None)
+    path = result.pop('file_content_path', None)
+    if path and result.pop('spooled', False) and os.path.exists(path):
+        os.remove(path)
+
+def save_result_to_history(result, client_name, file_date):
+    # Typed with the declared column kinds like the columnar outputs: from the DataFrame when the
+    # result still has it, else from the streamed or cached CSV. Partitions are keyed on the
+    # workbook's name too, so two workbooks of one dated folder don't replace each other's rows.
+    if result.get('dataframe') is not None:
+        table = output_formats.frame_table(result['dataframe'], result.get('column_kinds'))
+    else:
+        table = output_formats.read_csv_table(result.get('file_content_path') or result['file_content'], result.get('column_kinds'))
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    return history_store.ingest_frame('fpk', result['folder_name'], df, client_name, file_date, 'Network', origin=os.path.basename(result.get('source_file', '')))
+
+def display_history_summary(result):
+    if result.get('history_rows'):
+        st.info(f"🗄️ Saved {result['history_rows']} row(s) to the history store.")
+    for error in result.get('history_errors', []):
+        st.warning(f'Could not save to the history store: {error}')
+
+def create_client_zip(processed_files_results, output_format=output_formats.DEFAULT_OUTPUT_FORMAT, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, target=None):
+    # Returns the ZIP bytes, or the target path when one is given
+    try:
+        buffer = io.BytesIO() if target is None else target
         folder_structure = {}
-        for result in processed_files_results:
-            if result['status'] == 'success':
-                folder_name = result.get('folder_name', 'Unnamed')
-                if 'file_path' in result:
-                    filename = os.path.basename(result['file_path'])
-                    if folder_name not in folder_structure:
-                        folder_structure[folder_name] = []
-                    folder_structure[folder_name].append(filename)
-        zip_filename = f'{client_name}_processed_files.zip'
-        zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(source_dir):
-                for file in files:
-                    if file.endswith('.csv'):
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, source_dir)
-                        zipf.write(file_path, arcname)
-        return (zip_path, folder_structure, None)
+        with open_client_zip(buffer, compression) as zipf:
+            for result in processed_files_results:
+                if result['status'] == 'success' and has_result_content(result):
+                    add_result_to_zip(zipf, result, folder_structure, output_format)
+        return (buffer.getvalue() if target is None else target, folder_structure, None)
     except Exception as e:
         return (None, None, str(e))
 
-def process_excel_file_single(uploaded_file, file_date, base_output_dir):
-    processed_files_report = []
+_schema_registry = None
+
+@contextlib.contextmanager
+def locked_file(path):
+    # Exclusive lock across processes, e.g. isolated workers saving the schema registry at once
+    with open(path, 'a+b') as f:
+        if sys.platform == 'win32':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == 'win32':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_schema_registry():
+    # {client name: {sheet type: {column: kind}}}
     try:
-        with pd.ExcelFile(uploaded_file) as excel_file:
-            sheet_names = excel_file.sheet_names
-            sheet_type_dataframes = {}
-            for sheet_name in sheet_names:
+        with open(SCHEMA_REGISTRY_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_schema_registry():
+    global _schema_registry
+    if _schema_registry is None:
+        _schema_registry = load_schema_registry()
+    return _schema_registry
+
+def client_schema(client_name, schema_key):
+    return get_schema_registry().get(client_name or '', {}).get(schema_key, {})
+
+def merge_column_kind(kind, found):
+    # Integer columns widen to float; otherwise the first registered kind stays and a column that
+    # doesn't fit it is left untyped for that sheet only. 'object' is never registered.
+    if found is None or found == 'object' or found == kind:
+        return kind
+    if kind is None:
+        return found
+    if {kind, found} == {'integer', 'float'}:
+        return 'float'
+    return kind
+
+def save_schema_kinds(client_name, new_kinds):
+    # new_kinds: {sheet type: {column: kind}} found while processing a workbook. Merged into the file
+    # as it is now, under a lock, so workers saving at the same time keep each other's kinds.
+    global _schema_registry
+    if not any(new_kinds.values()):
+        return
+    try:
+        os.makedirs(os.path.dirname(SCHEMA_REGISTRY_PATH), exist_ok=True)
+        with locked_file(f'{SCHEMA_REGISTRY_PATH}.lock'):
+            registry = load_schema_registry()
+            schemas = registry.setdefault(client_name or '', {})
+            for schema_key, kinds in new_kinds.items():
+                schema = schemas.setdefault(schema_key, {})
+                for name, kind in kinds.items():
+                    merged = merge_column_kind(schema.get(name), kind)
+                    if merged is not None:
+                        schema[name] = merged
+            tmp_path = f'{SCHEMA_REGISTRY_PATH}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(registry, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, SCHEMA_REGISTRY_PATH)
+        _schema_registry = registry
+    except OSError:
+        pass
+
+def infer_column_kind(column):
+    values = column.dropna()
+    if values.empty:
+        return None
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'integer':
+        return 'integer'
+    if inferred in ('floating', 'mixed-integer-float'):
+        # Counts with blank cells come out of Excel as floats; whole numbers are still integers
+        numbers = values.astype('float64')
+        return 'integer' if (numbers == np.floor(numbers)).all() else 'float'
+    if inferred in ('datetime', 'datetime64'):
+        return 'datetime'
+    if inferred == 'string':
+        return 'category' if values.nunique() <= len(values) * CATEGORY_MAX_UNIQUE_RATIO else 'string'
+    return 'object'
+
+def cast_column(column, kind):
+    # None when the column no longer fits its registered kind; mixed int/float columns stay
+    # object because float64 would write whole numbers as "1.0"
+    values = column.dropna()
+    inferred = pd.api.types.infer_dtype(values, skipna=True) if len(values) else 'empty'
+    if kind == 'integer' and inferred in ('integer', 'empty'):
+        return column.astype('Int64')
+    if kind == 'float' and inferred in ('floating', 'empty'):
+        return column.astype('float64')
+    if kind == 'datetime' and inferred in ('datetime', 'empty'):
+        typed = pd.to_datetime(column)
+        valid = typed.dropna()
+        if (valid.dt.microsecond == 0).all() and (valid.dt.nanosecond == 0).all():
+            return typed
+    if kind == 'category' and inferred in ('string', 'empty'):
+        return column.astype('category')
+    if kind == 'string' and inferred in ('string', 'empty'):
+        return column.astype(TEXT_DTYPE)
+    return None
+
+def register_column_kind(schema, found, name, kind):
+    registered = found.get(name, schema.get(name))
+    kind = merge_column_kind(registered, kind)
+    if kind is not None and kind != registered:
+        found[name] = kind
+    return kind
+
+def apply_sheet_schema(df, client_name, schema_key, new_kinds):
+    # Kinds found for columns the client's sheet type doesn't have yet (or widened from integer to
+    # float) are collected in new_kinds and saved once the workbook is done
+    if not USE_SCHEMA_REGISTRY:
+        return df
+    schema = client_schema(client_name, schema_key)
+    found = new_kinds.setdefault(schema_key, {})
+    for i, label in enumerate(df.columns):
+        column = df.iloc[:, i]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            continue
+        kind = register_column_kind(schema, found, str(label), infer_column_kind(column))
+        # object, or pandas 3's inferred str for all-text columns; numeric dtypes are already typed
+        # and only registered, so their columnar outputs get the same type in every file
+        if kind is None or not pd.api.types.is_string_dtype(column.dtype):
+            continue
+        typed = cast_column(column, kind)
+        if typed is None:
+            # Doesn't fit (e.g. text in a count column): stays object in this sheet, and the
+            # registered kind is kept for everything else
+            continue
+        df.isetitem(i, typed)
+    return df
+
+def column_kinds(labels, client_name, schema_key, new_kinds):
+    # Declared kind of each output column, in order, for the columnar output formats: the client's
+    # registered kinds, and the Date and Network columns the processor adds
+    schema = client_schema(client_name, schema_key) if USE_SCHEMA_REGISTRY else {}
+    found = new_kinds.get(schema_key, {})
+    return [found.get(str(label), schema.get(str(label), ADDED_COLUMN_KINDS.get(label))) for label in labels]
+
+def broadcast_column(value, length):
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), [value])
+
+def concat_sheet_frames(dfs):
+    # Categoricals only survive pd.concat when every frame has the same categories, and a column
+    # typed differently across sheets goes back to object so concat can't upcast Int64 to Float64
+    labels = []
+    for df in dfs:
+        labels += [label for label in df.columns if label not in labels]
+    for label in labels:
+        holders = [df for df in dfs if label in df.columns]
+        columns = [df[label] for df in holders]
+        if not all((isinstance(c, pd.Series) for c in columns)):
+            continue
+        if all((isinstance(c.dtype, pd.CategoricalDtype) for c in columns)):
+            categories = pd.api.types.union_categoricals(columns).categories
+            for df in holders:
+                df[label] = df[label].cat.set_categories(categories)
+        elif len({str(c.dtype) for c in columns}) > 1:
+            for df in holders:
+                df[label] = df[label].astype(object)
+    return pd.concat(dfs, ignore_index=True)
+
+def process_workbook_sheets(excel_file, Date, processed_files, client_name=''):
+    sheet_type_dataframes = {}
+    new_kinds = {}
+    for sheet_name in excel_file.sheet_names:
+        try:
+            # Parse through the open handle so the workbook is only loaded once
+            df = excel_file.parse(sheet_name=sheet_name, header=None)
+            if df.empty or len(df) < 2:
+                processed_files.append({'status': 'skipped', 'reason': 'Sheet is empty or has insufficient data', 'sheet_name': sheet_name})
+                continue
+            if len(df.columns) > 0:
+                first_col_empty_ratio = df.iloc[:, 0].isna().sum() / len(df)
+                if first_col_empty_ratio > 0.8:
+                    df = df.drop(df.columns[0], axis=1)
+            header_row = 4
+            if header_row >= len(df):
+                header_row = min(4, len(df) - 1) if len(df) > 1 else 0
+            if len(df) > header_row:
+                df.columns = df.iloc[header_row]
+                if header_row + 1 < len(df):
+                    df = df.iloc[header_row + 1:].reset_index(drop=True)
+                else:
+                    df = pd.DataFrame(columns=df.columns)
+            df = df.dropna(how='all')
+            if df.empty:
+                processed_files.append({'status': 'skipped', 'reason': 'No data rows after processing', 'sheet_name': sheet_name})
+                continue
+            sheet_type, network_type = parse_sheet_name_format(sheet_name)
+            schema_key = sheet_type if sheet_type and network_type else sanitize_sheet_name(sheet_name)
+            df = apply_sheet_schema(df, client_name, schema_key, new_kinds)
+            if 'Date' not in df.columns:
+                df.insert(0, 'Date', broadcast_column(Date.strftime('%Y-%m-%d'), len(df)))
+            if sheet_type and network_type:
+                if 'Network' in df.columns:
+                    df['Network'] = broadcast_column(network_type, len(df))
+                else:
+                    df.insert(1, 'Network', broadcast_column(network_type, len(df)))
+                if sheet_type not in sheet_type_dataframes:
+                    sheet_type_dataframes[sheet_type] = []
+                sheet_type_dataframes[sheet_type].append(df)
+                processed_files.append({'status': 'merged', 'sheet_name': sheet_name, 'rows_processed': len(df), 'sheet_type': sheet_type, 'network_type': network_type})
+            else:
+                sanitized_sheet_name = sanitize_sheet_name(sheet_name)
+                output_filename = f"{sanitized_sheet_name} {Date.strftime('%Y%m%d')}.csv"
+                file_content = df.to_csv(index=False, date_format=CSV_DATE_FORMAT).encode('utf-8')
+                processed_files.append({'status': 'success', 'file_path': f'{sanitized_sheet_name}/{output_filename}', 'file_content': file_content, 'sheet_name': sheet_name, 'rows_processed': len(df), 'dataframe': df, 'column_kinds': column_kinds(df.columns, client_name, schema_key, new_kinds), 'folder_name': sanitized_sheet_name})
+        except Exception as sheet_error:
+            processed_files.append({'status': 'error', 'reason': f'Sheet processing error: {str(sheet_error)}', 'sheet_name': sheet_name})
+            continue
+    for sheet_type, dfs in sheet_type_dataframes.items():
+        if len(dfs) > 0:
+            merged_df = concat_sheet_frames(dfs)
+            sanitized_sheet_type = sanitize_sheet_name(sheet_type)
+            output_filename = f"{sanitized_sheet_type} {Date.strftime('%Y%m%d')}.csv"
+            file_content = merged_df.to_csv(index=False, date_format=CSV_DATE_FORMAT).encode('utf-8')
+            processed_files.append({'status': 'success', 'file_path': f'{sanitized_sheet_type}/{output_filename}', 'file_content': file_content, 'sheet_name': f'{sheet_type} (merged from {len(dfs)} sheets)', 'rows_processed': len(merged_df), 'dataframe': merged_df, 'column_kinds': column_kinds(merged_df.columns, client_name, sheet_type, new_kinds), 'merged_count': len(dfs), 'folder_name': sanitized_sheet_type})
+    save_schema_kinds(client_name, new_kinds)
+    return processed_files
+
+def convert_stream_cell(cell):
+    # Same conversions pandas' openpyxl reader and parser apply, so streamed CSVs match the in-memory path
+    value = cell.value
+    if value is None or cell.data_type == 'e' or (isinstance(value, str) and value in STREAM_NA_VALUES):
+        return None
+    if cell.data_type == 'n' and not isinstance(value, bool):
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+def iter_stream_rows(ws):
+    # Rows with trailing blank cells trimmed, as pandas does before padding to the sheet width
+    for r, row in enumerate(ws.iter_rows()):
+        width = len(row)
+        while width and row[width - 1].value in (None, ''):
+            width -= 1
+        yield (r, [convert_stream_cell(cell) for cell in row[:width]])
+
+def scan_stream_sheet(ws, sheet_name, spool):
+    # The only read of the sheet: collects the whole-sheet facts the in-memory path gets from the
+    # full DataFrame, and pickles the non-empty rows below the header to spool in chunks
+    rows = width = 0
+    head = []
+    chunk = []
+    non_na = []
+    numeric = []
+    has_float = []
+    last_data_row = last_data_row_after_first = -1
+    for r, values in iter_stream_rows(ws):
+        if r < 5:
+            head.append(values)
+        if not values:
+            continue
+        if r >= 5:
+            # A sheet with data always has its header on row 4, so these are its data rows
+            chunk.append(values)
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        rows = r + 1
+        if len(values) > width:
+            extra = len(values) - width
+            non_na += [0] * extra
+            numeric += [True] * extra
+            has_float += [False] * extra
+            width = len(values)
+        for c, value in enumerate(values):
+            if value is None:
+                continue
+            non_na[c] += 1
+            if isinstance(value, float):
+                has_float[c] = True
+            elif not isinstance(value, int) or isinstance(value, bool):
+                numeric[c] = False
+            last_data_row = r
+            if c > 0:
+                last_data_row_after_first = r
+    if chunk:
+        pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+    if rows < 2 or width == 0:
+        return {'status': 'skipped', 'reason': 'Sheet is empty or has insufficient data', 'sheet_name': sheet_name}
+    # Columns pandas would infer as float64: numeric with a gap or a fractional value
+    float_columns = {c for c in range(width) if numeric[c] and (has_float[c] or non_na[c] < rows)}
+    drop_first = (rows - non_na[0]) / rows > 0.8
+    header_row = 4
+    if header_row >= rows:
+        header_row = min(4, rows - 1) if rows > 1 else 0
+    if (last_data_row_after_first if drop_first else last_data_row) <= header_row:
+        return {'status': 'skipped', 'reason': 'No data rows after processing', 'sheet_name': sheet_name}
+    header = head[header_row] + [None] * (width - len(head[header_row]))
+    header = [float(v) if c in float_columns and v is not None else v for c, v in enumerate(header)]
+    header = [np.nan if v is None else v for v in header][1 if drop_first else 0:]
+    columns = list(header)
+    if 'Date' not in columns:
+        columns.insert(0, 'Date')
+    sheet_type, network_type = parse_sheet_name_format(sheet_name)
+    if sheet_type and network_type and 'Network' not in columns:
+        columns.insert(1, 'Network')
+    return {'sheet_name': sheet_name, 'rows': rows, 'width': width, 'header_row': header_row, 'header': header, 'columns': columns, 'float_columns': float_columns, 'drop_first': drop_first, 'sheet_type': sheet_type, 'network_type': network_type}
+
+def stream_sheet_chunks(spool_path, layout, Date):
+
+    def to_frame(chunk):
+        df = pd.DataFrame(chunk, dtype=object).dropna(how='all')
+        df.columns = layout['header']
+        if 'Date' not in df.columns:
+            df.insert(0, 'Date', Date.strftime('%Y-%m-%d'))
+        if layout['network_type']:
+            if 'Network' in df.columns:
+                df['Network'] = layout['network_type']
+            else:
+                df.insert(1, 'Network', layout['network_type'])
+        return df
+    start = 1 if layout['drop_first'] else 0
+    with open(spool_path, 'rb') as f:
+        while True:
+            try:
+                rows = pickle.load(f)
+            except EOFError:
+                break
+            chunk = []
+            for values in rows:
+                values += [None] * (layout['width'] - len(values))
+                for c in layout['float_columns']:
+                    if values[c] is not None:
+                        values[c] = float(values[c])
+                chunk.append(values[start:])
+            yield to_frame(chunk)
+
+def open_spool_file(suffix='.csv'):
+    os.makedirs(FPK_SPOOL_DIR, exist_ok=True)
+    # Tagged with the isolated worker task (if any) so a killed task's files can be found
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=isolated_pool.task_tag or 'tmp', dir=FPK_SPOOL_DIR)
+    if suffix == '.csv':
+        return (path, open(fd, 'w', encoding='utf-8', newline=''))
+    return (path, open(fd, 'wb'))
+
+def remove_spool_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remove_task_spool_files(task_tag):
+    for path in glob.glob(os.path.join(FPK_SPOOL_DIR, f'{task_tag}*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def observed_column_kind(kind, found):
+    # Kinds of one column across a streamed sheet's chunks; chunks that disagree make it 'object'
+    if kind is None or kind == found:
+        return found
+    if found is None:
+        return kind
+    if {kind, found} == {'integer', 'float'}:
+        return 'float'
+    if {kind, found} == {'category', 'string'}:
+        return 'string'
+    return 'object'
+
+def write_stream_sheet(layout, Date, handle, write_header, columns=None, kinds=None):
+    # kinds: {column name: kind} of the sheet's own columns, filled in as chunks are written
+    rows_written = 0
+    for df in stream_sheet_chunks(layout['spool_path'], layout, Date):
+        if df.empty:
+            continue
+        if kinds is not None:
+            for i, label in enumerate(df.columns):
+                # The added Date and Network columns aren't the sheet's own, as in apply_sheet_schema
+                if label not in ADDED_COLUMN_KINDS or label in layout['header']:
+                    kinds[str(label)] = observed_column_kind(kinds.get(str(label)), infer_column_kind(df.iloc[:, i]))
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        df.to_csv(handle, header=write_header, index=False)
+        write_header = False
+        rows_written += len(df)
+    return rows_written
+
+def union_columns(column_lists):
+    columns = pd.Index(column_lists[0])
+    for other in column_lists[1:]:
+        other = pd.Index(other)
+        columns = columns.append(other[~other.isin(columns)])
+    return columns
+
+def register_stream_kinds(client_name, schema_key, kinds, new_kinds):
+    if not USE_SCHEMA_REGISTRY:
+        return
+    schema = client_schema(client_name, schema_key)
+    found = new_kinds.setdefault(schema_key, {})
+    for name, kind in kinds.items():
+        register_column_kind(schema, found, name, kind)
+
+def stream_workbook_sheets(source, Date, processed_files, client_name=''):
+    # Bounded-memory variant of process_workbook_sheets: rows are read once with openpyxl in
+    # read-only mode, spooled, then written to CSVs in STREAM_CHUNK_ROWS chunks; each "Type - Network"
+    # sheet is appended to its sheet type's CSV, header written once, instead of concatenated in memory.
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    merged = {}
+    layouts = []
+    new_kinds = {}
+    try:
+        try:
+            for sheet_name in workbook.sheetnames:
+                spool_path, spool = open_spool_file('.rows')
                 try:
-                    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None)
-                    if df.empty or len(df) < 2:
-                        processed_files_report.append({'status': 'skipped', 'reason': 'Sheet is empty or has insufficient data', 'sheet_name': sheet_name})
-                        continue
-                    if len(df.columns) > 0:
-                        first_col_empty_ratio = df.iloc[:, 0].isna().sum() / len(df)
-                        if first_col_empty_ratio > 0.8:
-                            df = df.drop(df.columns[0], axis=1)
-                    header_row = 4
-                    if header_row >= len(df):
-                        header_row = min(4, len(df) - 1) if len(df) > 1 else 0
-                    if len(df) > header_row:
-                        df.columns = df.iloc[header_row]
-                        if header_row + 1 < len(df):
-                            df = df.iloc[header_row + 1:].reset_index(drop=True)
-                        else:
-                            df = pd.DataFrame(columns=df.columns)
-                    df = df.dropna(how='all')
-                    if df.empty:
-                        processed_files_report.append({'status': 'skipped', 'reason': 'No data rows after processing', 'sheet_name': sheet_name})
-                        continue
-                    if 'Date' not in df.columns:
-                        df.insert(0, 'Date', file_date.strftime('%Y-%m-%d'))
-                    sheet_type, network_type = parse_sheet_name_format(sheet_name)
-                    if sheet_type and network_type:
-                        if 'Network' in df.columns:
-                            df['Network'] = network_type
-                        else:
-                            df.insert(1, 'Network', network_type)
-                        if sheet_type not in sheet_type_dataframes:
-                            sheet_type_dataframes[sheet_type] = []
-                        sheet_type_dataframes[sheet_type].append(df)
-                        processed_files_report.append({'status': 'merged', 'sheet_name': sheet_name, 'rows_processed': len(df), 'sheet_type': sheet_type, 'network_type': network_type})
-                    else:
-                        sanitized_sheet_name = sanitize_sheet_name(sheet_name)
-                        output_dir = os.path.join(base_output_dir, sanitized_sheet_name)
-                        os.makedirs(output_dir, exist_ok=True)
-                        output_filename = f"{sanitized_sheet_name} {file_date.strftime('%Y%m%d')}.csv"
-                        output_path = os.path.join(output_dir, output_filename)
-                        df.to_csv(output_path, index=False)
-                        processed_files_report.append({'status': 'success', 'file_path': output_path, 'sheet_name': sheet_name, 'rows_processed': len(df), 'dataframe': df, 'folder_name': sanitized_sheet_name})
+                    with spool:
+                        ws = workbook[sheet_name]
+                        ws.reset_dimensions()
+                        layout = scan_stream_sheet(ws, sheet_name, spool)
                 except Exception as sheet_error:
-                    processed_files_report.append({'status': 'error', 'reason': f'Sheet processing error: {str(sheet_error)}', 'sheet_name': sheet_name})
-                    continue
-            for sheet_type, dfs in sheet_type_dataframes.items():
-                if len(dfs) > 0:
-                    merged_df = pd.concat(dfs, ignore_index=True)
-                    sanitized_sheet_type = sanitize_sheet_name(sheet_type)
-                    output_dir = os.path.join(base_output_dir, sanitized_sheet_type)
-                    os.makedirs(output_dir, exist_ok=True)
-                    output_filename = f"{sanitized_sheet_type} {file_date.strftime('%Y%m%d')}.csv"
-                    output_path = os.path.join(output_dir, output_filename)
-                    merged_df.to_csv(output_path, index=False)
-                    processed_files_report.append({'status': 'success', 'file_path': output_path, 'sheet_name': f'{sheet_type} (merged from {len(dfs)} sheets)', 'rows_processed': len(merged_df), 'dataframe': merged_df, 'merged_count': len(dfs), 'folder_name': sanitized_sheet_type})
+                    layout = {'status': 'error', 'reason': f'Sheet processing error: {str(sheet_error)}', 'sheet_name': sheet_name}
+                if 'status' in layout:
+                    remove_spool_file(spool_path)
+                else:
+                    layout['spool_path'] = spool_path
+                layouts.append(layout)
+        finally:
+            # Everything left to do reads the spooled rows
+            workbook.close()
+        sheet_type_columns = {}
+        for layout in layouts:
+            if 'status' not in layout and layout['network_type']:
+                sheet_type_columns.setdefault(layout['sheet_type'], []).append(layout['columns'])
+        for layout in layouts:
+            if 'status' in layout:
+                processed_files.append(layout)
+                continue
+            sheet_name = layout['sheet_name']
+            try:
+                if layout['network_type']:
+                    sheet_type = layout['sheet_type']
+                    if sheet_type not in merged:
+                        path, handle = open_spool_file()
+                        column_lists = sheet_type_columns[sheet_type]
+                        same_columns = all((pd.Index(c).equals(pd.Index(column_lists[0])) for c in column_lists))
+                        merged[sheet_type] = {'path': path, 'handle': handle, 'columns': None if same_columns else union_columns(column_lists), 'rows': 0, 'count': 0}
+                    target = merged[sheet_type]
+                    kinds = {}
+                    rows_written = write_stream_sheet(layout, Date, target['handle'], target['rows'] == 0, target['columns'], kinds)
+                    register_stream_kinds(client_name, sheet_type, kinds, new_kinds)
+                    target['rows'] += rows_written
+                    target['count'] += 1
+                    processed_files.append({'status': 'merged', 'sheet_name': sheet_name, 'rows_processed': rows_written, 'sheet_type': sheet_type, 'network_type': layout['network_type']})
+                else:
+                    sanitized_sheet_name = sanitize_sheet_name(sheet_name)
+                    output_filename = f"{sanitized_sheet_name} {Date.strftime('%Y%m%d')}.csv"
+                    path, handle = open_spool_file()
+                    kinds = {}
+                    with handle:
+                        rows_written = write_stream_sheet(layout, Date, handle, True, kinds=kinds)
+                    register_stream_kinds(client_name, sanitized_sheet_name, kinds, new_kinds)
+                    processed_files.append({'status': 'success', 'file_path': f'{sanitized_sheet_name}/{output_filename}', 'file_content_path': path, 'spooled': True, 'sheet_name': sheet_name, 'rows_processed': rows_written, 'column_kinds': column_kinds(layout['columns'], client_name, sanitized_sheet_name, new_kinds), 'folder_name': sanitized_sheet_name})
+            except Exception as sheet_error:
+                processed_files.append({'status': 'error', 'reason': f'Sheet processing error: {str(sheet_error)}', 'sheet_name': sheet_name})
+            finally:
+                remove_spool_file(layout['spool_path'])
+        for sheet_type, target in merged.items():
+            target['handle'].close()
+            sanitized_sheet_type = sanitize_sheet_name(sheet_type)
+            output_filename = f"{sanitized_sheet_type} {Date.strftime('%Y%m%d')}.csv"
+            labels = sheet_type_columns[sheet_type][0] if target['columns'] is None else target['columns']
+            processed_files.append({'status': 'success', 'file_path': f'{sanitized_sheet_type}/{output_filename}', 'file_content_path': target['path'], 'spooled': True, 'sheet_name': f"{sheet_type} (merged from {target['count']} sheets)", 'rows_processed': target['rows'], 'column_kinds': column_kinds(labels, client_name, sheet_type, new_kinds), 'merged_count': target['count'], 'folder_name': sanitized_sheet_type})
+        save_schema_kinds(client_name, new_kinds)
+    except Exception:
+        for target in merged.values():
+            target['handle'].close()
+            remove_spool_file(target['path'])
+        raise
+    finally:
+        for layout in layouts:
+            if 'spool_path' in layout:
+                remove_spool_file(layout['spool_path'])
+    return processed_files
+
+def process_with_engine_fallback(source, Date, engine, processed_files, client_name=''):
+    engine = resolve_excel_engine(engine)
+    if engine != 'openpyxl':
+        attempt = []
+        try:
+            if engine == STREAMING_ENGINE:
+                stream_workbook_sheets(source, Date, attempt, client_name)
+            else:
+                with open_excel_file(source, engine) as excel_file:
+                    process_workbook_sheets(excel_file, Date, attempt, client_name)
+            if not any((r['status'] == 'error' for r in attempt)):
+                processed_files.extend(attempt)
+                return
+        except Exception:
+            pass
+        for result in attempt:
+            release_result_content(result)
+        # Anything the fast engine couldn't parse is redone with openpyxl
+        rewind(source)
+    with open_excel_file(source, 'openpyxl') as excel_file:
+        process_workbook_sheets(excel_file, Date, processed_files, client_name)
+
+def process_excel_file_single(uploaded_file, file_date, engine=DEFAULT_EXCEL_ENGINE, client_name=''):
+    processed_files_report = []
+    try:
+        process_with_engine_fallback(uploaded_file, file_date, engine, processed_files_report, client_name)
     except Exception as e:
         file_name = getattr(uploaded_file, 'name', 'the file')
         processed_files_report.append({'status': 'error', 'reason': f'Failed to read Excel file {file_name}: {str(e)}', 'sheet_name': 'File Level Error'})
     return processed_files_report
 
-def process_excel_file_safe(file_path, Date, base_output_dir):
+def process_excel_upload(path, name, file_date, engine=DEFAULT_EXCEL_ENGINE, client_name=''):
+    with open(path, 'rb') as f:
+        source = io.BytesIO(f.read())
+    source.name = name
+    return process_excel_file_single(source, file_date, engine, client_name)
+
+def process_excel_file_safe(file_path, Date, engine=DEFAULT_EXCEL_ENGINE, client_name=''):
     processed_files = []
     try:
-        with pd.ExcelFile(file_path) as excel_file:
-            sheet_names = excel_file.sheet_names
-            sheet_type_dataframes = {}
-            for sheet_name in sheet_names:
-                try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-                    if df.empty or len(df) < 2:
-                        processed_files.append({'status': 'skipped', 'reason': 'Sheet is empty or has insufficient data', 'sheet_name': sheet_name})
-                        continue
-                    if len(df.columns) > 0:
-                        first_col_empty_ratio = df.iloc[:, 0].isna().sum() / len(df)
-                        if first_col_empty_ratio > 0.8:
-                            df = df.drop(df.columns[0], axis=1)
-                    header_row = 4
-                    if header_row >= len(df):
-                        header_row = min(4, len(df) - 1) if len(df) > 1 else 0
-                    if len(df) > header_row:
-                        df.columns = df.iloc[header_row]
-                        if header_row + 1 < len(df):
-                            df = df.iloc[header_row + 1:].reset_index(drop=True)
-                        else:
-                            df = pd.DataFrame(columns=df.columns)
-                    df = df.dropna(how='all')
-                    if df.empty:
-                        processed_files.append({'status': 'skipped', 'reason': 'No data rows after processing', 'sheet_name': sheet_name})
-                        continue
-                    if 'Date' not in df.columns:
-                        df.insert(0, 'Date', Date.strftime('%Y-%m-%d'))
-                    sheet_type, network_type = parse_sheet_name_format(sheet_name)
-                    if sheet_type and network_type:
-                        if 'Network' in df.columns:
-                            df['Network'] = network_type
-                        else:
-                            df.insert(1, 'Network', network_type)
-                        if sheet_type not in sheet_type_dataframes:
-                            sheet_type_dataframes[sheet_type] = []
-                        sheet_type_dataframes[sheet_type].append(df)
-                        processed_files.append({'status': 'merged', 'sheet_name': sheet_name, 'rows_processed': len(df), 'sheet_type': sheet_type, 'network_type': network_type})
-                    else:
-                        sanitized_sheet_name = sanitize_sheet_name(sheet_name)
-                        output_dir = os.path.join(base_output_dir, sanitized_sheet_name)
-                        os.makedirs(output_dir, exist_ok=True)
-                        output_filename = f"{sanitized_sheet_name} {Date.strftime('%Y%m%d')}.csv"
-                        output_path = os.path.join(output_dir, output_filename)
-                        df.to_csv(output_path, index=False)
-                        processed_files.append({'status': 'success', 'file_path': output_path, 'sheet_name': sheet_name, 'rows_processed': len(df), 'dataframe': df, 'folder_name': sanitized_sheet_name})
-                except Exception as sheet_error:
-                    processed_files.append({'status': 'error', 'reason': f'Sheet processing error: {str(sheet_error)}', 'sheet_name': sheet_name})
-                    continue
-            for sheet_type, dfs in sheet_type_dataframes.items():
-                if len(dfs) > 0:
-                    merged_df = pd.concat(dfs, ignore_index=True)
-                    sanitized_sheet_type = sanitize_sheet_name(sheet_type)
-                    output_dir = os.path.join(base_output_dir, sanitized_sheet_type)
-                    os.makedirs(output_dir, exist_ok=True)
-                    output_filename = f"{sanitized_sheet_type} {Date.strftime('%Y%m%d')}.csv"
-                    output_path = os.path.join(output_dir, output_filename)
-                    merged_df.to_csv(output_path, index=False)
-                    processed_files.append({'status': 'success', 'file_path': output_path, 'sheet_name': f'{sheet_type} (merged from {len(dfs)} sheets)', 'rows_processed': len(merged_df), 'dataframe': merged_df, 'merged_count': len(dfs), 'folder_name': sanitized_sheet_type})
+        process_with_engine_fallback(file_path, Date, engine, processed_files, client_name)
     except Exception as e:
         processed_files.append({'status': 'error', 'reason': str(e), 'sheet_name': 'File Level Error'})
     return processed_files
 
+_worker_archive = None
+
+def init_archive_worker(zip_bytes):
+    global _worker_archive
+    _worker_archive = zipfile.ZipFile(io.BytesIO(zip_bytes)) if zip_bytes is not None else None
+
+def process_excel_file_info(file_info, archive=None, engine=DEFAULT_EXCEL_ENGINE):
+    try:
+        source = get_excel_file_source(file_info, archive or _worker_archive)
+    except Exception as e:
+        return [{'status': 'error', 'reason': f"Failed to read {file_info['path']} from ZIP: {str(e)}", 'sheet_name': 'File Level Error'}]
+    return process_excel_file_safe(source, file_info['date'], engine, file_info.get('client_name', ''))
+
+def iter_isolated_workbooks(func, args_list, max_workers=1, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB, initializer=None, initargs=()):
+    # Yields (index, results) as workbooks finish, each in its own worker process. A workbook that
+    # raises, runs out of time or memory, or crashes its worker becomes a File Level Error entry.
+    pool = isolated_pool.IsolatedPool(min(max_workers, len(args_list)), initializer, initargs, timeout or None, max_rss_mb * 1024 * 1024 if max_rss_mb else None, on_kill=remove_task_spool_files)
+    completions = pool.imap_unordered(func, args_list)
+    try:
+        for i, status, value in completions:
+            if status == 'ok':
+                yield (i, value)
+            elif status == 'error':
+                yield (i, [{'status': 'error', 'reason': f'Worker failed: {value}', 'sheet_name': 'File Level Error'}])
+            else:
+                yield (i, [{'status': 'error', 'reason': value, 'sheet_name': 'File Level Error'}])
+    finally:
+        completions.close()
+
+def iter_processed_excel_files(excel_files, max_workers=1, on_file_done=None, zip_bytes=None, engine=DEFAULT_EXCEL_ENGINE, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB):
+    if not excel_files:
+        return
+    if max_workers <= 1 and (not timeout) and (not max_rss_mb):
+        # No limits to enforce, so a single worker would only add overhead
+        archive = zipfile.ZipFile(io.BytesIO(zip_bytes)) if zip_bytes is not None else None
+        try:
+            for i, file_info in enumerate(excel_files):
+                results = process_excel_file_info(file_info, archive, engine)
+                if on_file_done:
+                    try:
+                        on_file_done(i + 1, file_info)
+                    except BaseException:
+                        for result in results:
+                            release_result_content(result)
+                        raise
+                yield (i, file_info, results)
+        finally:
+            if archive:
+                archive.close()
+        return
+    # Workbooks finish in any order but are yielded in archive order, so whatever is
+    # written from them (ZIP entries, duplicate-name suffixes) matches the serial path.
+    # The archive bytes are shipped once per worker process, not once per workbook.
+    completions = iter_isolated_workbooks(process_excel_file_info, [(file_info, None, engine) for file_info in excel_files], max_workers, timeout, max_rss_mb, init_archive_worker, (zip_bytes,))
+    finished = {}
+    try:
+        next_index = 0
+        for done, (i, results) in enumerate(completions, start=1):
+            finished[i] = results
+            if on_file_done:
+                on_file_done(done, excel_files[i])
+            while next_index in finished:
+                yield (next_index, excel_files[next_index], finished.pop(next_index))
+                next_index += 1
+    finally:
+        # If the consumer stops early (e.g. a cancelled job), running workbooks are killed
+        # and outputs nobody will read are released
+        completions.close()
+        for results in finished.values():
+            for result in results:
+                release_result_content(result)
+
+def hash_excel_file(file_info, archive=None):
+    digest = hashlib.sha256()
+    if 'member' in file_info:
+        f = archive.open(file_info['member'])
+    else:
+        f = open(file_info['path'], 'rb')
+    with f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_processor_version = None
+
+def processor_version():
+    # An upgraded reader can change the outputs as much as our own processing, so cached and
+    # checkpointed ones are only served to the processor and reader versions that produced them
+    global _processor_version
+    if _processor_version is None:
+        import importlib.metadata
+        digest = hashlib.sha256(PROCESSOR_VERSION.encode('utf-8'))
+        for package in READER_PACKAGES:
+            try:
+                digest.update(f'|{package}={importlib.metadata.version(package)}'.encode('utf-8'))
+            except importlib.metadata.PackageNotFoundError:
+                continue
+        _processor_version = f'{PROCESSOR_VERSION}-{digest.hexdigest()[:16]}'
+    return _processor_version
+
+def workbook_cache_key(content_hash, Date, engine=DEFAULT_EXCEL_ENGINE, client_name=''):
+    # The client picks the schema registry the outputs are typed with
+    return hashlib.sha256(f"{content_hash}|{Date.strftime('%Y-%m-%d')}|{processor_version()}|{resolve_excel_engine(engine)}|{client_name}".encode('utf-8')).hexdigest()
+
+def load_cached_workbook(key):
+    try:
+        manifest_path = os.path.join(FPK_CACHE_DIR, 'manifest', f'{key}.json')
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)['results']
+        for result in results:
+            if 'content_sha256' in result:
+                output_path = os.path.join(FPK_CACHE_DIR, 'outputs', result.pop('content_sha256'))
+                if not os.path.exists(output_path):
+                    return None
+                # Served from the cache file itself; it isn't spooled, so it is never deleted after use
+                result['file_content_path'] = output_path
+        # The manifest's mtime is its last use, for prune_workbook_cache
+        os.utime(manifest_path)
+        return results
+    except (OSError, ValueError, KeyError):
+        return None
+
+def publish_file(path, write):
+    # write(f) fills a temp file of this writer's own next to path, which then replaces path whole:
+    # concurrent jobs caching the same output never write into each other's files
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with open(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def copy_into(source_path):
+    def write(f):
+        with open(source_path, 'rb') as source:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+    return write
+
+def store_cached_workbook(key, results):
+    # Workbooks whose file couldn't be opened at all aren't cached so they get retried next run
+    if any((r['sheet_name'] == 'File Level Error' for r in results)):
+        return
+    try:
+        os.makedirs(os.path.join(FPK_CACHE_DIR, 'manifest'), exist_ok=True)
+        os.makedirs(os.path.join(FPK_CACHE_DIR, 'outputs'), exist_ok=True)
+        entries = []
+        for result in results:
+            entry = {k: v for k, v in result.items() if k not in ('dataframe', 'file_content', 'file_content_path', 'spooled')}
+            if 'file_content_path' in result:
+                digest = hashlib.sha256()
+                with open(result['file_content_path'], 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                content_sha256 = digest.hexdigest()
+                output_path = os.path.join(FPK_CACHE_DIR, 'outputs', content_sha256)
+                if not os.path.exists(output_path):
+                    publish_file(output_path, copy_into(result['file_content_path']))
+                entry['content_sha256'] = content_sha256
+            elif 'file_content' in result:
+                content_sha256 = hashlib.sha256(result['file_content']).hexdigest()
+                output_path = os.path.join(FPK_CACHE_DIR, 'outputs', content_sha256)
+                if not os.path.exists(output_path):
+                    publish_file(output_path, lambda f, content=result['file_content']: f.write(content))
+                entry['content_sha256'] = content_sha256
+            entries.append(entry)
+        manifest = json.dumps({'processor_version': processor_version(), 'created': datetime.now().isoformat(), 'results': entries}).encode('utf-8')
+        publish_file(os.path.join(FPK_CACHE_DIR, 'manifest', f'{key}.json'), lambda f: f.write(manifest))
+    except (OSError, TypeError, ValueError):
+        pass
+
+def prune_workbook_cache(max_bytes=FPK_CACHE_MAX_BYTES, keep_since=None):
+    # Evicts the least recently used manifests, and the outputs no remaining manifest refers to, until
+    # the cache fits in max_bytes. Manifests used since keep_since (the current run) are kept: the
+    # client ZIP may still be reading their outputs.
+    if not max_bytes:
+        return
+    manifests = []
+    refs = {}
+    total = 0
+    for path in glob.glob(os.path.join(FPK_CACHE_DIR, 'manifest', '*.json')):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                outputs = [r['content_sha256'] for r in json.load(f)['results'] if 'content_sha256' in r]
+        except (OSError, ValueError, KeyError, TypeError):
+            outputs = []
+        manifests.append((stat.st_mtime, path, stat.st_size, outputs))
+        total += stat.st_size
+        for digest in outputs:
+            refs[digest] = refs.get(digest, 0) + 1
+    outputs = {}
+    for path in glob.glob(os.path.join(FPK_CACHE_DIR, 'outputs', '*')):
+        if path.endswith('.tmp'):
+            # Another job's output still being written
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        outputs[os.path.basename(path)] = (path, stat.st_size, stat.st_mtime)
+        total += stat.st_size
+
+    def remove(path, size):
+        nonlocal total
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    # Outputs of a store that never wrote its manifest go first
+    for digest, (path, size, mtime) in outputs.items():
+        if digest not in refs and (keep_since is None or mtime < keep_since):
+            remove(path, size)
+    for mtime, path, size, manifest_outputs in sorted(manifests):
+        if total <= max_bytes or (keep_since is not None and mtime >= keep_since):
+            break
+        remove(path, size)
+        for digest in manifest_outputs:
+            refs[digest] -= 1
+            if refs[digest] == 0 and digest in outputs:
+                remove(outputs[digest][0], outputs[digest][1])
+
+def iter_incremental_excel_files(excel_files, max_workers=1, on_file_done=None, zip_bytes=None, engine=DEFAULT_EXCEL_ENGINE, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB):
+    # Same contract as iter_processed_excel_files plus a reused flag: workbooks whose content,
+    # folder date and processor version match a manifest entry are served from the cache.
+    started = time.time()
+    archive = zipfile.ZipFile(io.BytesIO(zip_bytes)) if zip_bytes is not None else None
+    try:
+        keys = []
+        for file_info in excel_files:
+            try:
+                keys.append(workbook_cache_key(hash_excel_file(file_info, archive), file_info['date'], engine, file_info.get('client_name', '')))
+            except Exception:
+                keys.append(None)
+    finally:
+        if archive:
+            archive.close()
+    cached = [load_cached_workbook(key) if key else None for key in keys]
+    pending = [i for i, results in enumerate(cached) if results is None]
+    reused_count = len(excel_files) - len(pending)
+
+    def on_pending_done(done, file_info):
+        if on_file_done:
+            on_file_done(reused_count + done, file_info)
+    processed = iter_processed_excel_files([excel_files[i] for i in pending], max_workers, on_pending_done, zip_bytes, engine, timeout, max_rss_mb)
+    for i, file_info in enumerate(excel_files):
+        if cached[i] is not None:
+            yield (i, file_info, cached[i], True)
+            continue
+        _, _, results = next(processed)
+        if keys[i]:
+            store_cached_workbook(keys[i], results)
+        yield (i, file_info, results, False)
+    prune_workbook_cache(keep_since=started)
+
+def prune_checkpoints(ttl=CHECKPOINT_TTL_SECONDS):
+    now = time.time()
+    for checkpoint_dir in glob.glob(os.path.join(FPK_CHECKPOINT_DIR, '*')):
+        try:
+            if now - os.path.getmtime(checkpoint_dir) > ttl:
+                shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        except OSError:
+            pass
+
+def open_checkpoint(zip_bytes, engine=DEFAULT_EXCEL_ENGINE, client_name=''):
+    # Keyed on the archive contents plus everything that changes the per-workbook CSVs;
+    # the output format only affects how the client ZIP is written, so it isn't part of the key
+    prune_checkpoints()
+    archive_hash = hashlib.sha256(zip_bytes).hexdigest()
+    key = hashlib.sha256(f'{archive_hash}|{processor_version()}|{resolve_excel_engine(engine)}|{client_name}'.encode('utf-8')).hexdigest()
+    checkpoint_dir = os.path.join(FPK_CHECKPOINT_DIR, key)
+    os.makedirs(os.path.join(checkpoint_dir, 'workbooks'), exist_ok=True)
+    os.makedirs(os.path.join(checkpoint_dir, 'outputs'), exist_ok=True)
+    os.utime(checkpoint_dir)
+    return checkpoint_dir
+
+def load_checkpoint(checkpoint_dir, excel_files):
+    committed = {}
+    for i, file_info in enumerate(excel_files):
+        try:
+            with open(os.path.join(checkpoint_dir, 'workbooks', f'{i}.json'), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if entry.get('path') != file_info['path']:
+            continue
+        results = entry['results']
+        for result in results:
+            if 'output' in result:
+                # Served from the checkpoint file itself; not spooled, so never deleted after use
+                result['file_content_path'] = os.path.join(checkpoint_dir, 'outputs', result.pop('output'))
+        if all((os.path.exists(r['file_content_path']) for r in results if 'file_content_path' in r)):
+            committed[i] = results
+    return committed
+
+def commit_checkpoint_workbook(checkpoint_dir, index, file_info, results):
+    # Outputs are written first and the workbook's JSON last, so a workbook only counts as
+    # finished once everything it produced is on disk. File level errors are retried on resume.
+    if any((r['sheet_name'] == 'File Level Error' for r in results)):
+        return
+    try:
+        entries = []
+        for n, result in enumerate(results):
+            entry = {k: v for k, v in result.items() if k not in ('dataframe', 'file_content', 'file_content_path', 'spooled')}
+            if has_result_content(result):
+                output_name = f'{index}-{n}.csv'
+                output_path = os.path.join(checkpoint_dir, 'outputs', output_name)
+                if 'file_content_path' in result:
+                    publish_file(output_path, copy_into(result['file_content_path']))
+                else:
+                    publish_file(output_path, lambda f, content=result['file_content']: f.write(content))
+                entry['output'] = output_name
+            entries.append(entry)
+        workbook = json.dumps({'path': file_info['path'], 'results': entries}).encode('utf-8')
+
+        def write_workbook(f):
+            f.write(workbook)
+            f.flush()
+            os.fsync(f.fileno())
+        publish_file(os.path.join(checkpoint_dir, 'workbooks', f'{index}.json'), write_workbook)
+    except (OSError, TypeError, ValueError):
+        pass
+
+def iter_checkpointed_excel_files(excel_files, checkpoint_dir, max_workers=1, on_file_done=None, zip_bytes=None, engine=DEFAULT_EXCEL_ENGINE, reuse_outputs=True, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB):
+    # Yields (index, file_info, results, reused, resumed) in archive order; workbooks committed by
+    # an earlier run of the same archive are resumed, the rest are processed and committed.
+    # Without a checkpoint_dir (folders on disk) nothing is resumed or committed.
+    committed = load_checkpoint(checkpoint_dir, excel_files) if checkpoint_dir else {}
+    pending = [i for i in range(len(excel_files)) if i not in committed]
+    resumed_count = len(excel_files) - len(pending)
+
+    def on_pending_done(done, file_info):
+        if on_file_done:
+            on_file_done(resumed_count + done, file_info)
+    pending_files = [excel_files[i] for i in pending]
+    if reuse_outputs:
+        processed = iter_incremental_excel_files(pending_files, max_workers, on_pending_done, zip_bytes, engine, timeout, max_rss_mb)
+    else:
+        processed = ((j, file_info, results, False) for j, file_info, results in iter_processed_excel_files(pending_files, max_workers, on_pending_done, zip_bytes, engine, timeout, max_rss_mb))
+    for i, file_info in enumerate(excel_files):
+        if i in committed:
+            yield (i, file_info, committed[i], False, True)
+            continue
+        _, _, results, reused = next(processed)
+        if checkpoint_dir:
+            commit_checkpoint_workbook(checkpoint_dir, i, file_info, results)
+        yield (i, file_info, results, reused, False)
+
 def display_processing_report(all_results, show_detailed_progress=True):
     success_count = len([r for r in all_results if r['status'] == 'success'])
     skipped_count = len([r for r in all_results if r['status'] == 'skipped'])
@@ -322,17 +1236,15 @@ def display_folder_structure(folder_structure):
                 for file in sorted(files):
                     st.write(f'📄 {file}')
 
-def page_single_files(client_name):
+def page_single_files(client_name, engine=DEFAULT_EXCEL_ENGINE, output_format=output_formats.DEFAULT_OUTPUT_FORMAT, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, save_history=False):
+    # Uploads and outputs are kept in the session's on-disk result store; session_state only holds handles
+    store = result_store.get_session_store()
     if 'file_list' not in st.session_state:
         st.session_state.file_list = []
-    if 'processing_results' not in st.session_state:
-        st.session_state.processing_results = None
-    if 'processed_zip_data' not in st.session_state:
-        st.session_state.processed_zip_data = None
-    if 'processed_folder_structure' not in st.session_state:
-        st.session_state.processed_folder_structure = None
-    if 'processed_client_name' not in st.session_state:
-        st.session_state.processed_client_name = None
+    missing = [item for item in st.session_state.file_list if store.path(item['handle']) is None]
+    if missing:
+        st.session_state.file_list = [item for item in st.session_state.file_list if item not in missing]
+        st.warning(f"{len(missing)} queued file(s) expired and were removed from the queue: {', '.join((item['name'] for item in missing))}")
     st.markdown('### 2. Add Files to Process')
     with st.form('add_file_form', clear_on_submit=True):
         col1, col2 = st.columns([2, 1])
@@ -342,9 +1254,12 @@ def page_single_files(client_name):
             file_date = st.date_input('Select File Date', value=datetime.now(), key='file_date')
         submitted = st.form_submit_button('➕ Add File to Queue')
         if submitted and uploaded_file is not None:
-            file_bytes = io.BytesIO(uploaded_file.getvalue())
-            st.session_state.file_list.append({'file_data': file_bytes, 'date': file_date, 'name': uploaded_file.name})
-            st.success(f'Added {uploaded_file.name} to the queue.')
+            try:
+                handle = store.put_bytes(uploaded_file.getvalue(), uploaded_file.name, pinned=True)
+                st.session_state.file_list.append({'handle': handle, 'date': file_date, 'name': uploaded_file.name})
+                st.success(f'Added {uploaded_file.name} to the queue.')
+            except result_store.StoreFull as e:
+                st.error(f'❌ {e}')
         elif submitted and uploaded_file is None:
             st.warning('Please select a file to add.')
     st.markdown('### 3. Review Queue')
@@ -358,10 +1273,10 @@ def page_single_files(client_name):
                 st.markdown(f"""\n                <div class="file-list-item">\n                    <span>📄 {item['name']} (<b>Date:</b> {item['date'].strftime('%Y-%m-%d')})</span>\n                </div>\n                """, unsafe_allow_html=True)
             with col2:
                 if st.button(f'Remove##{i}', key=f'remove_{i}'):
-                    st.session_state.file_list.pop(i)
-                    st.session_state.processing_results = None
-                    st.session_state.processed_zip_data = None
+                    store.remove([st.session_state.file_list.pop(i)['handle']])
+                    jobs.discard_job('single_files_job')
                     st.rerun()
+        st.caption(f'Session storage: {store.used_bytes / 1024 / 1024:.1f} MB of {store.budget / 1024 / 1024:.0f} MB')
     st.markdown('---')
     st.markdown('### 4. Process Files')
     if st.button('🚀 Process All Files in Queue', type='primary', disabled=not st.session_state.file_list):
@@ -369,51 +1284,15 @@ def page_single_files(client_name):
         if file_count > 1 and (not client_name):
             st.error("❌ Please enter a Client Name. It's required for creating the ZIP file when processing multiple files.")
             return
-        temp_output_dir = tempfile.mkdtemp()
-        all_results = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        try:
-            for i, item in enumerate(st.session_state.file_list):
-                file_name = item['name']
-                file_data = item['file_data']
-                file_date = item['date']
-                progress = (i + 1) / file_count
-                progress_bar.progress(progress)
-                status_text.text(f'Processing {i + 1}/{file_count}: {file_name}')
-                results = process_excel_file_single(file_data, file_date, temp_output_dir)
-                for result in results:
-                    result['source_file'] = file_name
-                    if result['status'] == 'success' and 'file_path' in result:
-                        try:
-                            with open(result['file_path'], 'rb') as f:
-                                result['file_content'] = f.read()
-                        except Exception as e:
-                            result['status'] = 'error'
-                            result['reason'] = f'Failed to read generated file: {str(e)}'
-                    all_results.append(result)
-            status_text.success(f'✅ Processing complete for all {file_count} file(s)!')
-            progress_bar.progress(1.0)
-            zip_data = None
-            folder_structure = None
-            if file_count >= 1:
-                c_name = client_name if client_name else 'processed'
-                with st.spinner(f'Creating organized ZIP file for {c_name}...'):
-                    zip_path, folder_structure, error = create_client_zip(c_name, temp_output_dir, all_results)
-                    if error:
-                        st.error(f'❌ Error creating ZIP file: {error}')
-                    elif zip_path and os.path.exists(zip_path):
-                        with open(zip_path, 'rb') as f:
-                            zip_data = f.read()
-                        os.remove(zip_path)
-            st.session_state.processing_results = all_results
-            st.session_state.processed_zip_data = zip_data
-            st.session_state.processed_folder_structure = folder_structure
-            st.session_state.processed_client_name = client_name
-        finally:
-            safe_cleanup_temp_dir(temp_output_dir)
-    if st.session_state.processing_results:
-        all_results = st.session_state.processing_results
+        file_items = [{'name': item['name'], 'date': item['date'], 'path': store.path(item['handle'])} for item in st.session_state.file_list]
+        jobs.start_job('single_files_job', 'fpk_single_files', f'Processing {file_count} file(s)', run_single_files_job, file_items, client_name, engine, output_format, compression, store, save_history)
+    job = jobs.render_job('single_files_job')
+    if job is not None and job.status == 'done':
+        all_results = job.result['results']
+        st.success(f"✅ Processing complete for all {len(job.result['file_names'])} file(s)!")
+        if job.result['zip_error']:
+            st.error(f"❌ Error creating ZIP file: {job.result['zip_error']}")
+        display_history_summary(job.result)
         st.markdown('---')
         st.markdown('### 📈 Processing Report')
         display_processing_report(all_results, show_detailed_progress=True)
@@ -422,41 +1301,100 @@ def page_single_files(client_name):
         success_files = [r for r in all_results if r['status'] == 'success']
         if not success_files:
             st.warning('No files were successfully processed.')
-        if st.session_state.processed_zip_data:
+        if job.result['zip_handle'] and store.path(job.result['zip_handle']):
             st.success(f'✅ ZIP file created!')
-            if st.session_state.processed_folder_structure:
-                display_folder_structure(st.session_state.processed_folder_structure)
-            client_name_dl = st.session_state.processed_client_name or 'processed'
+            if job.result['folder_structure']:
+                display_folder_structure(job.result['folder_structure'])
+            client_name_dl = job.result['client_name'] or 'processed'
             zip_filename = f'{client_name_dl}_processed_files.zip'
-            st.download_button(label=f'📥 Download {zip_filename}', data=st.session_state.processed_zip_data, file_name=zip_filename, mime='application/zip')
+            # Payloads are read from the store only when a button is clicked
+            st.download_button(label=f'📥 Download {zip_filename}', data=lambda: store.read(job.result['zip_handle']), file_name=zip_filename, mime='application/zip', on_click='ignore')
             st.markdown('---')
         if success_files:
+            output_format = job.result['output_format']
             st.info('Download each processed file individually:')
             for i, result in enumerate(success_files):
-                if 'file_content' in result:
-                    filename = os.path.basename(result['file_path'])
-                    sheet_name = result['sheet_name']
-                    st.download_button(label=f'📥 Download {filename} (from sheet: {sheet_name})', data=result['file_content'], file_name=filename, mime='text/csv', key=f'download_{i}_{filename}')
+                handle = result.get('handle')
+                filename = output_formats.output_filename(os.path.basename(result['file_path']), output_format)
+                if not handle or store.path(handle) is None:
+                    st.caption(f'{filename} is no longer stored; process the files again to download it.')
+                    continue
+                sheet_name = result['sheet_name']
+                st.download_button(label=f'📥 Download {filename} (from sheet: {sheet_name})', data=lambda handle=handle, kinds=result.get('column_kinds'): output_formats.encode_csv(store.read(handle), output_format, kinds), file_name=filename, mime=output_formats.output_mime(output_format), key=f'download_{i}_{filename}', on_click='ignore')
+                if st.checkbox(f'Preview {filename}', key=f'preview_{i}_{filename}'):
+                    st.dataframe(pd.read_csv(store.path(handle), nrows=PREVIEW_ROWS), use_container_width=True)
+
+def run_single_files_job(job, file_items, client_name, engine, output_format, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, store=None, save_history=False):
+    file_count = len(file_items)
+    job.update(0.0, f'Processing {file_count} file(s)...')
+    finished = {}
+    args_list = [(item['path'], item['name'], item['date'], engine, client_name) for item in file_items]
+    for done, (i, results) in enumerate(iter_isolated_workbooks(process_excel_upload, args_list, DEFAULT_MAX_WORKERS), start=1):
+        finished[i] = results
+        for result in results:
+            if result.get('spooled'):
+                job.cleanup_paths.append(result['file_content_path'])
+        job.update(done / file_count, f"Processed {done}/{file_count}: {file_items[i]['name']}")
+    all_results = []
+    history_rows = 0
+    history_errors = []
+    for i, item in enumerate(file_items):
+        for result in finished[i]:
+            result['source_file'] = item['name']
+            if save_history and result['status'] == 'success':
+                try:
+                    history_rows += save_result_to_history(result, client_name, item['date'])
+                except Exception as e:
+                    history_errors.append(f"{result['file_path']}: {e}")
+            all_results.append(result)
+    job.update(1.0, 'Creating ZIP file...')
+    os.makedirs(FPK_SPOOL_DIR, exist_ok=True)
+    fd, zip_path = tempfile.mkstemp(suffix='.zip', dir=FPK_SPOOL_DIR)
+    os.close(fd)
+    job.cleanup_paths.append(zip_path)
+    _, folder_structure, error = create_client_zip(all_results, output_format, compression, zip_path)
+    # Outputs move into the session store; the job result keeps only handles to them
+    zip_handle = None
+    try:
+        for result in all_results:
+            if has_result_content(result):
+                if result.get('spooled'):
+                    result['handle'] = store.put_file(result['file_content_path'], result['file_path'])
+                else:
+                    result['handle'] = store.put_bytes(result['file_content'], result['file_path'])
+                job.cleanup_paths.append(os.path.join(store.dir, result['handle']))
+                release_result_content(result)
+        if error is None:
+            zip_handle = store.put_file(zip_path, f'{client_name or "processed"}_processed_files.zip')
+            job.cleanup_paths.append(os.path.join(store.dir, zip_handle))
+    except result_store.StoreFull as e:
+        error = error or str(e)
+    for result in all_results:
+        # Whatever didn't fit in the budget is dropped rather than kept in memory
+        release_result_content(result)
+    return {'results': all_results, 'zip_handle': zip_handle, 'folder_structure': folder_structure, 'zip_error': error, 'client_name': client_name, 'output_format': output_format, 'file_names': [item['name'] for item in file_items], 'history_rows': history_rows, 'history_errors': history_errors}
 
-def page_zip_processor(client_name):
+def page_zip_processor(client_name, engine=DEFAULT_EXCEL_ENGINE, output_format=output_formats.DEFAULT_OUTPUT_FORMAT, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, save_history=False):
     st.markdown('### 📦 ZIP File Upload')
     uploaded_zip = st.file_uploader('Upload ZIP File with Dated Folders', type=['zip'], help='Upload a ZIP file containing dated folders with Excel files')
     if uploaded_zip:
         st.success(f'✅ ZIP file uploaded: {uploaded_zip.name}')
         if 'zip_analysis' not in st.session_state or st.session_state.get('current_zip') != uploaded_zip.name:
             with st.spinner('Analyzing ZIP file structure...'):
-                if 'temp_dir' in st.session_state:
-                    safe_cleanup_temp_dir(st.session_state.temp_dir)
-                temp_dir, error = extract_zip_file(uploaded_zip)
-                if error:
-                    st.error(f'❌ Error extracting ZIP: {error}')
-                    if 'zip_analysis' in st.session_state:
-                        del st.session_state.zip_analysis
-                else:
-                    zip_analysis = analyze_zip_structure(temp_dir)
+                try:
+                    uploaded_zip.seek(0)
+                    zip_analysis = analyze_zip_archive(uploaded_zip)
                     st.session_state.zip_analysis = zip_analysis
                     st.session_state.current_zip = uploaded_zip.name
-                    st.session_state.temp_dir = temp_dir
+                except Exception as e:
+                    st.error(f'❌ Error reading ZIP: {str(e)}')
+                    if 'zip_analysis' in st.session_state:
+                        del st.session_state.zip_analysis
+    elif 'zip_analysis' in st.session_state:
+        # Members are read straight from the upload, so the analysis goes stale with it
+        del st.session_state.zip_analysis
+        if 'current_zip' in st.session_state:
+            del st.session_state.current_zip
     if 'zip_analysis' in st.session_state:
         zip_analysis = st.session_state.zip_analysis
         st.markdown('### 📦 ZIP File Analysis')
@@ -474,7 +1412,9 @@ def page_zip_processor(client_name):
             st.markdown('### 📋 Sheet Names Analysis (from first file)')
             sample_file = zip_analysis['excel_files'][0]
             try:
-                sheet_names = get_excel_sheet_names(sample_file['path'])
+                uploaded_zip.seek(0)
+                with zipfile.ZipFile(uploaded_zip) as archive:
+                    sheet_names = get_excel_sheet_names(get_excel_file_source(sample_file, archive), engine)
                 special_format_sheets = []
                 regular_sheets = []
                 for sheet_name in sheet_names:
@@ -496,67 +1436,97 @@ def page_zip_processor(client_name):
                 st.error(f"Error reading sheet names from {sample_file['path']}: {e}")
         st.markdown('### ⚙️ Processing Options')
         show_detailed_progress = st.checkbox('Show detailed processing log', value=True, key='zip_show_details')
+        reuse_outputs = st.checkbox('Reuse outputs of unchanged workbooks from previous runs', value=True, key='zip_reuse_outputs', help='Workbooks are matched by content hash, folder date and processor version.')
+        max_workers = st.number_input('Parallel workers', min_value=1, max_value=max(DEFAULT_MAX_WORKERS, 32), value=DEFAULT_MAX_WORKERS, step=1, key='zip_max_workers', help='Number of processes used to parse workbooks. Set to 1 to process files one at a time.')
+        col_timeout, col_memory = st.columns(2)
+        with col_timeout:
+            timeout = st.number_input('Time limit per workbook (seconds)', min_value=0, value=int(WORKBOOK_TIMEOUT_SECONDS), step=30, key='zip_workbook_timeout', help='A workbook still running after this long is stopped and reported as an error. 0 means no limit.')
+        with col_memory:
+            max_rss_mb = st.number_input('Memory limit per workbook (MB)', min_value=0, value=WORKBOOK_MAX_RSS_MB, step=256, key='zip_workbook_max_rss', help="A workbook whose worker process grows past this is stopped and reported as an error. 0 means no limit.")
         st.markdown('---')
         if st.button('🚀 Process ZIP File', type='primary'):
             if not client_name:
                 st.error('❌ Please enter a client name first!')
                 return
-            temp_output_dir = tempfile.mkdtemp()
-            st.session_state.temp_output_dir = temp_output_dir
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            all_results = []
-            total_files = len(zip_analysis['excel_files'])
+            jobs.start_job('zip_job', 'fpk_zip', 'ZIP processing', run_zip_job, uploaded_zip.getvalue(), zip_analysis['excel_files'], client_name, max_workers, reuse_outputs, engine, output_format, timeout, max_rss_mb, compression, save_history)
+    job = jobs.render_job('zip_job')
+    if job is not None and job.status == 'done':
+        result = job.result
+        all_results = result['results']
+        st.success('✅ Processing complete!')
+        st.markdown('---')
+        st.markdown('### 📈 Processing Report')
+        if result['resumed_files']:
+            st.info(f"⏯️ Resumed {result['resumed_files']} workbook(s) from an interrupted run of this archive.")
+        if result['reuse_outputs']:
+            st.info(f"♻️ Reused cached outputs for {result['reused_files']} workbook(s), recomputed {result['total_files'] - result['reused_files'] - result['resumed_files']}.")
+        display_history_summary(result)
+        display_processing_report(all_results, st.session_state.get('zip_show_details', True))
+        st.markdown('---')
+        st.markdown('### 📦 Download Processed Files')
+        if not any((r['status'] == 'success' for r in all_results)):
+            st.warning('No files were successfully processed.')
+            return
+        zip_filename = f"{result['client_name']}_processed_files.zip"
+        st.success(f'✅ ZIP file created with organized folder structure!')
+        display_folder_structure(result['folder_structure'])
+        file_store.download_button(result['download_token'], f'📥 Download {zip_filename}', key='zip_download')
+
+def run_zip_job(job, zip_bytes, excel_files, client_name, max_workers, reuse_outputs, engine, output_format, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, save_history=False):
+    fd, zip_path = tempfile.mkstemp(prefix=f'{client_name}_processed_files_', suffix='.zip')
+    os.close(fd)
+    job.cleanup_paths.append(zip_path)
+    result = write_client_zip(job, zip_path, zip_bytes, excel_files, client_name, max_workers, reuse_outputs, engine, output_format, timeout, max_rss_mb, compression, save_history)
+    # The ZIP is served from the file store on disk and removed with the job or when it expires
+    download_token, store_paths = file_store.store_file(zip_path, f'{client_name}_processed_files.zip', 'application/zip')
+    job.cleanup_paths.extend(store_paths)
+    result['download_token'] = download_token
+    return result
+
+def write_client_zip(job, zip_path, zip_bytes, excel_files, client_name, max_workers=1, reuse_outputs=True, engine=DEFAULT_EXCEL_ENGINE, output_format=output_formats.DEFAULT_OUTPUT_FORMAT, timeout=WORKBOOK_TIMEOUT_SECONDS, max_rss_mb=WORKBOOK_MAX_RSS_MB, compression=zip_builder.DEFAULT_ZIP_COMPRESSION, save_history=False):
+    # excel_files from analyze_zip_archive(zip_bytes), or from analyze_zip_structure(folder) with zip_bytes=None
+    folder_structure = {}
+    all_results = []
+    reused_files = 0
+    resumed_files = 0
+    history_rows = 0
+    history_errors = []
+    total_files = len(excel_files)
+
+    def on_file_done(done, file_info):
+        job.update(done / total_files, f"Processed {done}/{total_files}: {os.path.basename(file_info['path'])}")
+    checkpoint_dir = open_checkpoint(zip_bytes, engine, client_name) if zip_bytes is not None else None
+    # Workers type each workbook's sheets with the client's schema registry
+    excel_files = [dict(file_info, client_name=client_name) for file_info in excel_files]
+    # CSVs go straight into the client ZIP as each workbook finishes
+    workbook_results = iter_checkpointed_excel_files(excel_files, checkpoint_dir, max_workers, on_file_done, zip_bytes, engine, reuse_outputs, timeout, max_rss_mb)
+    with open_client_zip(zip_path, compression) as zipf:
+        for i, file_info, results, reused, resumed in workbook_results:
+            reused_files += reused
+            resumed_files += resumed
             try:
-                for i, file_info in enumerate(zip_analysis['excel_files']):
-                    file_path = file_info['path']
-                    Date = file_info['date']
-                    progress = (i + 1) / total_files
-                    progress_bar.progress(progress)
-                    status_text.text(f'Processing {i + 1}/{total_files}: {os.path.basename(file_path)}')
-                    results = process_excel_file_safe(file_path, Date, temp_output_dir)
-                    for result in results:
-                        result['source_file'] = file_path
-                        result['date_folder'] = file_info['folder_name']
-                        all_results.append(result)
-                progress_bar.progress(1.0)
-                status_text.success('✅ Processing complete!')
-                st.session_state.processing_results = all_results
-                st.markdown('---')
-                st.markdown('### 📈 Processing Report')
-                display_processing_report(all_results, show_detailed_progress)
-                st.markdown('---')
-                st.markdown('### 📦 Download Processed Files')
-                if not any((r['status'] == 'success' for r in all_results)):
-                    st.warning('No files were successfully processed.')
-                    return
-                with st.spinner(f'Creating organized ZIP file for {client_name}...'):
-                    zip_path, folder_structure, error = create_client_zip(client_name, temp_output_dir, all_results)
-                    if error:
-                        st.error(f'❌ Error creating ZIP file: {error}')
-                    else:
-                        st.session_state.client_zip_path = zip_path
-                        st.success(f'✅ ZIP file created with organized folder structure!')
-                        display_folder_structure(folder_structure)
-                        zip_filename = f'{client_name}_processed_files.zip'
-                        download_link = get_zip_download_link(zip_path, zip_filename, f'📥 Download {zip_filename}')
-                        st.markdown(download_link, unsafe_allow_html=True)
-                        if os.path.exists(zip_path):
-                            os.remove(zip_path)
+                for result in results:
+                    result['source_file'] = file_info['path']
+                    result['date_folder'] = file_info['folder_name']
+                    if result['status'] == 'success':
+                        if save_history:
+                            # Before the ZIP writer takes the content over and releases it
+                            try:
+                                history_rows += save_result_to_history(result, client_name, file_info['date'])
+                            except Exception as e:
+                                history_errors.append(f"{result['file_path']}: {e}")
+                        add_result_to_zip(zipf, result, folder_structure, output_format, release=True)
+                    all_results.append(result)
             finally:
-                if 'temp_output_dir' in st.session_state:
-                    safe_cleanup_temp_dir(st.session_state.temp_output_dir)
-                    del st.session_state.temp_output_dir
-                if 'temp_dir' in st.session_state:
-                    safe_cleanup_temp_dir(st.session_state.temp_dir)
-                    del st.session_state.temp_dir
-                if 'zip_analysis' in st.session_state:
-                    del st.session_state.zip_analysis
-                if 'current_zip' in st.session_state:
-                    del st.session_state.current_zip
-                st.info('Processing finished. Upload a new ZIP to start again.')
-
-def render_one_off_upload_block():
+                # A cancelled run stops here; spooled outputs already committed to the checkpoint go
+                for result in results:
+                    release_result_content(result)
+    if checkpoint_dir:
+        # Every workbook made it into the client ZIP; a rerun of this archive starts fresh again
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return {'results': all_results, 'folder_structure': folder_structure, 'client_name': client_name, 'reused_files': reused_files, 'resumed_files': resumed_files, 'total_files': total_files, 'reuse_outputs': reuse_outputs, 'history_rows': history_rows, 'history_errors': history_errors}
+
+def render_one_off_upload_block(engine=DEFAULT_EXCEL_ENGINE):
     st.markdown("### ⚡ Quick Process Single File")
     with st.expander("Upload & Process a single file immediately", expanded=True):
         col1, col2 = st.columns([3, 1])
@@ -572,13 +1542,13 @@ def render_one_off_upload_block():
         if process_btn and uploaded_file:
              with st.spinner(f"Processing {uploaded_file.name}..."):
                  try:
-                     xls = pd.ExcelFile(uploaded_file)
+                     xls = open_excel_file(uploaded_file, engine)
                      top_posts_df = pd.DataFrame()
                      
                      for sheet_name in xls.sheet_names:
                          try:
                              # Read sheet without header initially
-                             df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+                             df = xls.parse(sheet_name=sheet_name, header=None)
                              if df.empty:
                                  continue
                              
@@ -632,13 +1602,18 @@ def app():
     st.markdown('<h1 style="text-align: center; color: #002b5c;">� FPK File Processor</h1>', unsafe_allow_html=True)
     st.markdown('### 👤 Client Information')
     client_name = st.text_input('Client Name:', placeholder='Enter client name (e.g., Dialog_Axiata, Mobitel, etc.)', help='Required for creating the output ZIP file', key='client_name_global')
+    engine = st.selectbox('Excel reader:', EXCEL_ENGINES, index=EXCEL_ENGINES.index(DEFAULT_EXCEL_ENGINE) if DEFAULT_EXCEL_ENGINE in EXCEL_ENGINES else 0, key='fpk_excel_engine', help=f"'auto' uses calamine when python-calamine is installed (currently: {resolve_excel_engine('auto')}). Workbooks the fast reader cannot parse fall back to openpyxl. '{STREAMING_ENGINE}' keeps memory bounded for very large sheets by writing CSVs to disk in chunks.")
+    output_format = st.selectbox('Output format:', output_formats.available_output_formats(), key='fpk_output_format', help='CSV as before, or typed columnar files: Parquet (zstd) or Arrow IPC. Column types come from the schema registry, the same in every file of a sheet type: integer, float, date, timestamp or text.')
+    compressions = zip_builder.available_zip_compressions()
+    compression = st.selectbox('ZIP compression:', compressions, index=compressions.index(zip_builder.DEFAULT_ZIP_COMPRESSION) if zip_builder.DEFAULT_ZIP_COMPRESSION in compressions else 0, key='fpk_zip_compression', help="Members are compressed in parallel. 'Stored' is fastest and largest, 'Best deflate', 'BZIP2' and 'LZMA' are smaller but slower; Parquet and Arrow outputs are already compressed.")
+    save_history = st.checkbox('Save outputs to the history store', key='fpk_save_history', help=f'Processed sheets are also added to {history_store.HISTORY_DB_PATH}, keyed on client, file date, network and workbook. Processing the same workbook again replaces its rows.')
     mode = st.radio('Select Upload Mode:', ['📦 ZIP File Upload', '📁 Single File(s) Upload'], horizontal=True, help='Choose whether to upload a ZIP file containing folders or individual Excel files.')
     st.markdown('---')
     if mode == '📦 ZIP File Upload':
-        render_one_off_upload_block()
-        page_zip_processor(client_name)
+        render_one_off_upload_block(engine)
+        page_zip_processor(client_name, engine, output_format, compression, save_history)
     else:
-        render_one_off_upload_block()
-        page_single_files(client_name)
+        render_one_off_upload_block(engine)
+        page_single_files(client_name, engine, output_format, compression, save_history)
     st.markdown('---')
     st.markdown("\n        <div style='text-align: center; color: #666; margin-top: 2rem; margin-bottom: 2rem;'>\n            <p>Created by @djslash9 | 2025</p>\n        </div>\n        ", unsafe_allow_html=True)
\ No newline at end of file
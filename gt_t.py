@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
+import io
 import os
+import re
+import csv
 import glob
+import zipfile
 import datetime
 import calendar
+from concurrent.futures import ThreadPoolExecutor
+import output_formats
+import jobs
+import history_store
 
 def hide_streamlit_ui():
     hide_menu_and_footer_css = '\n        <style>\n        #MainMenu {display: none;}\n        footer {display: none;}\n        [data-testid="stToolbar"] {display: none;}\n        </style>\n    '
@@ -11,30 +19,189 @@ def hide_streamlit_ui():
 
 # CSS and UI hiding moved to app() function
 
-def app():
-    hide_streamlit_ui()
-    st.markdown('\n<style>\n    /* Hide sidebar, though layout changes should make it redundant */\n    section[data-testid="stSidebar"] {\n        display: none;\n    }\n    .main-header {\n        font-size: 3rem;\n        color: #1f77b4;\n        text-align: center;\n        margin-bottom: 2rem;\n        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);\n    }\n    .sub-header {\n        font-size: 1.5rem;\n        color: #ff7f0e;\n        margin: 1rem 0;\n        border-bottom: 2px solid #ff7f0e;\n        padding-bottom: 0.5rem;\n    }\n    .success-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #d4edda;\n        border: 1px solid #c3e6cb;\n        margin: 1rem 0;\n    }\n    .warning-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #fff3cd;\n        border: 1px solid #ffeaa7;\n        margin: 1rem 0;\n    }\n    .error-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #f8d7da;\n        border: 1px solid #f5c6cb;\n        margin: 1rem 0;\n    }\n    /* Style for primary button */\n    .stButton > button {\n        font-weight: bold;\n        transition: all 0.3s;\n    }\n    .stButton > button:hover {\n        transform: translateY(-2px);\n        box-shadow: 0 4px 8px rgba(0,0,0,0.2);\n    }\n</style>\n', unsafe_allow_html=True)
-    if 'processed_data' not in st.session_state:
-        st.session_state.processed_data = {}
-    if 'file_date' not in st.session_state:
-        today = datetime.date.today()
-        last_day = calendar.monthrange(today.year, today.month)[1]
-        st.session_state.file_date = datetime.date(today.year, today.month, last_day)
-    if 'uploader_key' not in st.session_state:
-        st.session_state.uploader_key = 0
+BATCH_MAX_WORKERS = max(1, os.cpu_count() or 1)
+TIMELINE_HEADERS = ('week', 'day', 'month', 'time')
+BREAKDOWN_HEADERS = {'region': 'Region', 'city': 'City'}
+# 2024-01-31, 2024.01.31, 2024_01_31 or 20240131 anywhere in a folder or file name
+PATH_DATE_PATTERN = re.compile('(20\\d{2})[-._]?(0[1-9]|1[0-2])[-._]?(0[1-9]|[12]\\d|3[01])(?!\\d)')
+OUTPUT_FILE_PREFIXES = {'timeline': 'gt_timeline', 'region': 'gt_geomap_region', 'city': 'gt_geomap_city'}
+UPLOAD_SLOTS = [('web_timeline', 'timeline', 'Web'), ('youtube_timeline', 'timeline', 'Youtube'), ('web_geomap_region', 'region', 'Web'), ('youtube_geomap_region', 'region', 'Youtube'), ('web_geomap_city', 'city', 'Web'), ('youtube_geomap_city', 'city', 'Youtube')]
 
-    def clear_files():
-        st.session_state.uploader_key += 1
-    st.markdown('<h1 style="text-align: center; color: #002b5c;">📊 Google Trends Data Processor</h1>', unsafe_allow_html=True)
-    st.markdown('<h3 class="sub-header" style="color: #1f77b4; border-color: #1f77b4;">🗂️ Step 1: Provide Inputs</h3>', unsafe_allow_html=True)
-    st.date_input('File Date:', key='file_date', help='Select the date associated with these files.')
-    st.markdown('---')
+def read_trends_csv(file):
+    # Same rows as pd.read_csv(file, skiprows=2): the "Category" line and the blank line after it are
+    # dropped. Cells are read as text by pyarrow, then value columns that are entirely numeric become
+    # int64 (float64 when there are gaps) and the rest, e.g. with "<1", stay text, as pandas infers them.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if hasattr(file, 'read'):
+        data = file.read()
+    else:
+        with open(file, 'rb') as f:
+            data = f.read()
+    parts = data.split(b'\n', 2)
+    body = parts[2] if len(parts) == 3 else b''
+    names = output_formats.csv_column_names(body)
+    tables = list(output_formats.iter_csv_batches(body, names))
+    table = pa.concat_tables(tables) if tables else pa.table({name: pa.array([], pa.string()) for name in names})
+    for i, name in enumerate(names[1:], start=1):
+        arrow_type = output_formats.narrowest_type(table.column(i), pa.int64())
+        if arrow_type != pa.string():
+            table = table.set_column(i, name, pc.cast(table.column(i), arrow_type))
+    return table.to_pandas()
+
+# These run inside background jobs, so problems are collected as (level, text) messages for the page to show
+def process_timeline_file(file, platform_name, file_date, messages):
+    if file is None:
+        return None
+    try:
+        df = read_trends_csv(file)
+        df.columns = [col.replace(': (Sri Lanka)', '') for col in df.columns]
+        df['Platform'] = platform_name
+        df['Date'] = file_date
+        return df
+    except Exception as e:
+        messages.append(('error', f'Error processing {file.name}: {e}'))
+        return None
+
+def process_geomap_file(file, platform_name, file_date, breakdown_type, messages):
+    if file is None:
+        return None
+    try:
+        df = read_trends_csv(file)
+        if df.columns[0].lower() != breakdown_type.lower():
+            messages.append(('warning', f'File {file.name} does not appear to be {breakdown_type} data. Skipping.'))
+            return None
+        df.columns = [col.split(':')[0] for col in df.columns]
+        df['Breakdown'] = breakdown_type
+        df['Platform'] = platform_name
+        df['Date'] = file_date
+        return df
+    except Exception as e:
+        messages.append(('error', f'Error processing {file.name}: {e}'))
+        return None
+
+def copy_upload(file):
+    if file is None:
+        return None
+    copy = io.BytesIO(file.getvalue())
+    copy.name = file.name
+    return copy
+
+def run_trends_job(job, files, file_date):
+    processed_data = {}
+    messages = []
+    for i, (output_name, breakdown_type) in enumerate([('timeline', None), ('region', 'Region'), ('city', 'City')]):
+        job.update(i / 3, f'Processing {output_name} files...')
+        dfs = []
+        for slot, slot_output, platform_name in UPLOAD_SLOTS:
+            if slot_output != output_name:
+                continue
+            if breakdown_type is None:
+                df = process_timeline_file(files[slot], platform_name, file_date, messages)
+            else:
+                df = process_geomap_file(files[slot], platform_name, file_date, breakdown_type, messages)
+            if df is not None:
+                dfs.append(df)
+        if dfs:
+            processed_data[output_name] = pd.concat(dfs, ignore_index=True)
+    return {'processed_data': processed_data, 'messages': messages, 'file_date': file_date, 'date_suffix': file_date.strftime('%Y%m%d'), 'payloads': {}}
+
+def trends_output_filename(output_name, date_suffix, output_format):
+    return f'{OUTPUT_FILE_PREFIXES[output_name]}_{date_suffix}{output_formats.OUTPUT_FORMATS[output_format][0]}'
+
+def save_trends_history(processed_data, client_name):
+    # Each file's rows are keyed on client, Date and Platform, so saving the same run twice changes nothing
+    return {output_name: history_store.ingest_frame('gt', output_name, df, client_name, None, 'Platform') for output_name, df in processed_data.items()}
+
+def iter_trends_exports(source):
+    # source: ZIP bytes or a directory path; yields (name, bytes) for every CSV in it
+    if isinstance(source, bytes):
+        with zipfile.ZipFile(io.BytesIO(source)) as zipf:
+            for info in zipf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith('.csv') and '__MACOSX' not in info.filename.split('/'):
+                    yield (info.filename, zipf.read(info))
+    else:
+        for path in sorted(glob.glob(os.path.join(source, '**', '*.csv'), recursive=True)):
+            name = os.path.relpath(path, source)
+            if '__MACOSX' in name.split(os.sep):
+                continue
+            with open(path, 'rb') as f:
+                yield (name, f.read())
+
+def path_date(name):
+    # The last date in the path wins, so a dated file name overrides its folder's date
+    for year, month, day in reversed(PATH_DATE_PATTERN.findall(name)):
+        try:
+            return datetime.date(int(year), int(month), int(day))
+        except ValueError:
+            continue
+    return None
+
+def classify_trends_export(name, data):
+    # Returns (output_name, breakdown_type, platform_name, file_date) or None if it isn't a Trends export.
+    # The header row (third line) names the breakdown; the file name is the fallback for timelines.
+    lines = data[:4096].decode('utf-8-sig', errors='replace').splitlines()
+    header = next(csv.reader([lines[2]]), ['']) if len(lines) > 2 else ['']
+    first = header[0].strip().lower() if header else ''
+    lowered = name.lower()
+    if first in TIMELINE_HEADERS or (not first and 'multitimeline' in lowered):
+        output_name, breakdown_type = ('timeline', None)
+    elif first in BREAKDOWN_HEADERS:
+        output_name, breakdown_type = (first, BREAKDOWN_HEADERS[first])
+    else:
+        return None
+    platform_name = 'Youtube' if 'youtube' in lowered else 'Web'
+    return (output_name, breakdown_type, platform_name, path_date(name))
+
+def process_trends_export(name, data, output_name, breakdown_type, platform_name, file_date):
+    messages = []
+    file = io.BytesIO(data)
+    file.name = name
+    if breakdown_type is None:
+        df = process_timeline_file(file, platform_name, file_date, messages)
+    else:
+        df = process_geomap_file(file, platform_name, file_date, breakdown_type, messages)
+    return (df, messages)
+
+def run_trends_batch_job(job, source, default_date, max_workers=BATCH_MAX_WORKERS):
+    messages = []
+    plan = []
+    job.update(0, 'Reading exports...')
+    for name, data in iter_trends_exports(source):
+        kind = classify_trends_export(name, data)
+        if kind is None:
+            messages.append(('warning', f'File {name} is not a recognised Google Trends timeline or geomap export. Skipping.'))
+            continue
+        output_name, breakdown_type, platform_name, file_date = kind
+        if file_date is None:
+            messages.append(('warning', f"No date found in the name of {name}; using {default_date.strftime('%Y-%m-%d')}."))
+            file_date = default_date
+        plan.append({'name': name, 'data': data, 'output': output_name, 'breakdown': breakdown_type, 'platform': platform_name, 'date': file_date})
+    # Same row order as a run per period: by date, Web before Youtube, then file name
+    plan.sort(key=lambda item: (item['date'], item['platform'] != 'Web', item['name']))
+    frames = {'timeline': [], 'region': [], 'city': []}
+    summary = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='gt-batch') as executor:
+        futures = [executor.submit(process_trends_export, item['name'], item.pop('data'), item['output'], item['breakdown'], item['platform'], item['date']) for item in plan]
+        for i, (item, future) in enumerate(zip(plan, futures)):
+            job.update(i / max(1, len(plan)), f"Processing {item['name']} ({i + 1}/{len(plan)})...")
+            df, file_messages = future.result()
+            messages.extend(file_messages)
+            if df is not None:
+                frames[item['output']].append(df)
+            summary.append({'File': item['name'], 'Type': item['output'].title(), 'Platform': item['platform'], 'Date': item['date'], 'Rows': 0 if df is None else len(df)})
+    processed_data = {output_name: pd.concat(dfs, ignore_index=True) for output_name, dfs in frames.items() if dfs}
+    dates = sorted({item['date'] for item in plan}) or [default_date]
+    date_suffix = dates[0].strftime('%Y%m%d') if len(dates) == 1 else f"{dates[0].strftime('%Y%m%d')}_{dates[-1].strftime('%Y%m%d')}"
+    return {'processed_data': processed_data, 'messages': messages, 'file_date': dates[-1], 'date_suffix': date_suffix, 'batch': summary, 'payloads': {}}
+
+def page_single_inputs():
     col_header, col_clear = st.columns([3, 1])
     with col_header:
         st.markdown('<h3 class="sub-header" style="color: #1f77b4; border-color: #1f77b4; margin-top: 0;">📂 Upload Files</h3>', unsafe_allow_html=True)
     with col_clear:
         if st.button('🗑️ Clear All Files'):
-            clear_files()
+            st.session_state.uploader_key += 1
             st.rerun()
     col1, col2 = st.columns(2)
     key_suffix = str(st.session_state.uploader_key)
@@ -48,36 +215,6 @@ def app():
         st.session_state.youtube_geomap_city = st.file_uploader('6. Youtube Geomap City CSV', type='csv', key=f'youtube_geomap_city_{key_suffix}')
     st.markdown('---')
     process_button = st.button('🚀 Process All Data', use_container_width=True, type='primary')
-
-    def process_timeline_file(file, platform_name, file_date):
-        if file is None:
-            return None
-        try:
-            df = pd.read_csv(file, skiprows=2)
-            df.columns = [col.replace(': (Sri Lanka)', '') for col in df.columns]
-            df['Platform'] = platform_name
-            df['Date'] = file_date
-            return df
-        except Exception as e:
-            st.error(f'Error processing {file.name}: {e}')
-            return None
-
-    def process_geomap_file(file, platform_name, file_date, breakdown_type):
-        if file is None:
-            return None
-        try:
-            df = pd.read_csv(file, skiprows=2)
-            if df.columns[0].lower() != breakdown_type.lower():
-                st.warning(f'File {file.name} does not appear to be {breakdown_type} data. Skipping.')
-                return None
-            df.columns = [col.split(':')[0] for col in df.columns]
-            df['Breakdown'] = breakdown_type
-            df['Platform'] = platform_name
-            df['Date'] = file_date
-            return df
-        except Exception as e:
-            st.error(f'Error processing {file.name}: {e}')
-            return None
     if process_button:
         any_file_uploaded = st.session_state.web_timeline or st.session_state.web_geomap_region or st.session_state.web_geomap_city or st.session_state.youtube_timeline or st.session_state.youtube_geomap_region or st.session_state.youtube_geomap_city
         if not st.session_state.file_date:
@@ -85,60 +222,99 @@ def app():
         elif not any_file_uploaded:
             st.markdown('<div class="error-box"><strong>❌ Please upload at least one CSV file.</strong></div>', unsafe_allow_html=True)
         else:
-            with st.spinner('Processing all data...'):
-                try:
-                    st.session_state.processed_data = {}
-                    file_date = st.session_state.file_date
-                    df_web_timeline = process_timeline_file(st.session_state.web_timeline, 'Web', file_date)
-                    df_youtube_timeline = process_timeline_file(st.session_state.youtube_timeline, 'Youtube', file_date)
-                    timeline_dfs = [df for df in [df_web_timeline, df_youtube_timeline] if df is not None]
-                    if timeline_dfs:
-                        df_timeline_merged = pd.concat(timeline_dfs, ignore_index=True)
-                        st.session_state.processed_data['timeline'] = df_timeline_merged
-                    df_web_region = process_geomap_file(st.session_state.web_geomap_region, 'Web', file_date, 'Region')
-                    df_youtube_region = process_geomap_file(st.session_state.youtube_geomap_region, 'Youtube', file_date, 'Region')
-                    region_dfs = [df for df in [df_web_region, df_youtube_region] if df is not None]
-                    if region_dfs:
-                        df_region_merged = pd.concat(region_dfs, ignore_index=True)
-                        st.session_state.processed_data['region'] = df_region_merged
-                    df_web_city = process_geomap_file(st.session_state.web_geomap_city, 'Web', file_date, 'City')
-                    df_youtube_city = process_geomap_file(st.session_state.youtube_geomap_city, 'Youtube', file_date, 'City')
-                    city_dfs = [df for df in [df_web_city, df_youtube_city] if df is not None]
-                    if city_dfs:
-                        df_city_merged = pd.concat(city_dfs, ignore_index=True)
-                        st.session_state.processed_data['city'] = df_city_merged
-                    st.markdown('<div class="success-box"><strong>✅ Data processed successfully! View results below.</strong></div>', unsafe_allow_html=True)
-                except Exception as e:
-                    st.markdown(f'<div class="error-box"><strong>Error during processing: {e}</strong></div>', unsafe_allow_html=True)
+            files = {slot: copy_upload(st.session_state[slot]) for slot, _, _ in UPLOAD_SLOTS}
+            jobs.start_job('gt_job', 'google_trends', 'Processing all data', run_trends_job, files, st.session_state.file_date)
+
+def page_batch_inputs():
+    st.markdown('<h3 class="sub-header" style="color: #1f77b4; border-color: #1f77b4; margin-top: 0;">📦 Batch of Exports</h3>', unsafe_allow_html=True)
+    st.info('Upload a ZIP of Google Trends CSV exports or give a folder on the server. Each file\'s type comes from its header row (Week/Day/Month, Region or City), its platform from "youtube" in its path (Web otherwise) and its date from a date in its path, e.g. 2024-01-31 or 20240131.')
+    zip_file = st.file_uploader('ZIP of CSV exports', type='zip', key=f'gt_batch_zip_{st.session_state.uploader_key}')
+    folder = st.text_input('Or folder path:', key='gt_batch_folder', help='Searched recursively for .csv files.')
+    if st.button('🚀 Process Batch', use_container_width=True, type='primary'):
+        if zip_file is None and not folder.strip():
+            st.markdown('<div class="error-box"><strong>❌ Please upload a ZIP file or enter a folder path.</strong></div>', unsafe_allow_html=True)
+        elif zip_file is None and not os.path.isdir(folder.strip()):
+            st.markdown(f'<div class="error-box"><strong>❌ Folder not found: {folder.strip()}</strong></div>', unsafe_allow_html=True)
+        else:
+            source = zip_file.getvalue() if zip_file is not None else folder.strip()
+            jobs.start_job('gt_job', 'google_trends', 'Processing batch', run_trends_batch_job, source, st.session_state.file_date)
+
+def app():
+    hide_streamlit_ui()
+    st.markdown('\n<style>\n    /* Hide sidebar, though layout changes should make it redundant */\n    section[data-testid="stSidebar"] {\n        display: none;\n    }\n    .main-header {\n        font-size: 3rem;\n        color: #1f77b4;\n        text-align: center;\n        margin-bottom: 2rem;\n        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);\n    }\n    .sub-header {\n        font-size: 1.5rem;\n        color: #ff7f0e;\n        margin: 1rem 0;\n        border-bottom: 2px solid #ff7f0e;\n        padding-bottom: 0.5rem;\n    }\n    .success-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #d4edda;\n        border: 1px solid #c3e6cb;\n        margin: 1rem 0;\n    }\n    .warning-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #fff3cd;\n        border: 1px solid #ffeaa7;\n        margin: 1rem 0;\n    }\n    .error-box {\n        padding: 1rem;\n        border-radius: 0.5rem;\n        background-color: #f8d7da;\n        border: 1px solid #f5c6cb;\n        margin: 1rem 0;\n    }\n    /* Style for primary button */\n    .stButton > button {\n        font-weight: bold;\n        transition: all 0.3s;\n    }\n    .stButton > button:hover {\n        transform: translateY(-2px);\n        box-shadow: 0 4px 8px rgba(0,0,0,0.2);\n    }\n</style>\n', unsafe_allow_html=True)
+    if 'file_date' not in st.session_state:
+        today = datetime.date.today()
+        last_day = calendar.monthrange(today.year, today.month)[1]
+        st.session_state.file_date = datetime.date(today.year, today.month, last_day)
+    if 'uploader_key' not in st.session_state:
+        st.session_state.uploader_key = 0
+    st.markdown('<h1 style="text-align: center; color: #002b5c;">📊 Google Trends Data Processor</h1>', unsafe_allow_html=True)
+    st.markdown('<h3 class="sub-header" style="color: #1f77b4; border-color: #1f77b4;">🗂️ Step 1: Provide Inputs</h3>', unsafe_allow_html=True)
+    batch_mode = st.radio('Mode:', ['Single period', 'Batch (ZIP or folder)'], key='gt_mode', horizontal=True, help="Batch mode takes many periods of exports at once and infers each file's platform, type and date.") != 'Single period'
+    st.date_input('File Date:', key='file_date', help='Used for batch files with no date in their name.' if batch_mode else 'Select the date associated with these files.')
+    st.markdown('---')
+    if batch_mode:
+        page_batch_inputs()
+    else:
+        page_single_inputs()
+    processed_data = {}
+    job = jobs.render_job('gt_job')
+    if job is not None and job.status == 'done':
+        processed_data = job.result['processed_data']
+        for level, text in job.result['messages']:
+            getattr(st, level)(text)
+        st.markdown('<div class="success-box"><strong>✅ Data processed successfully! View results below.</strong></div>', unsafe_allow_html=True)
+        if job.result.get('batch'):
+            with st.expander(f"Batch: {len(job.result['batch'])} file(s)"):
+                st.dataframe(pd.DataFrame(job.result['batch']), use_container_width=True, hide_index=True)
     st.markdown('---')
     st.markdown('<h3 class="sub-header" style="color: #ff7f0e; border-color: #ff7f0e;">💾 Step 2: View & Download Results</h3>', unsafe_allow_html=True)
-    if not st.session_state.processed_data:
+    if not processed_data:
         st.markdown('\n        <div class="warning-box">\n            <h3>👋 Welcome!</h3>\n            <p>Your processed data previews and download links will appear here after processing.</p>\n            <p>Please use <strong>Step 1</strong> above to upload your files and click <strong>"Process All Data"</strong>.</p>\n        </div>\n        ', unsafe_allow_html=True)
     else:
-        date_suffix = st.session_state.file_date.strftime('%Y%m%d')
+        date_suffix = job.result['date_suffix']
+        output_format = st.selectbox('Download format:', output_formats.available_output_formats(), key='gt_output_format', help='CSV, or typed columnar files (Parquet with zstd, Arrow IPC) for faster warehouse loads.')
+        mime = output_formats.output_mime(output_format)
+        # Encoded once per processing run and format, on the first click
+        payloads = job.result['payloads']
+        col_client, col_save = st.columns([3, 1])
+        with col_client:
+            history_client = st.text_input('Client for history:', key='gt_history_client', placeholder='e.g. Dialog_Axiata', help=f'Saves these results to {history_store.HISTORY_DB_PATH}, keyed on client, file date and platform. Saving a period again replaces its rows.')
+        with col_save:
+            st.write('')
+            save_clicked = st.button('🗄️ Save to History', use_container_width=True)
+        if save_clicked:
+            if not history_client.strip():
+                st.error('❌ Please enter a client name to save to the history store.')
+            else:
+                try:
+                    saved = save_trends_history(processed_data, history_client.strip())
+                    st.success(f"✅ Saved to history: {', '.join((f'{rows} {name} row(s)' for name, rows in saved.items()))}.")
+                except Exception as e:
+                    st.error(f'❌ Error saving to the history store: {e}')
         tab1, tab2, tab3 = st.tabs(['🕒 Timeline', '🗺️ Region', '🏙️ City'])
         with tab1:
-            if 'timeline' in st.session_state.processed_data:
+            if 'timeline' in processed_data:
                 st.markdown('<h3 class="sub-header">Merged Timeline Data</h3>', unsafe_allow_html=True)
-                st.download_button(label='Download Timeline CSV', data=st.session_state.processed_data['timeline'].to_csv(index=False).encode('utf-8'), file_name=f'gt_timeline_{date_suffix}.csv', mime='text/csv', use_container_width=True)
-                st.dataframe(st.session_state.processed_data['timeline'].head(), use_container_width=True)
-                st.write(f"Total rows: {st.session_state.processed_data['timeline'].shape[0]}")
+                st.download_button(label=f'Download Timeline {output_format}', data=output_formats.lazy_payload(payloads, ('timeline', output_format), lambda: output_formats.encode_frame(processed_data['timeline'], output_format)), file_name=trends_output_filename('timeline', date_suffix, output_format), mime=mime, use_container_width=True, on_click='ignore')
+                st.dataframe(processed_data['timeline'].head(), use_container_width=True)
+                st.write(f"Total rows: {processed_data['timeline'].shape[0]}")
             else:
                 st.warning('No Timeline data was processed.')
         with tab2:
-            if 'region' in st.session_state.processed_data:
+            if 'region' in processed_data:
                 st.markdown('<h3 class="sub-header">Merged GeoMap Region Data</h3>', unsafe_allow_html=True)
-                st.download_button(label='Download Region CSV', data=st.session_state.processed_data['region'].to_csv(index=False).encode('utf-8'), file_name=f'gt_geomap_region_{date_suffix}.csv', mime='text/csv', use_container_width=True)
-                st.dataframe(st.session_state.processed_data['region'].head(), use_container_width=True)
-                st.write(f"Total rows: {st.session_state.processed_data['region'].shape[0]}")
+                st.download_button(label=f'Download Region {output_format}', data=output_formats.lazy_payload(payloads, ('region', output_format), lambda: output_formats.encode_frame(processed_data['region'], output_format)), file_name=trends_output_filename('region', date_suffix, output_format), mime=mime, use_container_width=True, on_click='ignore')
+                st.dataframe(processed_data['region'].head(), use_container_width=True)
+                st.write(f"Total rows: {processed_data['region'].shape[0]}")
             else:
                 st.warning('No Region data was processed.')
         with tab3:
-            if 'city' in st.session_state.processed_data:
+            if 'city' in processed_data:
                 st.markdown('<h3 class="sub-header">Merged GeoMap City Data</h3>', unsafe_allow_html=True)
-                st.download_button(label='Download City CSV', data=st.session_state.processed_data['city'].to_csv(index=False).encode('utf-8'), file_name=f'gt_geomap_city_{date_suffix}.csv', mime='text/csv', use_container_width=True)
-                st.dataframe(st.session_state.processed_data['city'].head(), use_container_width=True)
-                st.write(f"Total rows: {st.session_state.processed_data['city'].shape[0]}")
+                st.download_button(label=f'Download City {output_format}', data=output_formats.lazy_payload(payloads, ('city', output_format), lambda: output_formats.encode_frame(processed_data['city'], output_format)), file_name=trends_output_filename('city', date_suffix, output_format), mime=mime, use_container_width=True, on_click='ignore')
+                st.dataframe(processed_data['city'].head(), use_container_width=True)
+                st.write(f"Total rows: {processed_data['city'].shape[0]}")
             else:
                 st.warning('No City data was processed.')
     st.markdown('---')
@@ -0,0 +1,159 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+# Processed Google Trends and FPK frames accumulate here so history is read back by client and date
+# range instead of re-merging old exports. Unlike the caches this is kept.
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', os.path.join(os.path.expanduser('~'), '.etl', 'history.sqlite'))
+# Blobs are uncompressed by default: reads decode many small partitions, and lz4 makes that about 3x
+# slower for a 40% smaller file. Set to lz4 or zstd to trade read latency for disk space.
+HISTORY_COMPRESSION = os.environ.get('HISTORY_COMPRESSION') or None
+PARTITION_COLUMNS = ['source', 'dataset', 'client', 'period', 'network', 'origin', 'rows', 'columns', 'ingested_at']
+
+_write_lock = threading.Lock()
+
+def period_text(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+CREATE_PARTITIONS = 'CREATE TABLE IF NOT EXISTS partitions (source TEXT NOT NULL, dataset TEXT NOT NULL, client TEXT NOT NULL, period TEXT NOT NULL, network TEXT NOT NULL, origin TEXT NOT NULL, rows INTEGER NOT NULL, columns TEXT NOT NULL, ingested_at REAL NOT NULL, data BLOB NOT NULL, PRIMARY KEY (source, dataset, client, period, network, origin))'
+
+def partition_table_columns(con):
+    return [row[1] for row in con.execute('PRAGMA table_info(partitions)')]
+
+def migrate_partitions(con):
+    # Stores written before partitions were keyed on their origin get it as ''. Checked again
+    # under the write lock in case another connection got there first.
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        if 'origin' not in partition_table_columns(con):
+            con.execute('ALTER TABLE partitions RENAME TO partitions_old')
+            con.execute(CREATE_PARTITIONS)
+            con.execute("INSERT INTO partitions SELECT source, dataset, client, period, network, '', rows, columns, ingested_at, data FROM partitions_old")
+            con.execute('DROP TABLE partitions_old')
+        con.execute('COMMIT')
+    except BaseException:
+        con.execute('ROLLBACK')
+        raise
+
+def connect(path=HISTORY_DB_PATH):
+    # One row per (source, dataset, client, period, network, origin) partition, its rows kept as an
+    # Arrow IPC blob: partitions are only ever written whole, and writing one again replaces it.
+    # origin tells apart the inputs a period's rows come from, e.g. two FPK workbooks of one dated folder.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    con = sqlite3.connect(path, timeout=60)
+    # WAL lets the page read while a background job writes
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    columns = partition_table_columns(con)
+    if columns and 'origin' not in columns:
+        migrate_partitions(con)
+    con.execute(CREATE_PARTITIONS)
+    con.execute('CREATE INDEX IF NOT EXISTS partitions_period ON partitions (source, dataset, period)')
+    return con
+
+def arrow_table(df):
+    import pyarrow as pa
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns mixing types (e.g. dates and text from hand-edited sheets) are kept as text
+        mixed = {name: 'str' for name, dtype in df.dtypes.items() if dtype == object}
+        return pa.Table.from_pandas(df.astype(mixed), preserve_index=False)
+
+def encode_partition(df):
+    import pyarrow as pa
+    table = arrow_table(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=HISTORY_COMPRESSION)) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def decode_partition(data):
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_all()
+
+def ingest_frame(source, dataset, df, client, period=None, network_column=None, path=HISTORY_DB_PATH, origin=''):
+    # period: the report date of every row, or None to take it per row from the frame's Date column.
+    # Rows are split into (period, network) partitions that replace only the ones with the same
+    # origin; returns the number of rows written.
+    if df is None or df.empty:
+        return 0
+    frame = df.reset_index(drop=True)
+    frame.columns = [str(name) for name in frame.columns]
+    periods = pd.Series(period_text(period), index=frame.index) if period is not None else pd.to_datetime(frame['Date'].astype(str)).dt.strftime('%Y-%m-%d')
+    networks = frame[network_column].fillna('').astype(str) if network_column in frame.columns else pd.Series('', index=frame.index)
+    ingested_at = time.time()
+    records = []
+    for (period_value, network), index in frame.groupby([periods, networks], sort=True).indices.items():
+        part = frame.take(index)
+        records.append((source, dataset, client or '', period_value, network, origin or '', len(part), ','.join(part.columns), ingested_at, encode_partition(part)))
+    with _write_lock, closing(connect(path)) as con:
+        with con:
+            con.executemany('INSERT OR REPLACE INTO partitions (source, dataset, client, period, network, origin, rows, columns, ingested_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', records)
+    return len(frame)
+
+def partition_filter(source, dataset=None, client=None, start=None, end=None, networks=None):
+    where = ['source = ?']
+    params = [source]
+    if dataset is not None:
+        where.append('dataset = ?')
+        params.append(dataset)
+    if client is not None:
+        where.append('client = ?')
+        params.append(client)
+    if start is not None:
+        where.append('period >= ?')
+        params.append(period_text(start))
+    if end is not None:
+        where.append('period <= ?')
+        params.append(period_text(end))
+    if networks:
+        where.append(f"network IN ({', '.join('?' * len(networks))})")
+        params.extend(networks)
+    return (' AND '.join(where), params)
+
+def read_history(source, dataset, client=None, start=None, end=None, networks=None, columns=None, path=HISTORY_DB_PATH):
+    # Only the matching partitions are decoded; rows come back in period, client, network order
+    # with Client and Period columns in front
+    import pyarrow as pa
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    where, params = partition_filter(source, dataset, client, start, end, networks)
+    with closing(connect(path)) as con:
+        found = con.execute(f'SELECT client, period, rows, data FROM partitions WHERE {where} ORDER BY period, client, network, origin', params).fetchall()
+    if not found:
+        return pd.DataFrame()
+    tables = [decode_partition(data) for _, _, _, data in found]
+    if columns:
+        tables = [table.select([name for name in columns if name in table.column_names]) for table in tables]
+    try:
+        # Columns that only some partitions have are filled with nulls
+        df = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df = pd.concat([table.to_pandas() for table in tables], ignore_index=True)
+    positions = np.repeat(np.arange(len(found)), [rows for _, _, rows, _ in found])
+    keys = pd.DataFrame({'Client': pd.array([client for client, _, _, _ in found], dtype='str').take(positions), 'Period': pd.array([period for _, period, _, _ in found], dtype='str').take(positions)})
+    return pd.concat([keys[[name for name in keys.columns if name not in df.columns]], df], axis=1)
+
+def list_history(source=None, client=None, path=HISTORY_DB_PATH):
+    # One row per stored partition with its row count, without reading the rows
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=PARTITION_COLUMNS)
+    where = []
+    params = []
+    if source is not None:
+        where.append('source = ?')
+        params.append(source)
+    if client is not None:
+        where.append('client = ?')
+        params.append(client)
+    query = f"SELECT {', '.join(PARTITION_COLUMNS)} FROM partitions" + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY source, dataset, client, period, network, origin'
+    with closing(connect(path)) as con:
+        df = pd.read_sql_query(query, con, params=params)
+    df['ingested_at'] = pd.to_datetime(df['ingested_at'], unit='s')
+    return df
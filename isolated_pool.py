@@ -0,0 +1,139 @@
+import os
+import time
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+
+# How often busy workers are checked against their time and memory budgets
+WORKER_POLL_SECONDS = 0.25
+HAS_PSUTIL = importlib.util.find_spec('psutil') is not None
+
+# Set inside a worker while it runs a task, so the task can name the files it creates
+# and the parent can remove them if the worker has to be killed
+task_tag = ''
+
+def make_task_tag(pid, index):
+    return f'w{pid}-t{index}-'
+
+def read_rss(pid):
+    # psutil when it is installed, otherwise /proc (Linux); None means memory can't be checked
+    if HAS_PSUTIL:
+        import psutil
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def worker_main(conn, initializer, initargs):
+    global task_tag
+    if initializer:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        index, func, args = task
+        task_tag = make_task_tag(os.getpid(), index)
+        try:
+            outcome = ('ok', func(*args))
+        except Exception as e:
+            outcome = ('error', str(e))
+        task_tag = ''
+        conn.send(outcome)
+    conn.close()
+
+class IsolatedPool:
+    # Long-lived worker processes that each run one task at a time. A task that runs past
+    # `timeout` seconds or whose worker grows past `max_rss` bytes has its worker killed and
+    # replaced; the other workers keep going. Either limit can be None to disable it.
+
+    def __init__(self, max_workers, initializer=None, initargs=(), timeout=None, max_rss=None, on_kill=None):
+        self.max_workers = max(1, max_workers)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.max_rss = max_rss
+        # on_kill(task_tag) lets the caller clean up after a task that never returned
+        self.on_kill = on_kill
+        self._workers = []
+
+    def _start_worker(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=worker_main, args=(child_conn, self.initializer, self.initargs), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = {'process': process, 'conn': parent_conn, 'task': None, 'started': None}
+        self._workers.append(worker)
+        return worker
+
+    def _stop_worker(self, worker):
+        self._workers.remove(worker)
+        if worker['process'].is_alive():
+            worker['process'].kill()
+        worker['process'].join()
+        worker['conn'].close()
+        if worker['task'] is not None and self.on_kill:
+            self.on_kill(make_task_tag(worker['process'].pid, worker['task']))
+
+    def _over_budget(self, worker, now):
+        if self.timeout and now - worker['started'] > self.timeout:
+            return f'Timed out after {self.timeout:g}s; the worker was stopped'
+        if self.max_rss:
+            rss = read_rss(worker['process'].pid)
+            if rss is not None and rss > self.max_rss:
+                return f'Exceeded the memory limit ({rss / 1024 / 1024:.0f} MB > {self.max_rss / 1024 / 1024:.0f} MB); the worker was stopped'
+        return None
+
+    def imap_unordered(self, func, args_list):
+        # Yields (index, status, value) as tasks finish: ('ok', result), ('error', message) for an
+        # exception raised by func, ('killed', reason) when the worker was stopped or died
+        pending = list(reversed(range(len(args_list))))
+        try:
+            while pending or any((w['task'] is not None for w in self._workers)):
+                while pending and len(self._workers) < min(self.max_workers, len(args_list)):
+                    self._start_worker()
+                for worker in self._workers:
+                    if worker['task'] is None and pending:
+                        index = pending.pop()
+                        worker['task'] = index
+                        worker['started'] = time.monotonic()
+                        worker['conn'].send((index, func, args_list[index]))
+                busy = [w for w in self._workers if w['task'] is not None]
+                ready = wait([w['conn'] for w in busy], timeout=WORKER_POLL_SECONDS)
+                for worker in busy:
+                    index = worker['task']
+                    if worker['conn'] in ready:
+                        try:
+                            status, value = worker['conn'].recv()
+                        except (EOFError, OSError):
+                            worker['process'].join()
+                            self._stop_worker(worker)
+                            yield (index, 'killed', f"Worker exited unexpectedly (exit code {worker['process'].exitcode})")
+                            continue
+                        worker['task'] = None
+                        yield (index, status, value)
+                        continue
+                    reason = self._over_budget(worker, time.monotonic())
+                    if reason:
+                        self._stop_worker(worker)
+                        yield (index, 'killed', reason)
+        finally:
+            self.close()
+
+    def close(self):
+        for worker in list(self._workers):
+            if worker['task'] is None and worker['process'].is_alive():
+                try:
+                    worker['conn'].send(None)
+                except OSError:
+                    pass
+                worker['process'].join(timeout=1)
+            self._stop_worker(worker)
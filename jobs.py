@@ -0,0 +1,183 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+# Jobs run on a server-wide pool so a long run never holds the Streamlit script thread, and
+# results live here rather than in st.session_state; sessions only keep the job id.
+MAX_CONCURRENT_JOBS = int(os.environ.get('ETL_MAX_CONCURRENT_JOBS', 2))
+FINISHED_JOB_TTL_SECONDS = int(os.environ.get('ETL_JOB_TTL_SECONDS', 3600))
+PROGRESS_POLL_SECONDS = 1.0
+ACTIVE_STATUSES = ('queued', 'running')
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+
+    def __init__(self, kind, label):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = 'Waiting for a free worker...'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        # Files the job's result points at, removed when the job is discarded
+        self.cleanup_paths = []
+        self._cancel = threading.Event()
+        self.future = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def update(self, progress=None, message=None):
+        # Job bodies report through here; a cancelled job stops at its next update
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+class JobRunner:
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='etl-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, label, func, *args, **kwargs):
+        # func(job, *args, **kwargs) must not call streamlit: it runs outside any script run
+        self.prune()
+        job = Job(kind, label)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job.status = 'cancelled'
+            job.finished = time.time()
+            return
+        job.status = 'running'
+        job.message = 'Starting...'
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.progress = 1.0
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+            job.message = 'Cancelled'
+        except Exception as e:
+            job.status = 'error'
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.status = 'cancelled'
+            job.message = 'Cancelled'
+            job.finished = time.time()
+
+    def discard(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return
+        self.cancel(job_id)
+        if job.active:
+            # Still unwinding; prune() removes it and its files once it stops
+            job.finished = job.finished or time.time()
+            return
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        remove_job_files(job)
+
+    def prune(self, ttl=FINISHED_JOB_TTL_SECONDS):
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values() if not job.active and job.finished and now - job.finished > ttl]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            remove_job_files(job)
+
+def remove_job_files(job):
+    for path in job.cleanup_paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
+
+def start_job(session_key, kind, label, func, *args, **kwargs):
+    # One job per session slot: starting a new one discards the previous job and its files
+    runner = get_job_runner()
+    previous = st.session_state.get(session_key)
+    if previous:
+        runner.discard(previous)
+    st.session_state[session_key] = runner.submit(kind, label, func, *args, **kwargs)
+
+def discard_job(session_key):
+    job_id = st.session_state.pop(session_key, None)
+    if job_id:
+        get_job_runner().discard(job_id)
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def job_progress(session_key):
+    job = get_job_runner().get(st.session_state.get(session_key))
+    if job is None or not job.active:
+        # Finished: rerun the whole page so the caller renders the result
+        st.rerun()
+    st.progress(job.progress, text=f'{job.label}: {job.message}')
+    if job.cancel_requested:
+        st.caption('Cancelling after the current step...')
+    elif st.button('⏹️ Cancel', key=f'{session_key}_cancel'):
+        get_job_runner().cancel(job.id)
+
+def render_job(session_key):
+    # Shows live progress while the session's job runs; returns the job once it has finished
+    job_id = st.session_state.get(session_key)
+    job = get_job_runner().get(job_id) if job_id else None
+    if job is None:
+        st.session_state.pop(session_key, None)
+        return None
+    if job.active:
+        job_progress(session_key)
+        return None
+    if job.status == 'cancelled':
+        st.warning(f'⏹️ {job.label} was cancelled.')
+    elif job.status == 'error':
+        st.error(f'❌ {job.label} failed: {job.error}')
+    return job
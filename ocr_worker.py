@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import random
+import socket
+import secrets
+import argparse
+import ipaddress
+import threading
+import itertools
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+
+# Connections unpickle what the other side sends, so the key is a real secret: SW_OCR_AUTHKEY, or
+# for workers on this machine a random key written to AUTHKEY_FILE (readable only by this user)
+AUTHKEY_FILE = os.environ.get('SW_OCR_AUTHKEY_FILE', os.path.join(os.path.expanduser('~'), '.etl', 'ocr_worker.key'))
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 6010
+# Only reader methods the extractors use can be called remotely
+ALLOWED_METHODS = {'readtext', 'detect', 'recognize'}
+
+def parse_addresses(spec):
+    addresses = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(':')
+        addresses.append((host or DEFAULT_HOST, int(port)))
+    return addresses
+
+def load_authkey():
+    key = os.environ.get('SW_OCR_AUTHKEY')
+    if key:
+        return key.encode('utf-8')
+    try:
+        with open(AUTHKEY_FILE, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise RuntimeError(f'No OCR worker key: set SW_OCR_AUTHKEY or start the workers on this machine so they write {AUTHKEY_FILE}') from None
+
+def create_authkey():
+    key = secrets.token_hex(32).encode('utf-8')
+    os.makedirs(os.path.dirname(os.path.abspath(AUTHKEY_FILE)), exist_ok=True)
+    tmp_path = f'{AUTHKEY_FILE}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    os.replace(tmp_path, AUTHKEY_FILE)
+    return key
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+def handle_connection(conn, reader, reader_lock):
+    try:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except EOFError:
+                break
+            if method == 'lang_list':
+                conn.send(('ok', getattr(reader, 'lang_list', None)))
+                continue
+            if method not in ALLOWED_METHODS:
+                conn.send(('error', f'Unsupported method: {method}'))
+                continue
+            try:
+                # One reader per process; concurrent sessions queue here in arrival order
+                with reader_lock:
+                    result = getattr(reader, method)(*args, **kwargs)
+                conn.send(('ok', result))
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+def serve(address, languages, authkey):
+    import easyocr
+    reader = easyocr.Reader(languages)
+    reader_lock = threading.Lock()
+    with Listener(address, backlog=64, authkey=authkey) as listener:
+        print(f'OCR worker {os.getpid()} ready on {address[0]}:{address[1]}', flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            threading.Thread(target=handle_connection, args=(conn, reader, reader_lock), daemon=True).start()
+
+def start_workers(host, port, count, languages, authkey):
+    processes = []
+    for i in range(count):
+        process = multiprocessing.Process(target=serve, args=((host, port + i), languages, authkey), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+def wait_until_ready(addresses, authkey=None, timeout=300):
+    authkey = authkey or load_authkey()
+    deadline = time.monotonic() + timeout
+    for address in addresses:
+        while True:
+            try:
+                with Client(address, authkey=authkey) as conn:
+                    conn.send(('lang_list', (), {}))
+                    conn.recv()
+                break
+            except (ConnectionRefusedError, OSError):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'OCR worker at {address[0]}:{address[1]} did not start')
+                time.sleep(0.5)
+
+class OcrClient:
+    # Stands in for easyocr.Reader in sw_t: same readtext/detect/recognize calls, served by warm workers
+    def __init__(self, addresses, authkey=None):
+        self.addresses = list(addresses)
+        self.authkey = authkey or load_authkey()
+        self._lang_list = None
+        # Each client starts at a random worker so sessions don't all queue on the first one
+        self._next_worker = itertools.count(random.randrange(len(self.addresses)))
+
+    @property
+    def lang_list(self):
+        # Part of the OCR cache key, so it comes from the workers' own reader
+        if self._lang_list is None:
+            self._lang_list = self._call('lang_list')
+        return self._lang_list
+
+    def _call(self, method, *args, **kwargs):
+        start = next(self._next_worker)
+        last_error = None
+        for offset in range(len(self.addresses)):
+            address = self.addresses[(start + offset) % len(self.addresses)]
+            try:
+                with Client(address, authkey=self.authkey) as conn:
+                    conn.send((method, args, kwargs))
+                    status, payload = conn.recv()
+            except (ConnectionRefusedError, OSError, EOFError) as e:
+                last_error = e
+                continue
+            if status == 'error':
+                raise RuntimeError(f'OCR worker {address[0]}:{address[1]} failed: {payload}')
+            return payload
+        raise ConnectionError(f'No OCR worker reachable at {self.addresses}: {last_error}')
+
+    def readtext(self, image, **kwargs):
+        return self._call('readtext', image, **kwargs)
+
+    def detect(self, image, **kwargs):
+        return self._call('detect', image, **kwargs)
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        return self._call('recognize', image, horizontal_list, free_list, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm EasyOCR workers for the SimilarWeb extractor.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the first worker; worker i listens on port + i')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--languages', default='en', help='Comma-separated EasyOCR language codes')
+    args = parser.parse_args()
+    languages = [lang.strip() for lang in args.languages.split(',') if lang.strip()]
+    if os.environ.get('SW_OCR_AUTHKEY'):
+        authkey = load_authkey()
+    elif is_loopback(args.host):
+        authkey = create_authkey()
+    else:
+        parser.error(f'--host {args.host} is reachable from other machines; set SW_OCR_AUTHKEY to a secret shared with the app')
+    processes = start_workers(args.host, args.port, args.workers, languages, authkey)
+    addresses = ','.join((f'{args.host}:{args.port + i}' for i in range(args.workers)))
+    key_source = 'SW_OCR_AUTHKEY' if os.environ.get('SW_OCR_AUTHKEY') else f'the key in {AUTHKEY_FILE}'
+    print(f'Set SW_OCR_WORKERS={addresses} for the Streamlit app; clients authenticate with {key_source}', flush=True)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        sys.exit(0)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import io
+import os
+import importlib.util
+
+import pandas as pd
+
+# label -> (extension, mime type); Parquet and Arrow IPC need pyarrow, which streamlit already installs
+OUTPUT_FORMATS = {'CSV': ('.csv', 'text/csv'), 'Parquet': ('.parquet', 'application/vnd.apache.parquet'), 'Arrow IPC': ('.arrow', 'application/vnd.apache.arrow.file')}
+DEFAULT_OUTPUT_FORMAT = 'CSV'
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+ARROW_IPC_COMPRESSION = os.environ.get('ARROW_IPC_COMPRESSION', 'lz4')
+CSV_BLOCK_BYTES = 8 * 1024 * 1024
+
+def available_output_formats():
+    if importlib.util.find_spec('pyarrow') is None:
+        return [DEFAULT_OUTPUT_FORMAT]
+    return list(OUTPUT_FORMATS)
+
+def output_filename(filename, output_format):
+    return os.path.splitext(filename)[0] + OUTPUT_FORMATS[output_format][0]
+
+def output_mime(output_format):
+    return OUTPUT_FORMATS[output_format][1]
+
+def csv_source(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def csv_column_names(source):
+    # pandas' header handling (blank and duplicate names made unique) so every field has its own name
+    return [str(name) for name in pd.read_csv(csv_source(source), nrows=0).columns]
+
+def iter_csv_batches(source, names, block_size=CSV_BLOCK_BYTES):
+    # Every cell is read as text so the column types below depend only on the CSV contents
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    read_options = pv.ReadOptions(column_names=names, skip_rows=1, block_size=block_size)
+    convert_options = pv.ConvertOptions(column_types={name: pa.string() for name in names}, strings_can_be_null=True, null_values=[''])
+    with pv.open_csv(csv_source(source), read_options=read_options, parse_options=pv.ParseOptions(newlines_in_values=True), convert_options=convert_options) as reader:
+        for batch in reader:
+            yield pa.Table.from_batches([batch])
+
+def narrowest_type(column, current=None):
+    # Blocks after the first can only widen a column within its family (int64 -> float64,
+    # date32 -> timestamp) or demote it to string; failed casts are slow, so few are tried.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if current is None:
+        candidates = [pa.int64(), pa.float64(), pa.date32(), pa.timestamp('s')]
+    elif current == pa.int64():
+        candidates = [pa.int64(), pa.float64()]
+    elif current == pa.date32():
+        candidates = [pa.date32(), pa.timestamp('s')]
+    elif current == pa.string():
+        return current
+    else:
+        candidates = [current]
+    sample = column.drop_null().slice(0, 1000)
+    for arrow_type in candidates:
+        try:
+            # Most columns that don't convert fail within the first values, cheaply
+            pc.cast(sample, arrow_type)
+            pc.cast(column, arrow_type)
+            return arrow_type
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return pa.string()
+
+def infer_csv_schema(source, block_size=CSV_BLOCK_BYTES):
+    # For columns with no declared kind: the narrowest of int64, float64, date32 and timestamp that
+    # every non-empty cell converts to; anything else, and columns with no values at all, stay strings.
+    import pyarrow as pa
+    names = csv_column_names(source)
+    types = {}
+    for table in iter_csv_batches(source, names, block_size):
+        for name, column in zip(names, table.columns):
+            if column.null_count < len(column):
+                types[name] = narrowest_type(column, types.get(name))
+    return pa.schema([pa.field(name, types.get(name, pa.string())) for name in names])
+
+def kind_arrow_type(kind):
+    # Column kinds as the FPK schema registry records them, plus 'date' for the Date column the
+    # processors add; None (no declared kind) leaves the column to its own values
+    import pyarrow as pa
+    return {'integer': pa.int64(), 'float': pa.float64(), 'datetime': pa.timestamp('s'), 'date': pa.date32(), 'category': pa.string(), 'string': pa.string()}.get(kind)
+
+def declared_types(column_kinds, count):
+    if not column_kinds or len(column_kinds) != count:
+        return [None] * count
+    return [kind_arrow_type(kind) for kind in column_kinds]
+
+def column_array(column, arrow_type=None):
+    # The declared type when every value converts to it, else the column's own type; mixed
+    # columns (e.g. text in a count column) are written as the text the CSV shows
+    import pyarrow as pa
+    errors = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+    if arrow_type is not None:
+        try:
+            return pa.array(column, type=arrow_type, from_pandas=True)
+        except errors:
+            pass
+    try:
+        array = pa.array(column, from_pandas=True)
+    except errors:
+        return pa.array(column.astype(str).where(column.notna()), type=pa.string(), from_pandas=True)
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    if arrow_type is not None:
+        try:
+            return array.cast(arrow_type)
+        except errors:
+            pass
+    if pa.types.is_null(array.type) or pa.types.is_large_string(array.type):
+        return array.cast(pa.string())
+    return array
+
+def frame_table(df, column_kinds=None):
+    # column_kinds: one kind (or None) per column, in order. Field names are the CSV header's,
+    # with blank and duplicate labels made unique the same way.
+    import pyarrow as pa
+    names = csv_column_names(df.head(0).to_csv(index=False).encode('utf-8'))
+    types = declared_types(column_kinds, len(names))
+    return pa.Table.from_arrays([column_array(df.iloc[:, i], arrow_type) for i, arrow_type in enumerate(types)], names=names)
+
+def open_writer(target, schema, output_format):
+    import pyarrow as pa
+    if output_format == 'Parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(target, schema, compression=PARQUET_COMPRESSION)
+    if output_format == 'Arrow IPC':
+        return pa.ipc.new_file(target, schema, options=pa.ipc.IpcWriteOptions(compression=ARROW_IPC_COMPRESSION))
+    raise ValueError(f'Unsupported output format: {output_format}')
+
+def cast_text(column, arrow_type):
+    # Whole numbers the CSV shows as floats ("3.0") still read as int64, as in the DataFrame
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if arrow_type == pa.string():
+        return column
+    try:
+        return pc.cast(column, arrow_type)
+    except pa.ArrowInvalid:
+        if arrow_type != pa.int64():
+            raise
+        return pc.cast(pc.cast(column, pa.float64()), arrow_type)
+
+def fit_text_type(column, arrow_type):
+    # The declared type, or the nearest wider one every value of the column converts to
+    import pyarrow as pa
+    candidates = {pa.int64(): [pa.int64(), pa.float64()], pa.date32(): [pa.date32(), pa.timestamp('s')]}.get(arrow_type, [arrow_type])
+    for candidate in candidates:
+        try:
+            cast_text(column, candidate)
+            return candidate
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return pa.string()
+
+def csv_schema(source, column_kinds=None, block_size=CSV_BLOCK_BYTES):
+    import pyarrow as pa
+    names = csv_column_names(source)
+    types = declared_types(column_kinds, len(names))
+    if None in types:
+        inferred = infer_csv_schema(source, block_size)
+        types = [arrow_type or inferred.field(i).type for i, arrow_type in enumerate(types)]
+    return pa.schema([pa.field(name, arrow_type) for name, arrow_type in zip(names, types)])
+
+def write_csv_batches(source, output_format, target, schema, block_size=CSV_BLOCK_BYTES):
+    import pyarrow as pa
+    with open_writer(target, schema, output_format) as writer:
+        for table in iter_csv_batches(source, schema.names, block_size):
+            writer.write_table(pa.Table.from_arrays([cast_text(column, arrow_type) for column, arrow_type in zip(table.columns, schema.types)], schema=schema))
+
+def convert_csv(source, output_format, target, column_kinds=None, block_size=CSV_BLOCK_BYTES):
+    # source: CSV bytes or path; target: path or binary file object. Streamed in block_size
+    # batches so spooled outputs of very large sheets never sit in memory. With every column's
+    # kind declared this is a single pass.
+    import pyarrow as pa
+    schema = csv_schema(source, column_kinds, block_size)
+    try:
+        write_csv_batches(source, output_format, target, schema, block_size)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # A value that doesn't fit its column's kind (e.g. text in a count column): one more pass
+        # finds the nearest type that fits, and the output is written again
+        types = list(schema.types)
+        for table in iter_csv_batches(source, schema.names, block_size):
+            types = [fit_text_type(column, arrow_type) for column, arrow_type in zip(table.columns, types)]
+        if not isinstance(target, (str, os.PathLike)):
+            target.seek(0)
+            target.truncate()
+        write_csv_batches(source, output_format, target, pa.schema([pa.field(name, arrow_type) for name, arrow_type in zip(schema.names, types)]), block_size)
+
+def read_csv_table(source, column_kinds=None, block_size=CSV_BLOCK_BYTES):
+    # The whole CSV typed by its declared kinds, as encode_frame types the DataFrame it came from;
+    # columns without a kind stay text rather than being guessed
+    import pyarrow as pa
+    names = csv_column_names(source)
+    types = [arrow_type or pa.string() for arrow_type in declared_types(column_kinds, len(names))]
+    tables = list(iter_csv_batches(source, names, block_size))
+    if not tables:
+        return pa.table({name: pa.array([], arrow_type) for name, arrow_type in zip(names, types)})
+    table = pa.concat_tables(tables)
+    columns = []
+    for column, arrow_type in zip(table.columns, types):
+        try:
+            columns.append(cast_text(column, arrow_type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            columns.append(cast_text(column, fit_text_type(column, arrow_type)))
+    return pa.Table.from_arrays(columns, names=names)
+
+def encode_csv(csv_content, output_format, column_kinds=None):
+    if output_format == 'CSV':
+        return csv_content
+    buffer = io.BytesIO()
+    convert_csv(csv_content, output_format, buffer, column_kinds)
+    return buffer.getvalue()
+
+def encode_frame(df, output_format, column_kinds=None):
+    # Columnar formats are encoded from the DataFrame itself, typed by column_kinds where given
+    # and by the columns' own dtypes otherwise
+    if output_format == 'CSV':
+        return df.to_csv(index=False).encode('utf-8')
+    table = frame_table(df, column_kinds)
+    buffer = io.BytesIO()
+    with open_writer(buffer, table.schema, output_format) as writer:
+        writer.write_table(table)
+    return buffer.getvalue()
+
+def lazy_payload(cache, key, encode):
+    # For st.download_button(data=...): nothing is encoded until the first click, and later
+    # clicks and reruns reuse the bytes kept in cache (e.g. a dict on the processing run's result)
+    def payload():
+        if key not in cache:
+            cache[key] = encode()
+        return cache[key]
+    return payload
@@ -0,0 +1,137 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+# Uploads and outputs of a session live on disk; session_state only keeps the store id and handles
+RESULT_STORE_DIR = os.environ.get('RESULT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'etl_results'))
+SESSION_BUDGET_BYTES = int(os.environ.get('RESULT_STORE_SESSION_MB', 512)) * 1024 * 1024
+SESSION_TTL_SECONDS = int(os.environ.get('RESULT_STORE_TTL_SECONDS', 6 * 3600))
+
+class StoreFull(Exception):
+    pass
+
+class ResultStore:
+    # Entries are files in the session's directory. Once the session is over its byte budget,
+    # the least recently used unpinned entries are evicted; pinned ones (queued uploads) never are.
+
+    def __init__(self, store_id, budget=SESSION_BUDGET_BYTES):
+        self.id = store_id
+        self.dir = os.path.join(RESULT_STORE_DIR, store_id)
+        self.budget = budget
+        self.last_used = time.time()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+
+    @property
+    def used_bytes(self):
+        with self._lock:
+            return sum((entry['size'] for entry in self._entries.values()))
+
+    def put_bytes(self, data, name, pinned=False):
+        handle = uuid.uuid4().hex
+        path = os.path.join(self.dir, handle)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return self._add(handle, path, name, pinned)
+
+    def put_file(self, source_path, name, pinned=False):
+        # Moves the file in, so spooled outputs are adopted without a copy
+        handle = uuid.uuid4().hex
+        path = os.path.join(self.dir, handle)
+        shutil.move(source_path, path)
+        return self._add(handle, path, name, pinned)
+
+    def _add(self, handle, path, name, pinned):
+        size = os.path.getsize(path)
+        with self._lock:
+            self._entries[handle] = {'path': path, 'name': name, 'size': size, 'pinned': pinned}
+            self.last_used = time.time()
+            try:
+                self._evict()
+            except StoreFull:
+                self._remove(handle)
+                raise
+        return handle
+
+    def _evict(self):
+        total = sum((entry['size'] for entry in self._entries.values()))
+        for handle in [h for h, entry in self._entries.items() if not entry['pinned']]:
+            if total <= self.budget:
+                break
+            total -= self._entries[handle]['size']
+            self._remove(handle)
+        if total > self.budget:
+            raise StoreFull(f'This session is over its storage budget ({self.budget / 1024 / 1024:.0f} MB). Remove files from the queue or process fewer at once.')
+
+    def _remove(self, handle):
+        entry = self._entries.pop(handle, None)
+        if entry is not None:
+            try:
+                os.remove(entry['path'])
+            except OSError:
+                pass
+
+    def path(self, handle):
+        # None once the entry has been evicted or removed; a hit makes the entry most recently used
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None or not os.path.exists(entry['path']):
+                self._entries.pop(handle, None)
+                return None
+            self._entries.move_to_end(handle)
+            self.last_used = time.time()
+            return entry['path']
+
+    def read(self, handle):
+        path = self.path(handle)
+        if path is None:
+            raise FileNotFoundError('This file is no longer stored. Process the files again.')
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def size(self, handle):
+        with self._lock:
+            entry = self._entries.get(handle)
+            return entry['size'] if entry else 0
+
+    def remove(self, handles):
+        with self._lock:
+            for handle in handles:
+                self._remove(handle)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def prune_stores(ttl=SESSION_TTL_SECONDS):
+    # Streamlit has no session-end hook, so stores of sessions idle past the TTL are dropped here
+    now = time.time()
+    with _stores_lock:
+        expired = [store for store in _stores.values() if now - store.last_used > ttl]
+        for store in expired:
+            del _stores[store.id]
+    for store in expired:
+        store.clear()
+
+def get_session_store(key='result_store_id'):
+    prune_stores()
+    store_id = st.session_state.get(key)
+    with _stores_lock:
+        store = _stores.get(store_id) if store_id else None
+        if store is None:
+            store = ResultStore(uuid.uuid4().hex)
+            _stores[store.id] = store
+            st.session_state[key] = store.id
+        store.last_used = time.time()
+    return store
@@ -1,17 +1,115 @@
 import streamlit as st
 import pandas as pd
-import easyocr
 import numpy as np
 import re
+import os
+import json
+import time
+import hashlib
+import tempfile
+import importlib.util
 from io import BytesIO
 from datetime import datetime, timedelta
+import jobs
+import output_formats
 
 # CSS moved to app() function
 
+OCR_LANGUAGES = ['en']
+OCR_BATCH_SIZE = 16
+ROW_Y_TOLERANCE = 15
+CHANNEL_MAG_RATIO = 1.5
+OCR_CACHE_DIR = os.environ.get('SW_OCR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'sw_ocr_cache'))
+OCR_CACHE_MAX_BYTES = int(os.environ.get('SW_OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+ocr_cache_stats = {'hits': 0, 'misses': 0}
+NA_TOKENS = ['N/A', 'NIA', 'NAN', 'NONE', '', '-', 'NULL']
+VALUE_SUFFIXES = [('M', 1000000), ('K', 1000), ('B', 1000000000), ('%', 0.01)]
+# ASCII-only digit classes so Python re and pyarrow's RE2 accept exactly the same strings
+FLOAT_PATTERN = re.compile('[+-]?([0-9]+\\.?[0-9]*|\\.[0-9]+)([eE][+-]?[0-9]+)?')
+INT_PATTERN = re.compile('[+-]?[0-9]+')
+DURATION_PATTERN = re.compile('([0-9]+):([0-9]{2})(?::([0-9]{2}))?')
+TEXT_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else object
+CHANNEL_TYPES = ['direct', 'display', 'email', 'gen_ai', 'referrals', 'search_organic', 'search_paid', 'social_organic', 'social_paid']
+# result key -> (title, file name suffix, keep index); engagement and social CSVs have always kept the index
+SW_OUTPUTS = {'df_engagement': ('Engagement', 'engagement', True), 'df_social': ('Social Network', 'social', True), 'df_channels': ('Channel Traffic', 'channel_traffic', False)}
+
+
+def create_reader():
+    workers = os.environ.get('SW_OCR_WORKERS')
+    if workers:
+        # Warm reader processes started with `python ocr_worker.py --workers N`; they share their key
+        # through SW_OCR_AUTHKEY or, on the same machine, the key file they write
+        from ocr_worker import OcrClient, parse_addresses
+        return OcrClient(parse_addresses(workers))
+    # Imported here so the page renders without loading torch until OCR is actually needed
+    import easyocr
+    return easyocr.Reader(OCR_LANGUAGES)
 
 @st.cache_resource
 def load_reader():
-    return easyocr.Reader(['en'])
+    return create_reader()
+
+def ocr_cache_key(image_bytes, kind, mag_ratio, reader):
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    languages = ','.join(sorted(getattr(reader, 'lang_list', OCR_LANGUAGES)))
+    return hashlib.sha256(f'{image_hash}|{kind}|{mag_ratio}|{languages}'.encode('utf-8')).hexdigest()
+
+def load_cached_ocr(key):
+    path = os.path.join(OCR_CACHE_DIR, f'{key}.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        # Touch on read so eviction drops the least recently used entries first
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return [(bbox, text, prob) for bbox, text, prob in results]
+
+def store_cached_ocr(key, results):
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        path = os.path.join(OCR_CACHE_DIR, f'{key}.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([[bbox, text, prob] for bbox, text, prob in results], f, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+        os.replace(tmp_path, path)
+        evict_ocr_cache()
+    except OSError:
+        pass
+
+def evict_ocr_cache(max_bytes=OCR_CACHE_MAX_BYTES):
+    entries = []
+    with os.scandir(OCR_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum((size for _, size, _ in entries))
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def cached_readtext(reader, image_bytes, kind, mag_ratio=1.0):
+    key = ocr_cache_key(image_bytes, kind, mag_ratio, reader)
+    results = load_cached_ocr(key)
+    if results is not None:
+        ocr_cache_stats['hits'] += 1
+        return results
+    ocr_cache_stats['misses'] += 1
+    results = reader.readtext(image_bytes, mag_ratio=mag_ratio)
+    store_cached_ocr(key, results)
+    return results
+
+def duration_seconds(parts):
+    first, second, third = parts
+    if third is None:
+        return int(first) * 60 + int(second)
+    return int(first) * 3600 + int(second) * 60 + int(third)
 
 def clean_value(x):
     if x is None or pd.isna(x):
@@ -19,26 +117,65 @@ def clean_value(x):
     if not isinstance(x, str):
         return x
     x = x.strip()
-    if x.upper() in ['N/A', 'NIA', 'NAN', 'NONE', '', '-', 'NULL']:
-        return 0
-    if 'M' in x:
-        try:
-            return float(x.replace('M', '').replace(',', '')) * 1000000
-        except:
-            return 0
-    if '%' in x:
-        try:
-            return float(x.replace('%', '').replace(',', '')) * 0.01
-        except:
-            return 0
-    try:
-        val_cleaned = x.replace(',', '')
-        if '.' in val_cleaned:
-            return float(val_cleaned)
-        else:
-            return int(val_cleaned)
-    except:
+    if x.upper() in NA_TOKENS:
         return 0
+    duration = DURATION_PATTERN.fullmatch(x)
+    if duration:
+        return duration_seconds(duration.groups())
+    for suffix, multiplier in VALUE_SUFFIXES:
+        if suffix in x:
+            val_cleaned = x.replace(suffix, '').replace(',', '').strip()
+            return float(val_cleaned) * multiplier if FLOAT_PATTERN.fullmatch(val_cleaned) else 0
+    val_cleaned = x.replace(',', '').strip()
+    if '.' in val_cleaned:
+        return float(val_cleaned) if FLOAT_PATTERN.fullmatch(val_cleaned) else 0
+    return int(val_cleaned) if INT_PATTERN.fullmatch(val_cleaned) else 0
+
+def clean_numeric_column(series):
+    # Column-wise clean_value: same grammar and results, but each distinct cell is parsed once
+    # and every branch is a single pass of pandas string ops over the remaining cells.
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return series.fillna(0)
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    uniques = pd.Series(uniques, dtype=object)
+    is_text = np.array([isinstance(v, str) for v in uniques], dtype=bool)
+    text = uniques.where(is_text).astype(TEXT_DTYPE).str.strip()
+    result = pd.to_numeric(uniques.where(~is_text), errors='coerce').fillna(0).to_numpy(dtype='float64', copy=True)
+    is_int = ~is_text & (result % 1 == 0)
+    is_int |= is_text & text.str.upper().isin(NA_TOKENS).to_numpy()
+    pending = is_text & ~is_int
+    has_colon = pending & text.str.contains(':', regex=False).fillna(False).to_numpy(dtype=bool)
+    if has_colon.any():
+        durations = text[has_colon].str.extract(f'^{DURATION_PATTERN.pattern}$')
+        has_duration = has_colon.copy()
+        has_duration[has_colon] = durations[0].notna().to_numpy()
+        parts = durations[durations[0].notna()].astype('float64')
+        result[has_duration] = np.where(parts[2].isna(), parts[0] * 60 + parts[1], parts[0] * 3600 + parts[1] * 60 + parts[2].fillna(0))
+        is_int |= has_duration
+        pending &= ~has_duration
+    for suffix, multiplier in VALUE_SUFFIXES:
+        has_suffix = pending & text.str.contains(suffix, regex=False).fillna(False).to_numpy(dtype=bool)
+        if not has_suffix.any():
+            continue
+        val_cleaned = text[has_suffix].str.replace(suffix, '', regex=False).str.replace(',', '', regex=False).str.strip()
+        valid = val_cleaned.str.fullmatch(FLOAT_PATTERN.pattern).to_numpy(dtype=bool)
+        # astype(float) on str objects goes through float(), so values match clean_value bit for bit
+        result[has_suffix] = np.where(valid, val_cleaned.where(valid, '0').astype('float64') * multiplier, 0)
+        is_int[has_suffix] = ~valid
+        pending &= ~has_suffix
+    if pending.any():
+        val_cleaned = text[pending].str.replace(',', '', regex=False).str.strip()
+        has_dot = val_cleaned.str.contains('.', regex=False).to_numpy(dtype=bool)
+        float_ok = has_dot & val_cleaned.str.fullmatch(FLOAT_PATTERN.pattern).to_numpy(dtype=bool)
+        int_ok = ~has_dot & val_cleaned.str.fullmatch(INT_PATTERN.pattern).to_numpy(dtype=bool)
+        result[pending] = val_cleaned.where(float_ok | int_ok, '0').astype('float64').to_numpy()
+        is_int[pending] = ~float_ok
+    # Missing cells factorize to -1 and clean to an integer 0
+    present = codes >= 0
+    values = np.where(present, result[np.where(present, codes, 0)] if len(result) else 0, 0)
+    if is_int[codes[present]].all():
+        return pd.Series(values.astype('int64'), index=series.index, name=series.name)
+    return pd.Series(values, index=series.index, name=series.name)
 
 def normalize_website_name(website):
     website = website.replace('.', ' ')
@@ -47,9 +184,7 @@ def normalize_website_name(website):
     return website.strip()
 
 def clear_data_callback():
-    st.session_state.df_engagement = None
-    st.session_state.df_social = None
-    st.session_state.df_channels = None
+    jobs.discard_job('sw_job')
     st.session_state.uploader_key += 1
     if 'org_name' in st.session_state:
         st.session_state['org_name'] = ''
@@ -57,13 +192,23 @@ def clear_data_callback():
         st.session_state['brand_name'] = ''
 
 def continue_data_callback():
-    st.session_state.df_engagement = None
-    st.session_state.df_social = None
-    st.session_state.df_channels = None
+    jobs.discard_job('sw_job')
     st.session_state.uploader_key += 1
 
+def group_text_rows(df_text, y_tolerance=ROW_Y_TOLERANCE):
+    if df_text.empty:
+        return []
+    df_text = df_text.sort_values(by='y', kind='mergesort')
+    y = df_text['y'].to_numpy()
+    # A new line starts wherever the gap to the previous box (in y order) reaches the tolerance
+    row_ids = np.concatenate(([0], np.cumsum(np.diff(y) >= y_tolerance)))
+    order = np.lexsort((df_text['x'].to_numpy(), row_ids))
+    records = df_text.iloc[order].to_dict('records')
+    bounds = np.flatnonzero(np.diff(row_ids[order])) + 1
+    return [records[start:end] for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(records)])]
+
 def extract_engagement(image_bytes, reader):
-    results = reader.readtext(image_bytes)
+    results = cached_readtext(reader, image_bytes, 'engagement')
     text_data = []
     for bbox, text, prob in results:
         tl, tr, br, bl = bbox
@@ -73,23 +218,7 @@ def extract_engagement(image_bytes, reader):
     df_text = pd.DataFrame(text_data)
     if df_text.empty:
         return pd.DataFrame()
-    df_text = df_text.sort_values(by='y')
-    rows = []
-    current_row = []
-    last_y = -1
-    y_tolerance = 15
-    for index, row in df_text.iterrows():
-        if last_y == -1 or abs(row['y'] - last_y) < y_tolerance:
-            current_row.append(row)
-            last_y = row['y']
-        else:
-            current_row.sort(key=lambda x: x['x'])
-            rows.append(current_row)
-            current_row = [row]
-            last_y = row['y']
-    if current_row:
-        current_row.sort(key=lambda x: x['x'])
-        rows.append(current_row)
+    rows = group_text_rows(df_text)
     header_row_index = -1
     for i, row in enumerate(rows):
         texts = [item['text'] for item in row]
@@ -126,13 +255,13 @@ def extract_engagement(image_bytes, reader):
             df_engagement = df.set_index('Metric').T
         else:
             df_engagement = df.set_index(df.columns[0]).T
-        df_engagement = df_engagement.map(clean_value)
+        df_engagement = df_engagement.apply(clean_numeric_column)
         return df_engagement
     else:
         return pd.DataFrame()
 
 def extract_social(image_bytes, reader):
-    results = reader.readtext(image_bytes, mag_ratio=1.5)
+    results = cached_readtext(reader, image_bytes, 'social', mag_ratio=1.5)
     sn_text_data = []
     for bbox, text, prob in results:
         tl, tr, br, bl = bbox
@@ -145,23 +274,7 @@ def extract_social(image_bytes, reader):
     df_sn_text = pd.DataFrame(sn_text_data)
     if df_sn_text.empty:
         return pd.DataFrame()
-    df_sn_text = df_sn_text.sort_values(by='y')
-    sn_rows = []
-    sn_current_row = []
-    sn_last_y = -1
-    y_tolerance = 15
-    for index, row in df_sn_text.iterrows():
-        if sn_last_y == -1 or abs(row['y'] - sn_last_y) < y_tolerance:
-            sn_current_row.append(row)
-            sn_last_y = row['y']
-        else:
-            sn_current_row.sort(key=lambda x: x['x'])
-            sn_rows.append(sn_current_row)
-            sn_current_row = [row]
-            sn_last_y = row['y']
-    if sn_current_row:
-        sn_current_row.sort(key=lambda x: x['x'])
-        sn_rows.append(sn_current_row)
+    sn_rows = group_text_rows(df_sn_text)
     sn_header_row_index = -1
     for i, row in enumerate(sn_rows):
         texts = [item['text'] for item in row]
@@ -171,6 +284,7 @@ def extract_social(image_bytes, reader):
     if sn_header_row_index != -1:
         header_items = sn_rows[sn_header_row_index]
         sn_headers = [{'text': item['text'], 'x': item['x']} for item in header_items]
+        header_x = np.array([h['x'] for h in sn_headers])
         sn_extracted_data = []
         count = 0
         for i in range(sn_header_row_index + 1, len(sn_rows)):
@@ -180,8 +294,10 @@ def extract_social(image_bytes, reader):
             if len(row_items) < 1:
                 continue
             mapped_row = {h['text']: None for h in sn_headers}
-            for item in row_items:
-                closest_header = min(sn_headers, key=lambda h: abs(h['x'] - item['x']))
+            item_x = np.array([item['x'] for item in row_items])
+            nearest = np.abs(item_x[:, None] - header_x[None, :]).argmin(axis=1)
+            for item, header_index in zip(row_items, nearest):
+                closest_header = sn_headers[header_index]
                 if mapped_row[closest_header['text']] is not None:
                     mapped_row[closest_header['text']] += ' ' + item['text']
                 else:
@@ -195,12 +311,41 @@ def extract_social(image_bytes, reader):
             df_social = df_sn.set_index(network_col).T
         else:
             df_social = df_sn.set_index(df_sn.columns[0]).T
-        return df_social.map(clean_value)
+        return df_social.apply(clean_numeric_column)
     else:
         return pd.DataFrame()
 
-def extract_channel(image_bytes, col_name, reader):
-    results = reader.readtext(image_bytes, mag_ratio=1.5)
+def decode_image(image_bytes):
+    import cv2
+    # Same conversion easyocr applies to raw bytes, so arrays give identical detections
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('Could not decode image')
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def batch_readtext(images, reader, mag_ratio=CHANNEL_MAG_RATIO, batch_size=OCR_BATCH_SIZE, timings=None):
+    import cv2
+    timings = timings if timings is not None else {}
+    height = max((img.shape[0] for img in images))
+    width = max((img.shape[1] for img in images))
+    # Pad bottom/right with white so every image shares one shape (the detector batches a single
+    # array) while box coordinates stay in each image's own pixel space.
+    batch = np.full((len(images), height, width, 3), 255, dtype=np.uint8)
+    for i, img in enumerate(images):
+        batch[i, :img.shape[0], :img.shape[1]] = img
+    start = time.perf_counter()
+    # reformat=False as in readtext_batched: easyocr's reformat_input only takes a single 2-D/3-D image
+    horizontal_lists, free_lists = reader.detect(batch, mag_ratio=mag_ratio, reformat=False)
+    timings['detect'] = timings.get('detect', 0) + time.perf_counter() - start
+    start = time.perf_counter()
+    results = []
+    for i in range(len(images)):
+        grey = cv2.cvtColor(batch[i], cv2.COLOR_RGB2GRAY)
+        results.append(reader.recognize(grey, horizontal_lists[i], free_lists[i], batch_size=batch_size))
+    timings['recognize'] = timings.get('recognize', 0) + time.perf_counter() - start
+    return results
+
+def parse_channel_results(results, col_name):
     c_text_data = []
     for bbox, text, prob in results:
         tl, tr, br, bl = bbox
@@ -213,23 +358,7 @@ def extract_channel(image_bytes, col_name, reader):
     df_c = pd.DataFrame(c_text_data)
     if df_c.empty:
         return pd.DataFrame(columns=['Website', col_name])
-    df_c = df_c.sort_values(by='y')
-    c_rows = []
-    c_current = []
-    last_y = -1
-    y_tolerance = 15
-    for index, row in df_c.iterrows():
-        if last_y == -1 or abs(row['y'] - last_y) < y_tolerance:
-            c_current.append(row)
-            last_y = row['y']
-        else:
-            c_current.sort(key=lambda x: x['x'])
-            c_rows.append(c_current)
-            c_current = [row]
-            last_y = row['y']
-    if c_current:
-        c_current.sort(key=lambda x: x['x'])
-        c_rows.append(c_current)
+    c_rows = group_text_rows(df_c)
     extracted_data = []
     for row in c_rows:
         texts = [item['text'] for item in row]
@@ -240,9 +369,138 @@ def extract_channel(image_bytes, col_name, reader):
             extracted_data.append({'Website': website, col_name: value})
     df_temp = pd.DataFrame(extracted_data)
     if not df_temp.empty:
-        df_temp[col_name] = df_temp[col_name].apply(clean_value)
+        df_temp[col_name] = clean_numeric_column(df_temp[col_name])
     return df_temp
 
+def extract_channel(image_bytes, col_name, reader):
+    results = cached_readtext(reader, image_bytes, 'channel', mag_ratio=CHANNEL_MAG_RATIO)
+    return parse_channel_results(results, col_name)
+
+def extract_channels_batched(channel_images, reader, batch_size=OCR_BATCH_SIZE, timings=None):
+    timings = timings if timings is not None else {}
+    frames = {}
+    errors = {}
+    ocr_results = {}
+    cache_keys = {}
+    decoded = {}
+    for c_type, image_bytes in channel_images.items():
+        cache_keys[c_type] = ocr_cache_key(image_bytes, 'channel', CHANNEL_MAG_RATIO, reader)
+        cached = load_cached_ocr(cache_keys[c_type])
+        if cached is not None:
+            ocr_cache_stats['hits'] += 1
+            ocr_results[c_type] = cached
+            continue
+        ocr_cache_stats['misses'] += 1
+        try:
+            decoded[c_type] = decode_image(image_bytes)
+        except Exception as e:
+            errors[c_type] = e
+    if decoded:
+        results = batch_readtext(list(decoded.values()), reader, batch_size=batch_size, timings=timings)
+        for c_type, c_results in zip(decoded, results):
+            store_cached_ocr(cache_keys[c_type], c_results)
+            ocr_results[c_type] = c_results
+    start = time.perf_counter()
+    for c_type in channel_images:
+        if c_type not in ocr_results:
+            continue
+        try:
+            frames[c_type] = parse_channel_results(ocr_results[c_type], c_type)
+        except Exception as e:
+            errors[c_type] = e
+    timings['layout'] = timings.get('layout', 0) + time.perf_counter() - start
+    return (frames, errors)
+
+def merge_channel_frames(frames, timings=None):
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    # One keyed outer join instead of a chain of pairwise merges; repeated websites are
+    # paired up by occurrence so the index stays unique.
+    keyed = []
+    for df in frames:
+        df = df.copy()
+        df['_occurrence'] = df.groupby('Website').cumcount()
+        keyed.append(df.set_index(['Website', '_occurrence']))
+    df_merged = pd.concat(keyed, axis=1, join='outer', sort=True)
+    df_merged = df_merged.reset_index(level='_occurrence', drop=True).reset_index()
+    timings['merge'] = timings.get('merge', 0) + time.perf_counter() - start
+    return df_merged
+
+def run_extraction_job(job, reader, org_name, brand_name, timestamp_str, eng_bytes, soc_bytes, channel_images):
+    df_engagement = df_social = df_channels = None
+    messages = []
+    timings = {}
+    if eng_bytes:
+        job.update(0.0, 'Processing Engagement Data...')
+        try:
+            df_res = extract_engagement(eng_bytes, reader)
+            if df_res.empty:
+                messages.append(('error', "Error: Could not find 'Metric' table in Engagement image."))
+            else:
+                df_res.insert(0, 'Organization', org_name)
+                df_res.insert(1, 'Brand', brand_name)
+                df_res.insert(2, 'Date', timestamp_str)
+                df_engagement = df_res
+        except Exception as e:
+            messages.append(('error', f'Error processing Engagement image: {e}'))
+    if soc_bytes:
+        job.update(0.2, 'Processing Social Network Data...')
+        try:
+            df_res = extract_social(soc_bytes, reader)
+            if df_res.empty:
+                messages.append(('error', "Error: Could not find 'Network' table in Social image."))
+            else:
+                df_res.insert(0, 'Organization', org_name)
+                df_res.insert(1, 'Brand', brand_name)
+                df_res.insert(2, 'Date', timestamp_str)
+                df_social = df_res
+        except Exception as e:
+            messages.append(('error', f'Error processing Social Network image: {e}'))
+    if channel_images:
+        job.update(0.4, 'Processing Channel Traffic Data...')
+        df_merged = pd.DataFrame()
+        try:
+            frames, errors = extract_channels_batched(channel_images, reader, timings=timings)
+            parts = []
+            for c_type in channel_images:
+                if c_type in errors:
+                    messages.append(('error', f'Error processing {c_type}: {errors[c_type]}'))
+                elif frames[c_type].empty:
+                    messages.append(('warning', f'Warning: Could not extract data from {c_type} image.'))
+                else:
+                    parts.append(frames[c_type])
+            if parts:
+                df_merged = merge_channel_frames(parts, timings=timings)
+        except Exception as e:
+            messages.append(('error', f'Error processing Channel Traffic images: {e}'))
+        if not df_merged.empty:
+            df_merged.insert(0, 'Organization', org_name)
+            df_merged.insert(1, 'Brand', brand_name)
+            df_merged.insert(2, 'Date', timestamp_str)
+        df_channels = df_merged
+    return {'df_engagement': df_engagement, 'df_social': df_social, 'df_channels': df_channels, 'messages': messages, 'timings': timings, 'payloads': {}}
+
+def classify_sw_image(name):
+    # 'engagement', 'social' or a channel type from an image's file name; channel types are checked
+    # first and longest first, so 'social_paid' is not taken for the social network image
+    stem = re.sub('[^a-z0-9]+', '_', os.path.splitext(os.path.basename(name))[0].lower())
+    for c_type in sorted(CHANNEL_TYPES, key=len, reverse=True):
+        if c_type in stem:
+            return c_type
+    for kind in ('engagement', 'social'):
+        if kind in stem:
+            return kind
+    return None
+
+def sw_output_files(result, file_prefix):
+    # (result key, title, file name, encode) for every frame the extraction produced
+    files = []
+    for key, (title, suffix, index) in SW_OUTPUTS.items():
+        df = result[key]
+        if df is not None and (not df.empty):
+            files.append((key, title, f'{file_prefix}_{suffix}.csv', lambda df=df, index=index: df.to_csv(index=index).encode('utf-8')))
+    return files
+
 def app():
     st.markdown('\n<style>\n    .main {\n        background-color: #f5f5f5;\n    }\n    .stButton>button {\n        width: 100%;\n        border-radius: 8px;\n        height: 3em;\n        font-weight: bold;\n    }\n    .extract-btn>button {\n        background-color: #4CAF50;\n        color: white;\n    }\n    .clear-btn>button {\n        background-color: #f44336;\n        color: white;\n    }\n    .continue-btn>button {\n        background-color: #2196F3;\n        color: white;\n    }\n    /* Force primary buttons to be Blue */\n    div[data-testid="stButton"] > button[kind="primary"] {\n        background-color: #2196F3 !important;\n        border-color: #2196F3 !important;\n        color: white !important;\n    }\n    div[data-testid="stButton"] > button[kind="primary"]:hover {\n        background-color: #1976D2 !important;\n        border-color: #1976D2 !important;\n    }\n    h1, h2, h3 {\n        color: #333;\n    }\n    .footer {\n        position: fixed;\n        left: 0;\n        bottom: 0;\n        width: 100%;\n        background-color: #333;\n        color: white;\n        text-align: center;\n        padding: 10px;\n        font-size: 0.8em;\n    }\n</style>\n', unsafe_allow_html=True)
     st.markdown('<h1 style="text-align: center; color: #002b5c;">🌐 SW Table Extractor</h1>', unsafe_allow_html=True)
@@ -258,12 +516,6 @@ def app():
             next_month = today.replace(day=28) + timedelta(days=4)
             end_of_month = next_month - timedelta(days=next_month.day)
             selected_date = st.date_input('Select Date', value=end_of_month)
-    if 'df_engagement' not in st.session_state:
-        st.session_state.df_engagement = None
-    if 'df_social' not in st.session_state:
-        st.session_state.df_social = None
-    if 'df_channels' not in st.session_state:
-        st.session_state.df_channels = None
     if 'uploader_key' not in st.session_state:
         st.session_state.uploader_key = 0
     st.markdown('---')
@@ -277,10 +529,9 @@ def app():
         img_social = st.file_uploader("Upload 'Social Network' Image", type=['png', 'jpg', 'jpeg'], key=f'up_soc_{st.session_state.uploader_key}')
     st.subheader('Channel Traffic')
     st.markdown('Upload images for each channel type:')
-    channel_types = ['direct', 'display', 'email', 'gen_ai', 'referrals', 'search_organic', 'search_paid', 'social_organic', 'social_paid']
     c_cols = st.columns(3)
     channel_uploads = {}
-    for i, c_type in enumerate(channel_types):
+    for i, c_type in enumerate(CHANNEL_TYPES):
         col = c_cols[i % 3]
         with col:
             channel_uploads[c_type] = st.file_uploader(f'Channel: {c_type}', type=['png', 'jpg', 'jpeg'], key=f'up_{c_type}_{st.session_state.uploader_key}')
@@ -292,80 +543,35 @@ def app():
         elif not (img_engagement or img_social or any(channel_uploads.values())):
             st.warning('Please upload at least one image to proceed.')
         else:
+            # The reader is a cached resource, so it is built here in the script thread and handed to the job
             reader = load_reader()
-            timestamp_str = selected_date.strftime('%Y%m%d')
-            with st.spinner('Extracting data from images... This may take a moment.'):
-                if img_engagement:
-                    st.info('Processing Engagement Data...')
-                    try:
-                        eng_bytes = img_engagement.getvalue()
-                        df_res = extract_engagement(eng_bytes, reader)
-                        if df_res.empty:
-                            st.error("Error: Could not find 'Metric' table in Engagement image.")
-                        else:
-                            df_res.insert(0, 'Organization', org_name)
-                            df_res.insert(1, 'Brand', brand_name)
-                            df_res.insert(2, 'Date', timestamp_str)
-                            st.session_state.df_engagement = df_res
-                    except Exception as e:
-                        st.error(f'Error processing Engagement image: {e}')
-                if img_social:
-                    st.info('Processing Social Network Data...')
-                    try:
-                        soc_bytes = img_social.getvalue()
-                        df_res = extract_social(soc_bytes, reader)
-                        if df_res.empty:
-                            st.error("Error: Could not find 'Network' table in Social image.")
-                        else:
-                            df_res = df_res.map(clean_value)
-                            df_res.insert(0, 'Organization', org_name)
-                            df_res.insert(1, 'Brand', brand_name)
-                            df_res.insert(2, 'Date', timestamp_str)
-                            st.session_state.df_social = df_res
-                    except Exception as e:
-                        st.error(f'Error processing Social Network image: {e}')
-                if any(channel_uploads.values()):
-                    st.info('Processing Channel Traffic Data...')
-                    df_merged = pd.DataFrame()
-                    for c_type, uploaded_file in channel_uploads.items():
-                        if uploaded_file:
-                            try:
-                                c_bytes = uploaded_file.getvalue()
-                                df_part = extract_channel(c_bytes, c_type, reader)
-                                if not df_part.empty:
-                                    if df_merged.empty:
-                                        df_merged = df_part
-                                    else:
-                                        df_merged = pd.merge(df_merged, df_part, on='Website', how='outer')
-                                else:
-                                    st.warning(f'Warning: Could not extract data from {c_type} image.')
-                            except Exception as e:
-                                st.error(f'Error processing {c_type}: {e}')
-                    if not df_merged.empty:
-                        df_merged.insert(0, 'Organization', org_name)
-                        df_merged.insert(1, 'Brand', brand_name)
-                        df_merged.insert(2, 'Date', timestamp_str)
-                    st.session_state.df_channels = df_merged
-            st.success('Extraction Complete!')
-    if st.session_state.df_engagement is not None or st.session_state.df_social is not None or st.session_state.df_channels is not None:
+            eng_bytes = img_engagement.getvalue() if img_engagement else None
+            soc_bytes = img_social.getvalue() if img_social else None
+            channel_images = {c_type: uploaded_file.getvalue() for c_type, uploaded_file in channel_uploads.items() if uploaded_file}
+            jobs.start_job('sw_job', 'sw_extraction', 'Extracting data from images', run_extraction_job, reader, org_name, brand_name, selected_date.strftime('%Y%m%d'), eng_bytes, soc_bytes, channel_images)
+    df_engagement = df_social = df_channels = None
+    job = jobs.render_job('sw_job')
+    if job is not None and job.status == 'done':
+        df_engagement = job.result['df_engagement']
+        df_social = job.result['df_social']
+        df_channels = job.result['df_channels']
+        # CSVs are encoded once per extraction run, on the first click
+        payloads = job.result['payloads']
+        for level, text in job.result['messages']:
+            getattr(st, level)(text)
+        timings = job.result['timings']
+        if timings:
+            st.caption('Channel OCR stage timings: ' + ', '.join((f'{stage} {timings[stage]:.2f}s' for stage in ['detect', 'recognize', 'layout', 'merge'] if stage in timings)))
+        st.success('Extraction Complete!')
+        st.caption(f"OCR cache: {ocr_cache_stats['hits']} hits, {ocr_cache_stats['misses']} misses since server start")
+    if df_engagement is not None or df_social is not None or df_channels is not None:
         st.markdown('---')
         st.header('3. Preview & Download')
         file_prefix = f"{org_name}_{brand_name}_{selected_date.strftime('%Y-%m-%d')}" if org_name and brand_name else f"data_{selected_date.strftime('%Y-%m-%d')}"
-        if st.session_state.df_engagement is not None and (not st.session_state.df_engagement.empty):
-            st.subheader('Engagement Data')
-            st.dataframe(st.session_state.df_engagement)
-            csv_eng = st.session_state.df_engagement.to_csv().encode('utf-8')
-            st.download_button(label='Download Engagement CSV', data=csv_eng, file_name=f'{file_prefix}_engagement.csv', mime='text/csv')
-        if st.session_state.df_social is not None and (not st.session_state.df_social.empty):
-            st.subheader('Social Network Data')
-            st.dataframe(st.session_state.df_social)
-            csv_soc = st.session_state.df_social.to_csv().encode('utf-8')
-            st.download_button(label='Download Social Network CSV', data=csv_soc, file_name=f'{file_prefix}_social.csv', mime='text/csv')
-        if st.session_state.df_channels is not None and (not st.session_state.df_channels.empty):
-            st.subheader('Channel Traffic Data')
-            st.dataframe(st.session_state.df_channels)
-            csv_chan = st.session_state.df_channels.to_csv(index=False).encode('utf-8')
-            st.download_button(label='Download Channel Traffic CSV', data=csv_chan, file_name=f'{file_prefix}_channel_traffic.csv', mime='text/csv')
+        for key, title, file_name, encode in sw_output_files(job.result, file_prefix):
+            st.subheader(f'{title} Data')
+            st.dataframe(job.result[key])
+            st.download_button(label=f'Download {title} CSV', data=output_formats.lazy_payload(payloads, key, encode), file_name=file_name, mime='text/csv', on_click='ignore')
     st.markdown('---')
     col_clear, col_continue = st.columns([1, 1])
     with col_clear:
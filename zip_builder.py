@@ -0,0 +1,249 @@
+import io
+import os
+import time
+import zlib
+import struct
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# label -> (zipfile method, level); levels follow zlib/bz2, LZMA uses the zipfile defaults
+ZIP_COMPRESSIONS = {'Stored': (zipfile.ZIP_STORED, None), 'Fast deflate': (zipfile.ZIP_DEFLATED, 1), 'Deflate': (zipfile.ZIP_DEFLATED, 6), 'Best deflate': (zipfile.ZIP_DEFLATED, 9), 'BZIP2': (zipfile.ZIP_BZIP2, 9), 'LZMA': (zipfile.ZIP_LZMA, None)}
+# 'Deflate' is what ZipFile(..., ZIP_DEFLATED) wrote before, so the default output is unchanged
+DEFAULT_ZIP_COMPRESSION = os.environ.get('ZIP_COMPRESSION', 'Deflate')
+ZIP_WORKERS = int(os.environ.get('ZIP_WORKERS', max(1, os.cpu_count() or 1)))
+CHUNK_BYTES = 1024 * 1024
+# Members compressed from files are staged on disk above this size instead of in memory
+SPILL_BYTES = 16 * 1024 * 1024
+# ZIP's LZMA method stores LZMA1 with the properties of xz preset 6 (lc=3, lp=0, pb=2, 8 MiB dictionary)
+LZMA_DICT_SIZE = 1 << 23
+LZMA_PROPERTIES = struct.pack('<BI', 2 * 45 + 0 * 9 + 3, LZMA_DICT_SIZE)
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+def available_zip_compressions():
+    modules = {zipfile.ZIP_STORED: True, zipfile.ZIP_DEFLATED: True, zipfile.ZIP_BZIP2: bz2, zipfile.ZIP_LZMA: lzma}
+    return [label for label, (method, _) in ZIP_COMPRESSIONS.items() if modules[method]]
+
+class LZMACompressor:
+    # LZMA members start with the LZMA SDK version (9.4), the properties size and the properties
+    # themselves, followed by a raw LZMA1 stream ending in an end-of-stream marker
+
+    def __init__(self):
+        self._compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA1, 'dict_size': LZMA_DICT_SIZE, 'lc': 3, 'lp': 0, 'pb': 2}])
+        self._header = struct.pack('<BBH', 9, 4, len(LZMA_PROPERTIES)) + LZMA_PROPERTIES
+
+    def compress(self, data):
+        header, self._header = (self._header, b'')
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = (self._header, b'')
+        return header + self._compressor.flush()
+
+def get_compressor(method, level):
+    if method == zipfile.ZIP_DEFLATED:
+        # Raw deflate (no zlib header), as ZIP stores it
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    if method == zipfile.ZIP_LZMA:
+        return LZMACompressor()
+    return None
+
+def dos_datetime(timestamp):
+    year, month, day, hour, minute, second = time.localtime(timestamp)[:6]
+    if year < 1980:
+        return (0, 1 << 5 | 1)
+    return (hour << 11 | minute << 5 | second // 2, year - 1980 << 9 | month << 5 | day)
+
+def compress_member(content, method, level, spill_dir=None):
+    # content: bytes or a path. zlib, bz2 and lzma release the GIL, so members compress in parallel threads.
+    compressor = get_compressor(method, level)
+    crc = 0
+    size = 0
+    if isinstance(content, bytes):
+        source = io.BytesIO(content)
+        spill = False
+    else:
+        source = open(content, 'rb')
+        spill = os.path.getsize(content) > SPILL_BYTES
+    if spill:
+        os.makedirs(spill_dir or tempfile.gettempdir(), exist_ok=True)
+        fd, compressed_path = tempfile.mkstemp(suffix='.zipmember', dir=spill_dir)
+        target = open(fd, 'wb')
+    else:
+        compressed_path = None
+        target = io.BytesIO()
+    try:
+        with source:
+            for chunk in iter(lambda: source.read(CHUNK_BYTES), b''):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                target.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            target.write(compressor.flush())
+        compressed = compressed_path if spill else target.getvalue()
+    except BaseException:
+        target.close()
+        if compressed_path:
+            os.remove(compressed_path)
+        raise
+    target.close()
+    return (crc, size, compressed)
+
+class ParallelZipWriter:
+    # Members are compressed concurrently in a thread pool and written to the archive in the
+    # order they were added. At most `max_pending` members are in flight, which bounds memory.
+    # The local headers and central directory are written here, since zipfile has no public
+    # way to add data that is already compressed.
+
+    def __init__(self, target, compression=DEFAULT_ZIP_COMPRESSION, max_workers=ZIP_WORKERS, max_pending=None, spill_dir=None):
+        self.method, self.level = ZIP_COMPRESSIONS[compression]
+        self._own_file = isinstance(target, (str, os.PathLike))
+        self.fp = open(target, 'wb') if self._own_file else target
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.spill_dir = spill_dir
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='zip-compress') if self.max_workers > 1 else None
+        self._pending = deque()
+        self._entries = []
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, arcname, produce):
+        # produce() runs in the pool and returns (content, remove): bytes or a path, and whether
+        # the path should be deleted once it has been compressed
+        task = lambda: self._prepare(produce)
+        if self._executor is None:
+            self._write(arcname, task())
+            return
+        self._pending.append((arcname, self._executor.submit(task)))
+        while len(self._pending) > self.max_pending:
+            self._flush_one()
+
+    def writestr(self, arcname, data):
+        self.add(arcname, lambda: (data, False))
+
+    def write(self, filename, arcname, remove=False):
+        self.add(arcname, lambda: (filename, remove))
+
+    def _prepare(self, produce):
+        content, remove = produce()
+        try:
+            return compress_member(content, self.method, self.level, self.spill_dir)
+        finally:
+            if remove:
+                os.remove(content)
+
+    def _flush_one(self):
+        arcname, future = self._pending.popleft()
+        self._write(arcname, future.result())
+
+    def _write(self, arcname, compressed_member):
+        # Sizes and CRC are known up front, so each member is a local header followed by its data
+        crc, size, compressed = compressed_member
+        try:
+            try:
+                name = arcname.encode('ascii')
+                flags = 0
+            except UnicodeEncodeError:
+                name = arcname.encode('utf-8')
+                flags = 0x800
+            if self.method == zipfile.ZIP_LZMA:
+                # Compressed data includes an end-of-stream (EOS) marker
+                flags |= 0x02
+            compress_size = os.path.getsize(compressed) if isinstance(compressed, str) else len(compressed)
+            dos_time, dos_date = dos_datetime(time.time())
+            offset = self.fp.tell()
+            zip64 = size >= ZIP64_LIMIT or compress_size >= ZIP64_LIMIT
+            version = 45 if zip64 else 63 if self.method == zipfile.ZIP_LZMA else 46 if self.method == zipfile.ZIP_BZIP2 else 20
+            if zip64:
+                extra = struct.pack('<HHQQ', 1, 16, size, compress_size)
+                header_sizes = (ZIP64_LIMIT, ZIP64_LIMIT)
+            else:
+                extra = b''
+                header_sizes = (compress_size, size)
+            self.fp.write(struct.pack('<IHHHHHIIIHH', 0x04034B50, version, flags, self.method, dos_time, dos_date, crc, *header_sizes, len(name), len(extra)) + name + extra)
+            if isinstance(compressed, str):
+                with open(compressed, 'rb') as f:
+                    shutil.copyfileobj(f, self.fp, CHUNK_BYTES)
+            else:
+                self.fp.write(compressed)
+            self._entries.append((name, version, flags, dos_time, dos_date, crc, compress_size, size, offset))
+        finally:
+            if isinstance(compressed, str):
+                os.remove(compressed)
+
+    def _write_central_directory(self):
+        start = self.fp.tell()
+        for name, version, flags, dos_time, dos_date, crc, compress_size, size, offset in self._entries:
+            if max(size, compress_size, offset) >= ZIP64_LIMIT:
+                extra = struct.pack('<HHQQQ', 1, 24, size, compress_size, offset)
+                sizes = (ZIP64_LIMIT, ZIP64_LIMIT, ZIP64_LIMIT)
+                version = max(version, 45)
+            else:
+                extra = b''
+                sizes = (compress_size, size, offset)
+            # Made by Unix (3) so the external attributes are read as rw------- permissions
+            self.fp.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014B50, 3 << 8 | version, version, flags, self.method, dos_time, dos_date, crc, sizes[0], sizes[1], len(name), len(extra), 0, 0, 0, 0o600 << 16, sizes[2]) + name + extra)
+        end = self.fp.tell()
+        count = len(self._entries)
+        if count > ZIP64_COUNT_LIMIT or end - start >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            self.fp.write(struct.pack('<IQHHIIQQQQ', 0x06064B50, 44, 45, 45, 0, 0, count, count, end - start, start))
+            self.fp.write(struct.pack('<IIQI', 0x07064B50, 0, end, 1))
+        self.fp.write(struct.pack('<IHHHHIIH', 0x06054B50, 0, 0, min(count, ZIP64_COUNT_LIMIT), min(count, ZIP64_COUNT_LIMIT), min(end - start, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0))
+
+    def _finish(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._write_central_directory()
+        finally:
+            if self._own_file:
+                self.fp.close()
+
+    def close(self):
+        try:
+            while self._pending:
+                self._flush_one()
+        except BaseException:
+            self.abort()
+            raise
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._finish()
+
+    def abort(self):
+        # Drops members not yet written; the archive is still finished so its file handle is released.
+        # Queued members still run, since their producers own source files that must be cleaned up.
+        while self._pending:
+            arcname, future = self._pending.popleft()
+            try:
+                _, _, compressed = future.result()
+                if isinstance(compressed, str):
+                    os.remove(compressed)
+            except BaseException:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._finish()